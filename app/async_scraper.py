@@ -0,0 +1,455 @@
+import asyncio
+import os
+import time
+from playwright.async_api import async_playwright
+from playwright._impl._errors import TimeoutError as PlaywrightTimeoutError
+from .parser import parse_resultado, PANEL_SELECTOR, PANEL_OUTER_HTML
+from .browser_pool import LAUNCH_ARGS, VIEWPORT, EXTRA_HTTP_HEADERS, PAGE_TIMEOUT_MS
+from .search_flow import (
+    SUNAT_SEARCH_URL, RUC_PATTERN, MAX_RETRIES, JS_LLENAR_CAMPO, JS_FORMULARIO_DETALLE, RESULTADO_RUC,
+    RESULTADO_LISTADO, ENVIO_TIMEOUT_MS, ListadoRucs, detail_fanout, debug_activo, clasificar_resultado,
+    registrar_en_circuito, manejar_error, resultado_de_detalle
+)
+from .circuit_breaker import get_circuit_breaker
+from .http_scraper import SesionListado, http_fast_path_enabled, scrape_ruc_http
+from .rate_limiter import get_rate_limiter
+from .resource_blocking import ResourceBlocker, resource_blocking_enabled
+from .waits import StepTimer, PacingPolicy, click_and_wait_response_async, wait_overlays_hidden_async
+from .metrics import SCRAPE_SECONDS, SCRAPE_PHASE_SECONDS, SCRAPES_TOTAL, RETRIES_TOTAL, BROWSERS_ACTIVE, PAGES_ACTIVE
+
+
+async def async_scrape_sunat(search_value: str, search_type: str = "nombre", document_type: str = "1", browser=None,
+                             debug_mode: bool = False, metadata: dict = None) -> list:
+    """
+    Versión asíncrona de scrape_sunat basada en playwright.async_api.
+
+    Args:
+        search_value: Valor a buscar (nombre de empresa, RUC o número de documento)
+        search_type: Tipo de búsqueda ("nombre", "ruc", "documento")
+        document_type: Tipo de documento para búsqueda por documento
+        browser: Navegador async compartido (en modo debug, lanzado visible). Si es None se lanza uno propio.
+        debug_mode: Si mostrar el navegador (como en scrape_sunat, sin camino HTTP y
+                    recorriendo el listado en la misma página)
+        metadata: Diccionario opcional que se completa con los mismos datos que
+                  en scrape_sunat (motor, recursos, detalles, tiempos por paso)
+
+    Returns:
+        Lista de resultados o información de error (mismo formato que scrape_sunat)
+    """
+    if metadata is None:
+        metadata = {}
+    timer = StepTimer()
+    try:
+        inicio = time.perf_counter()
+        results = await _scrape_con_reintentos(search_value, search_type, document_type, browser,
+                                               debug_mode, metadata, timer)
+        SCRAPE_SECONDS.observe(time.perf_counter() - inicio, search_type=search_type, engine=metadata.get("motor", "navegador"))
+        SCRAPES_TOTAL.inc(search_type=search_type, outcome=clasificar_resultado(results))
+        return results
+    finally:
+        metadata["tiempos"] = timer.as_dict()
+        if timer.avisos:
+            metadata["avisos"] = dict(timer.avisos)
+
+
+async def _scrape_con_reintentos(search_value: str, search_type: str, document_type: str, browser,
+                                 debug_mode: bool, metadata: dict, timer: StepTimer) -> list:
+    max_retries = MAX_RETRIES
+    debug_mode = debug_activo(debug_mode)
+
+    breaker = get_circuit_breaker()
+    if not breaker.permitir():
+        metadata["motor"] = "circuito_abierto"
+        print(f"⛔ Circuito abierto, consulta rechazada: {search_value}")
+        return breaker.error_result()
+
+    if search_type == "ruc" and not debug_mode and http_fast_path_enabled():
+        with timer.step("http"):
+            result = await asyncio.to_thread(scrape_ruc_http, search_value)
+        if result is not None:
+            metadata["motor"] = "http"
+            breaker.record_success()
+            return [result]
+        print("↩️ Respuesta HTTP no reconocida, usando el navegador...")
+
+    metadata["motor"] = "navegador"
+    # En modo debug se recorre el listado en el mismo navegador, resultado por resultado
+    recolectar = not debug_mode
+    for attempt in range(max_retries):
+        try:
+            if browser is not None:
+                results = await _buscar_en_navegador(browser, search_value, search_type, document_type,
+                                                     metadata, timer, recolectar)
+            else:
+                async with async_playwright() as p:
+                    with timer.step("lanzamiento_navegador"):
+                        own_browser = await p.chromium.launch(
+                            headless=not debug_mode,
+                            slow_mo=500 if debug_mode else 0,
+                            args=LAUNCH_ARGS
+                        )
+                    BROWSERS_ACTIVE.inc()
+                    try:
+                        results = await _buscar_en_navegador(own_browser, search_value, search_type, document_type,
+                                                             metadata, timer, recolectar)
+                    finally:
+                        await own_browser.close()
+                        BROWSERS_ACTIVE.dec()
+
+            registrar_en_circuito(breaker, results)
+            return results
+
+        except Exception as e:
+            wait_time, error_result = manejar_error(e, attempt, max_retries)
+            if error_result is not None:
+                registrar_en_circuito(breaker, error_result, e)
+                return error_result
+            RETRIES_TOTAL.inc(search_type=search_type)
+            with timer.step("reintento"):
+                await asyncio.sleep(wait_time)
+
+    breaker.release()
+    return [{"error": "Se agotaron todos los intentos de conexión"}]
+
+
+async def scrape_batch(values: list, search_type: str = "nombre", document_type: str = "1",
+                       concurrency: int = None, browsers: int = None, debug_mode: bool = False,
+                       on_result=None, keep_results: bool = True, cancel_event=None) -> dict:
+    """
+    Ejecuta muchas consultas a la vez sobre navegadores compartidos.
+
+    Args:
+        values: Valores a consultar (los duplicados se consultan una sola vez)
+        search_type: Tipo de búsqueda ("nombre", "ruc", "documento")
+        document_type: Tipo de documento para búsqueda por documento
+        concurrency: Consultas simultáneas (SUNAT_BATCH_CONCURRENCY, por defecto 4)
+        browsers: Navegadores compartidos (SUNAT_BATCH_BROWSERS, por defecto 2)
+        debug_mode: Si mostrar los navegadores
+        on_result: Callback opcional on_result(valor, resultados) al terminar cada consulta.
+            Si falla no se inician más consultas; las que están en curso terminan
+            y después se propaga el error
+        keep_results: Si es False no se acumulan los resultados (los recibe solo on_result)
+        cancel_event: threading.Event opcional; al activarse no se inician más
+            consultas (las que están en curso terminan)
+
+    Un navegador compartido que se desconecta (p. ej. Chromium se cae) se
+    relanza antes de la próxima consulta que le toca.
+
+    Returns:
+        Diccionario {valor: resultados} en el orden de entrada (vacío si keep_results es False)
+    """
+    concurrency = concurrency or int(os.getenv('SUNAT_BATCH_CONCURRENCY', '4'))
+    browsers = browsers or int(os.getenv('SUNAT_BATCH_BROWSERS', '2'))
+    browsers = max(1, min(browsers, concurrency))
+    unique_values = list(dict.fromkeys(values))
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async with async_playwright() as p:
+        async def lanzar():
+            inicio = time.perf_counter()
+            browser = await p.chromium.launch(
+                headless=not debug_mode,
+                slow_mo=500 if debug_mode else 0,
+                args=LAUNCH_ARGS
+            )
+            SCRAPE_PHASE_SECONDS.observe(time.perf_counter() - inicio, phase="lanzamiento_navegador")
+            BROWSERS_ACTIVE.inc()
+            return browser
+
+        launched = list(await asyncio.gather(*[lanzar() for _ in range(browsers)]))
+        locks = [asyncio.Lock() for _ in launched]
+        # Primer error de on_result: se dejan de iniciar consultas
+        fallos = []
+
+        async def navegador(slot: int):
+            async with locks[slot]:
+                if launched[slot] is None or not launched[slot].is_connected():
+                    if launched[slot] is not None:
+                        print(f"⚠️ Navegador {slot} desconectado, relanzando...")
+                        try:
+                            await launched[slot].close()
+                        except Exception:
+                            pass
+                        launched[slot] = None
+                        BROWSERS_ACTIVE.dec()
+                    launched[slot] = await lanzar()
+                return launched[slot]
+
+        async def consultar(index: int, valor: str):
+            async with semaphore:
+                if fallos or (cancel_event is not None and cancel_event.is_set()):
+                    return
+                try:
+                    browser = await navegador(index % len(launched))
+                except Exception as e:
+                    print(f"✗ No se pudo relanzar el navegador: {str(e)}")
+                    resultados = [{"error": f"Error al lanzar el navegador: {str(e)}"}]
+                else:
+                    resultados = await async_scrape_sunat(valor, search_type, document_type, browser=browser,
+                                                          debug_mode=debug_mode)
+                if keep_results:
+                    results[valor] = resultados
+                if on_result is not None:
+                    try:
+                        on_result(valor, resultados)
+                    except Exception as e:
+                        fallos.append(e)
+
+        try:
+            await asyncio.gather(*[consultar(i, valor) for i, valor in enumerate(unique_values)])
+        finally:
+            for browser in launched:
+                if browser is None:
+                    continue
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+                BROWSERS_ACTIVE.dec()
+
+    if fallos:
+        raise fallos[0]
+
+    return {valor: results[valor] for valor in unique_values if valor in results}
+
+
+def run_batch(values: list, search_type: str = "nombre", document_type: str = "1",
+              concurrency: int = None, browsers: int = None, debug_mode: bool = False,
+              on_result=None, keep_results: bool = True, cancel_event=None) -> dict:
+    """
+    Punto de entrada síncrono para scrape_batch (para endpoints sync y scripts).
+    """
+    return asyncio.run(scrape_batch(
+        values, search_type, document_type,
+        concurrency=concurrency, browsers=browsers, debug_mode=debug_mode,
+        on_result=on_result, keep_results=keep_results, cancel_event=cancel_event
+    ))
+
+
+async def _buscar_en_navegador(browser, search_value: str, search_type: str, document_type: str,
+                               metadata: dict, timer: StepTimer, recolectar: bool = True) -> list:
+    """
+    Ejecuta el flujo de búsqueda de SUNAT en un BrowserContext nuevo del
+    navegador dado; los detalles de un listado se consultan en el mismo navegador.
+    """
+    context = await browser.new_context(viewport=VIEWPORT, extra_http_headers=EXTRA_HTTP_HEADERS)
+    try:
+        results = await _buscar_en_contexto(context, search_value, search_type, document_type,
+                                            metadata, timer, recolectar)
+    finally:
+        await context.close()
+
+    if isinstance(results, ListadoRucs):
+        with timer.step("detalles"):
+            return await _consultar_detalles(browser, results, metadata)
+    return results
+
+
+async def _consultar_detalles(browser, rucs: list, metadata: dict) -> list:
+    """
+    Consulta en paralelo las páginas de detalle del listado con la sesión del
+    navegador que lo cargó (rucs.sesion), conservando su orden. Solo los
+    detalles cuya respuesta no se reconoce se buscan en un contexto nuevo del
+    mismo navegador, sin pasar otra vez por el circuit breaker.
+    """
+    fanout = min(detail_fanout(), len(rucs))
+    detalles = {"consultados": len(rucs), "concurrencia": fanout, "navegador": 0}
+    metadata["detalles"] = detalles
+    semaphore = asyncio.Semaphore(fanout)
+    sesion = getattr(rucs, "sesion", None) or SesionListado()
+
+    async def consultar(ruc):
+        async with semaphore:
+            try:
+                detalle = await asyncio.to_thread(sesion.consultar_detalle, ruc)
+            except Exception as e:
+                print(f"✗ Fallo el detalle HTTP de {ruc}: {str(e)}")
+                detalle = None
+            if detalle is not None:
+                return [detalle]
+            detalles["navegador"] += 1
+            return await _buscar_en_navegador(browser, ruc, "ruc", "1", {}, StepTimer(), recolectar=False)
+
+    detalles_rucs = await asyncio.gather(*[consultar(ruc) for ruc in rucs], return_exceptions=True)
+    results = [resultado_de_detalle(i, detalle) for i, detalle in enumerate(detalles_rucs)]
+    print(f"Scraping completado. Total de resultados: {len(results)}")
+    return results
+
+
+async def _html_panel(page) -> str:
+    panel = await page.query_selector(PANEL_SELECTOR)
+    return await panel.evaluate(PANEL_OUTER_HTML) if panel else ""
+
+
+async def _recolectar_rucs(links) -> list:
+    rucs = []
+    for link in links:
+        ruc = await link.get_attribute("data-ruc")
+        if not ruc:
+            match = RUC_PATTERN.search(await link.inner_text())
+            ruc = match.group(1) if match else None
+        if not ruc:
+            return None
+        rucs.append(ruc.strip())
+    return rucs
+
+
+async def _buscar_en_contexto(context, search_value: str, search_type: str, document_type: str,
+                              metadata: dict = None, timer: StepTimer = None, recolectar: bool = True) -> list:
+    timer = timer or StepTimer()
+    page = await context.new_page()
+    PAGES_ACTIVE.inc()
+    blocker = await ResourceBlocker().attach_async(page) if resource_blocking_enabled() else None
+    try:
+        return await _flujo_busqueda(page, search_value, search_type, document_type, timer, recolectar)
+    finally:
+        PAGES_ACTIVE.dec()
+        if blocker is not None:
+            stats = blocker.stats()
+            print(f"🧱 {search_value}: recursos bloqueados {stats['bloqueados']}, permitidos {stats['permitidos']}")
+            if metadata is not None:
+                metadata["recursos"] = stats
+
+
+async def _flujo_busqueda(page, search_value: str, search_type: str, document_type: str,
+                          timer: StepTimer, recolectar: bool = True) -> list:
+    results = []
+    limiter = get_rate_limiter()
+    page.set_default_timeout(PAGE_TIMEOUT_MS)
+
+    print(f"Navegando a SUNAT para buscar: {search_value} (tipo: {search_type})")
+    async with limiter.request_async(timer):
+        with timer.step("navegacion"):
+            await page.goto(SUNAT_SEARCH_URL, wait_until="domcontentloaded")
+            await page.wait_for_selector("#btnAceptar", state="visible", timeout=30000)
+
+    with timer.step("formulario"):
+        await _preparar_formulario(page, search_value, search_type, document_type)
+
+    listo = RESULTADO_RUC if search_type == "ruc" else RESULTADO_LISTADO
+    try:
+        async with limiter.request_async(timer):
+            with timer.step("envio"):
+                await click_and_wait_response_async(page, "#btnAceptar", listo, timeout=ENVIO_TIMEOUT_MS,
+                                                    timer=timer)
+    except PlaywrightTimeoutError as e:
+        if search_type != "ruc":
+            raise
+        return [{"error": f"Error al obtener datos del RUC: {str(e)}"}]
+
+    if search_type == "ruc":
+        try:
+            with timer.step("espera_resultados"):
+                await page.wait_for_selector(RESULTADO_RUC, timeout=20000)
+            with timer.step("contenido"):
+                html = await _html_panel(page)
+            result = parse_resultado(html, timer=timer)
+
+            if result and "error" not in result:
+                print(f"✅ Resultado de RUC obtenido: {search_value}")
+                return [result]
+            return [{"error": "No se encontraron datos para el RUC especificado"}]
+
+        except Exception as e:
+            return [{"error": f"Error al obtener datos del RUC: {str(e)}"}]
+
+    # La página ya tiene el listado o el aviso de "sin resultados" (RESULTADO_LISTADO)
+    links = await page.query_selector_all("a.aRucs")
+    if not links:
+        return [{"error": "No se encontraron resultados para la búsqueda"}]
+
+    # Con los RUCs del listado, los detalles se consultan en paralelo fuera de esta página
+    if recolectar:
+        rucs = await _recolectar_rucs(links)
+        if rucs:
+            formulario = await page.evaluate(JS_FORMULARIO_DETALLE)
+            return ListadoRucs(rucs, sesion=SesionListado(formulario, await page.context.cookies()))
+
+    pacing = PacingPolicy()
+    for i in range(len(links)):
+        try:
+            # Pausa explícita entre páginas de detalle
+            if i > 0:
+                with timer.step("pausa"):
+                    await pacing.wait_async()
+
+            with timer.step("detalle"):
+                # Vuelve a buscar cada vez (porque DOM cambia tras regresar)
+                current_links = await page.query_selector_all("a.aRucs")
+                if i < len(current_links):
+                    await current_links[i].scroll_into_view_if_needed()
+                    async with limiter.request_async(timer):
+                        await click_and_wait_response_async(page, current_links[i], RESULTADO_RUC,
+                                                            timeout=ENVIO_TIMEOUT_MS, timer=timer)
+
+                    results.append(parse_resultado(await _html_panel(page), timer=timer))
+
+                    await page.go_back(wait_until="domcontentloaded")
+                    await page.wait_for_selector(".aRucs", timeout=15000)
+
+        except Exception as e:
+            print(f"Error procesando resultado {i+1}: {str(e)}")
+            results.append({"error": f"Error al procesar resultado {i+1}: {str(e)}"})
+            try:
+                await page.go_back(wait_until="domcontentloaded")
+                await page.wait_for_selector(".aRucs", timeout=5000)
+            except Exception:
+                print("No se pudo regresar al listado, terminando...")
+                break
+
+    print(f"Scraping completado para {search_value}. Total de resultados: {len(results)}")
+    return results
+
+
+async def _preparar_formulario(page, search_value: str, search_type: str, document_type: str):
+    """
+    Elige el tipo de búsqueda y llena el campo (mismas estrategias que el
+    scraper sync: fill, click + type y, como último recurso, JavaScript)
+    """
+    if search_type == "nombre":
+        await page.wait_for_selector("#btnPorRazonSocial", state="visible", timeout=30000)
+        await page.click("#btnPorRazonSocial")
+        search_field = "#txtNombreRazonSocial"
+
+    elif search_type == "ruc":
+        search_field = "#txtRuc"
+
+    elif search_type == "documento":
+        await page.wait_for_selector("#btnPorDocumento", state="visible", timeout=30000)
+        await page.click("#btnPorDocumento")
+        await page.wait_for_selector("#cmbTipoDoc", state="visible", timeout=30000)
+        await page.select_option("#cmbTipoDoc", value=document_type)
+        search_field = "#txtNumeroDocumento"
+
+    else:
+        raise ValueError(f"Tipo de búsqueda no válido: {search_type}. Use 'nombre', 'ruc' o 'documento'")
+
+    search_input = page.locator(search_field)
+    await search_input.wait_for(state="visible", timeout=30000)
+    try:
+        await wait_overlays_hidden_async(page)
+    except Exception:
+        pass
+    await search_input.scroll_into_view_if_needed()
+
+    try:
+        await search_input.fill(search_value, timeout=10000)
+        return search_input
+    except Exception as e:
+        print(f"✗ Fallo el llenado directo: {str(e)}")
+
+    try:
+        await search_input.click(timeout=10000)
+        await search_input.clear()
+        await search_input.type(search_value, delay=50)
+        return search_input
+    except Exception as e:
+        print(f"✗ Fallo click + type: {str(e)}")
+
+    try:
+        await page.evaluate(JS_LLENAR_CAMPO, [search_field, search_value])
+    except Exception as e:
+        raise Exception(f"No se pudo llenar el campo de búsqueda después de múltiples intentos: {str(e)}")
+
+    return search_input
@@ -0,0 +1,203 @@
+"""
+Consulta masiva por línea de comandos, sin el servidor FastAPI.
+
+Reparte las filas del Excel en shards entre varios procesos; cada proceso
+tiene su propio Playwright (un pool de un navegador) y ejecuta scrape_sunat.
+
+Uso:
+    python -m app.batch --tipo-busqueda ruc --procesos 4
+    python -m app.batch --tipo-busqueda ruc --reanudar
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+from .cache import scrape_con_cache
+from .browser_pool import start_browser_pool, stop_browser_pool
+from .excel_utils import iter_values
+from .save_utils import StreamingResultWriter, ruta_journal
+from .preflight import PlanConsulta, planificar
+
+TIPOS_BUSQUEDA = ["nombre", "ruc", "documento"]
+TIPOS_DOCUMENTO = ["1", "4", "7", "A"]
+
+
+def nombre_base_archivos(tipo_busqueda: str, tipo_documento: str = "1") -> str:
+    """
+    Nombre base de los archivos de resultados según el tipo de búsqueda
+    """
+    filename_base = f"consulta_sunat_{tipo_busqueda}"
+    if tipo_busqueda == "documento":
+        tipos_doc = {"1": "dni", "4": "carnet", "7": "pasaporte", "A": "cedula"}
+        filename_base += f"_{tipos_doc.get(tipo_documento, tipo_documento)}"
+    return filename_base
+
+
+def _iniciar_worker():
+    """
+    Inicializador de cada proceso: un pool de un navegador propio que se
+    cierra cuando el proceso termina.
+    """
+    start_browser_pool(size=1)
+    Finalize(None, stop_browser_pool, exitpriority=10)
+
+
+def procesar_shard(valores: list, tipo_busqueda: str, tipo_documento: str, usar_cache: bool = True) -> dict:
+    """
+    Consulta secuencialmente un shard de valores dentro de un proceso worker.
+    """
+    resultados = {}
+    for valor in valores:
+        try:
+            resultados[valor], _ = scrape_con_cache(
+                valor, search_type=tipo_busqueda, document_type=tipo_documento, usar_cache=usar_cache
+            )
+        except Exception as e:
+            resultados[valor] = [{"error": f"Error procesando {valor}: {str(e)}"}]
+        print(f"[pid {os.getpid()}] {valor}: {len(resultados[valor])} resultado(s)")
+    return resultados
+
+
+def dividir_en_shards(valores: list, tamano: int) -> list:
+    return [valores[i:i + tamano] for i in range(0, len(valores), tamano)]
+
+
+def ejecutar_lote(valores: list, tipo_busqueda: str = "nombre", tipo_documento: str = "1",
+                  procesos: int = None, tamano_shard: int = None, usar_cache: bool = True,
+                  on_result=None, plan: PlanConsulta = None, omitir: set = None) -> dict:
+    """
+    Valida, reparte y consulta los valores en procesos paralelos.
+
+    Args:
+        on_result: Callback opcional on_result(valor, resultados, error) a medida
+            que termina cada shard. Si se pasa, los resultados no se acumulan.
+        plan: Revisión previa ya hecha de valores (por defecto se calcula aquí)
+        omitir: Valores que no se consultan (p. ej. ya completos en el journal)
+
+    Returns:
+        Diccionario con el mismo formato que usa save_results_to_files
+        (con "resultados" vacío si se usa on_result)
+    """
+    procesos = procesos or os.cpu_count() or 1
+
+    plan = plan or planificar(valores, tipo_busqueda, tipo_documento)
+    omitir = omitir or set()
+
+    all_results = {}
+    errors = []
+
+    def registrar(valor, resultados, error=None):
+        if error:
+            errors.append(error)
+        if on_result is not None:
+            on_result(valor, resultados, error)
+        else:
+            all_results[valor] = resultados
+
+    # Los rechazados de la revisión previa nunca llegan al scraper
+    rechazados = set()
+    for _, original, error_msg in plan.rechazados:
+        if original not in rechazados and original not in omitir:
+            rechazados.add(original)
+            registrar(original, [{"error": error_msg}], error_msg)
+    pendientes = [valor for valor in plan.claves if valor not in omitir]
+
+    if pendientes:
+        # Varios shards por proceso para repartir mejor la carga
+        tamano_shard = tamano_shard or max(1, -(-len(pendientes) // (procesos * 4)))
+        shards = dividir_en_shards(pendientes, tamano_shard)
+        print(f"🚀 {len(pendientes)} consultas en {len(shards)} shards sobre {procesos} procesos")
+
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_worker) as executor:
+            futures = {
+                executor.submit(procesar_shard, shard, tipo_busqueda, tipo_documento, usar_cache): shard
+                for shard in shards
+            }
+            # Cada shard se registra en cuanto termina
+            for future in as_completed(futures):
+                try:
+                    resultados_shard = future.result()
+                except Exception as e:
+                    resultados_shard = {
+                        valor: [{"error": f"Error procesando {valor}: {str(e)}"}] for valor in futures[future]
+                    }
+                for valor, resultados in resultados_shard.items():
+                    error = None
+                    if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
+                        error = f"{valor}: {resultados[0]['error']}"
+                    registrar(valor, resultados, error)
+
+    response_data = {
+        # Conservar el orden de entrada
+        "resultados": {valor: all_results[valor] for valor in plan.orden if valor in all_results},
+        "tipo_busqueda": tipo_busqueda,
+        "tipo_documento": tipo_documento if tipo_busqueda == "documento" else None
+    }
+    if errors:
+        response_data["errores"] = errors
+    return response_data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta masiva SUNAT en varios procesos")
+    parser.add_argument("--archivo", default="data/empresas.xlsx", help="Archivo de entrada (Excel, CSV o Parquet)")
+    parser.add_argument("--columna", default=None, help="Columna a leer (por defecto la primera)")
+    parser.add_argument("--saltar-filas", type=int, default=0, help="Filas de datos del inicio que no se leen")
+    parser.add_argument("--tipo-busqueda", default="nombre", choices=TIPOS_BUSQUEDA)
+    parser.add_argument("--tipo-documento", default="1", choices=TIPOS_DOCUMENTO)
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos worker (por defecto, núcleos disponibles)")
+    parser.add_argument("--tamano-shard", type=int, default=None, help="Valores por shard")
+    parser.add_argument("--sin-cache", action="store_true", help="Ignorar la caché de resultados al leer")
+    parser.add_argument("--reanudar", action="store_true",
+                        help="Continuar la última corrida de este archivo: solo se consultan las filas fallidas o faltantes")
+    args = parser.parse_args(argv)
+
+    # El archivo se lee en streaming y se revisa a medida que se lee
+    plan = planificar(
+        iter_values(args.archivo, args.columna, skip_rows=args.saltar_filas, with_row_numbers=True),
+        args.tipo_busqueda, args.tipo_documento, numerados=True
+    )
+    print(f"📋 Se encontraron {plan.filas} registros para consultar")
+    plan.imprimir()
+
+    # Los resultados se escriben a disco a medida que termina cada shard, en
+    # un journal estable por archivo y tipo de búsqueda
+    tipo_doc = args.tipo_documento if args.tipo_busqueda == "documento" else None
+    try:
+        writer = StreamingResultWriter(
+            nombre_base_archivos(args.tipo_busqueda, args.tipo_documento),
+            tipo_busqueda=args.tipo_busqueda,
+            tipo_documento=tipo_doc,
+            orden=plan.orden,
+            journal_file=ruta_journal(args.archivo, args.tipo_busqueda, tipo_doc),
+            reanudar=args.reanudar
+        )
+    except RuntimeError as e:
+        # Otra corrida del mismo archivo tiene el journal
+        raise SystemExit(f"❌ {e}")
+    completados = writer.completados()
+    if completados:
+        pendientes = sum(1 for valor in plan.claves if valor not in completados)
+        print(f"♻️ {len(completados)} registros ya completos en el journal; se consultan {pendientes}")
+
+    with writer:
+        ejecutar_lote(
+            plan.claves,
+            tipo_busqueda=args.tipo_busqueda,
+            tipo_documento=args.tipo_documento,
+            procesos=args.procesos,
+            tamano_shard=args.tamano_shard,
+            usar_cache=not args.sin_cache,
+            on_result=writer.write,
+            plan=plan,
+            omitir=completados
+        )
+    saved_files = writer.close()
+
+    print(f"\n🎉 ¡Proceso completado! Errores: {writer.total_errores}")
+    for formato, archivo in saved_files.items():
+        print(f"📁 {formato}: {archivo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+from .data_formatter import (
+    field_keys, DNI_PATTERN, ACTIVIDAD_PATTERN,
+    AFILIADO_DESDE_PATTERN, DESDE_PARENTESIS_PATTERN, DESDE_PATTERN
+)
+
+# Formateo por columnas de lotes completos. Aplica las mismas reglas que
+# data_formatter.format_record, pero sobre Series de pandas: cada label y cada
+# valor distinto se procesa una sola vez y las reglas se aplican por máscara.
+#
+# Es una API de biblioteca para reprocesar campos sin formatear guardados
+# (parser.extract_raw_fields). El scraping y el guardado de lotes no la usan:
+# cada resultado sale ya formateado de parse_resultado, registro por registro.
+
+RAW_COLUMNS = ["registro", "campo", "valor"]
+
+NULL_VALUES = ['', '-', 'NINGUNO']
+
+# Caracteres para los que str.isspace() es verdadero (lo que \s y strip() eliminan
+# en Python), explícitos para que las operaciones de Arrow den el mismo resultado
+WHITESPACE_CHARS = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004"
+    "\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+)
+WHITESPACE_RUN = f"[{WHITESPACE_CHARS}]+"
+
+# Con pyarrow las operaciones de texto corren en Arrow; sin él, en Python
+try:
+    import pyarrow
+    TEXT_DTYPE = pd.ArrowDtype(pyarrow.string())
+except ImportError:
+    TEXT_DTYPE = object
+
+
+def raw_rows(records: list) -> pd.DataFrame:
+    """
+    Convierte registros sin formatear ({label: valor}, p. ej. de
+    parser.extract_raw_fields) al formato largo que recibe format_frame. Un
+    registro sin campos queda como una fila con campo nulo, para que
+    format_frame lo devuelva como fila vacía.
+    """
+    rows = [
+        (registro, campo, valor)
+        for registro, record in enumerate(records)
+        for campo, valor in (record.items() if record else [(None, None)])
+    ]
+    return pd.DataFrame(rows, columns=RAW_COLUMNS)
+
+
+def format_values(values: pd.Series) -> pd.Series:
+    """
+    clean_value_text vectorizado. Los valores que no son texto se mantienen.
+    """
+    # Cada valor distinto se limpia una sola vez; los nulos se mantienen tal cual
+    codes, uniques = pd.factorize(values.astype(object))
+    uniques = np.asarray(uniques, dtype=object)
+    is_text = np.array([type(value) is str for value in uniques], dtype=bool)
+
+    cleaned = uniques.copy()
+    if is_text.any():
+        cleaned[is_text] = _clean_unique(uniques[is_text])
+
+    result = values.to_numpy(dtype=object, copy=True)
+    found = codes >= 0
+    result[found] = cleaned[codes[found]]
+    return pd.Series(result, index=values.index, dtype=object)
+
+
+def _mask(series: pd.Series) -> np.ndarray:
+    return np.array(series.to_numpy(dtype=bool, na_value=False), dtype=bool)
+
+
+def _normalize(text: pd.Series) -> pd.Series:
+    # text.strip() + re.sub(r'\s+', ' ', ...) con el mismo conjunto de espacios en ambos motores
+    return text.str.strip(WHITESPACE_CHARS).str.replace(WHITESPACE_RUN, ' ', regex=True)
+
+
+def _contains_case(text: pd.Series, needle: str, upper: bool) -> np.ndarray:
+    """
+    needle in s.upper() (o s.lower()). En textos no ASCII se usa str.upper de
+    Python, porque sus reglas difieren de las de Arrow (p. ej. 'ß' -> 'SS').
+    """
+    converted = text.str.upper() if upper else text.str.lower()
+    found = _mask(converted.str.contains(needle, regex=False))
+    non_ascii = np.flatnonzero(~_mask(text.str.isascii()))
+    if len(non_ascii):
+        found[non_ascii] = [
+            needle in (value.upper() if upper else value.lower())
+            for value in text.iloc[non_ascii].astype(object)
+        ]
+    return found
+
+
+def _clean_unique(raw: np.ndarray) -> np.ndarray:
+    result = np.full(len(raw), None, dtype=object)
+
+    valid = np.flatnonzero(~pd.Series(raw, dtype=object).isin(NULL_VALUES).to_numpy())
+    text = _normalize(pd.Series(raw[valid], dtype=object).astype(TEXT_DTYPE))
+    cleaned = text.astype(object).to_numpy(dtype=object, copy=True)
+    pending = np.ones(len(text), dtype=bool)
+
+    has_dash = _mask(text.str.contains('-', regex=False))
+
+    # RUC: 'RUC 123 - NOMBRE'
+    mask = pending & has_dash & _mask(text.str.contains('RUC', regex=False))
+    if mask.any():
+        parts = text[mask].str.split(' - ', n=1, expand=True)
+        if parts.shape[1] == 2:
+            split = _mask(parts[1].notna())
+            joined = parts[0].str.strip(WHITESPACE_CHARS) + ' - ' + parts[1].str.strip(WHITESPACE_CHARS)
+            cleaned[np.flatnonzero(mask)[split]] = joined[split].astype(object).to_numpy()
+        pending &= ~mask
+
+    # DNI: 'DNI 123 - NOMBRE'
+    mask = pending & has_dash & _mask(text.str.contains('DNI', regex=False))
+    if mask.any():
+        groups = text[mask].astype(object).str.extract(DNI_PATTERN)
+        found = groups[0].notna().to_numpy()
+        name = _normalize(groups[1][found])
+        cleaned[np.flatnonzero(mask)[found]] = ('DNI ' + groups[0][found] + ' - ' + name).to_numpy()
+        pending &= ~mask
+
+    # Actividades económicas: 'Principal - 6202 - DESCRIPCIÓN'
+    mask = pending & has_dash & _mask(text.str.startswith('Principal'))
+    if mask.any():
+        groups = text[mask].astype(object).str.extract(ACTIVIDAD_PATTERN)
+        found = groups[0].notna().to_numpy()
+        cleaned[np.flatnonzero(mask)[found]] = (groups[0][found] + ' - ' + groups[1][found].str.strip()).to_numpy()
+        pending &= ~mask
+
+    # Fechas con "desde"
+    rest = np.flatnonzero(pending)
+    afiliado = np.zeros(len(text), dtype=bool)
+    afiliado[rest] = _contains_case(text.iloc[rest], 'AFILIADO DESDE', upper=True)
+    if afiliado.any():
+        groups = text[afiliado].astype(object).str.extract(AFILIADO_DESDE_PATTERN)
+        found = groups[0].notna().to_numpy()
+        cleaned[np.flatnonzero(afiliado)[found]] = (
+            groups[0][found].str.strip() + ' (afiliado desde ' + groups[1][found] + ')'
+        ).to_numpy()
+
+    rest = np.flatnonzero(pending & ~afiliado)
+    desde = np.zeros(len(text), dtype=bool)
+    desde[rest] = _contains_case(text.iloc[rest], 'desde', upper=False)
+    if desde.any():
+        candidates = text[desde].astype(object)
+        # Con "(desde dd/mm/aaaa)" ya está bien formateado
+        otros = candidates[candidates.str.extract(DESDE_PARENTESIS_PATTERN)[0].isna().to_numpy()]
+        groups = otros.str.extract(DESDE_PATTERN)
+        found = groups[0].notna().to_numpy()
+        positions = np.flatnonzero(desde)[candidates.index.get_indexer(otros.index)][found]
+        cleaned[positions] = (groups[0][found].str.strip() + ' (desde ' + groups[1][found] + ')').to_numpy()
+
+    result[valid] = cleaned
+    return result
+
+
+def format_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Formatea un lote completo de campos sin formatear.
+
+    Args:
+        raw: Filas largas con columnas registro, campo (label de SUNAT) y valor,
+             en el orden en que se extrajeron
+
+    Returns:
+        Un registro por fila (índice = registro), con las mismas columnas y
+        valores que pd.DataFrame([format_record(r) for r in registros])
+    """
+    registro_codes, registros = pd.factorize(raw["registro"])
+    # Registros sin campos (campo nulo, ver raw_rows): solo ocupan su fila
+    con_campo = raw["campo"].notna().to_numpy()
+    if not con_campo.all():
+        registro_codes = registro_codes[con_campo]
+        raw = raw[con_campo]
+    if not len(raw):
+        return pd.DataFrame(index=pd.Index(registros, name="registro"))
+
+    # Claves: cada label distinto se convierte una sola vez (snake_case + FIELD_MAPPING)
+    label_codes, labels = pd.factorize(raw["campo"])
+    keys = [field_keys(label) for label in labels]
+    snake_codes, _ = pd.factorize(pd.Series([snake for snake, _ in keys], dtype=object))
+    clave_codes, claves = pd.factorize(pd.Series([clave for _, clave in keys], dtype=object))
+    snake = snake_codes[label_codes]
+    clave = clave_codes[label_codes]
+
+    # Labels repetidos en snake_case: posición de la primera aparición, valor de la última
+    grupo = registro_codes.astype(np.int64) * (snake.max() + 1) + snake
+    primera, ultima = _first_last(grupo)
+
+    # Varias claves snake_case con el mismo mapeo: prevalece la que apareció
+    # por primera vez más tarde; la columna ocupa la posición de la primera
+    por_aparicion = np.argsort(primera, kind="stable")
+    primera, ultima = primera[por_aparicion], ultima[por_aparicion]
+    registro = registro_codes[primera]
+    columna = clave[primera]
+    grupo = registro.astype(np.int64) * (len(claves) + 1) + columna
+    inicio, fin = _first_last(grupo)
+    orden = primera[inicio]
+    valor_fila = ultima[fin]
+    registro, columna = registro[inicio], columna[inicio]
+
+    valores = format_values(pd.Series(raw["valor"].to_numpy(dtype=object)[valor_fila], dtype=object))
+
+    # Columnas en el orden en que aparecen recorriendo los registros en orden
+    recorrido = np.lexsort((orden, registro))
+    _, primeras = np.unique(columna[recorrido], return_index=True)
+    columnas = columna[recorrido][np.sort(primeras)]
+    posicion_columna = np.empty(len(claves), dtype=np.int64)
+    posicion_columna[columnas] = np.arange(len(columnas))
+
+    matrix = np.full((len(registros), len(columnas)), None, dtype=object)
+    matrix[registro, posicion_columna[columna]] = valores.to_numpy()
+    return pd.DataFrame(
+        matrix,
+        index=pd.Index(registros, name="registro"),
+        columns=[claves[i] for i in columnas],
+    )
+
+
+def _first_last(grupo: np.ndarray) -> tuple:
+    """
+    Filas de la primera y de la última aparición de cada grupo (en el orden de grupo).
+    """
+    _, primeras, inverse = np.unique(grupo, return_index=True, return_inverse=True)
+    ultimas = np.zeros(len(primeras), dtype=np.int64)
+    np.maximum.at(ultimas, inverse.ravel(), np.arange(len(grupo)))
+    return primeras, ultimas
@@ -0,0 +1,300 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from playwright.sync_api import sync_playwright
+from .metrics import BROWSERS_ACTIVE, SCRAPE_PHASE_SECONDS
+
+# Argumentos de lanzamiento compartidos por el pool y por el modo debug
+LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--disable-web-security',
+    '--disable-features=VizDisplayCompositor'
+]
+
+VIEWPORT = {"width": 1366, "height": 768}
+
+EXTRA_HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive'
+}
+
+# Timeout por defecto de cada acción de Playwright en el flujo de búsqueda
+PAGE_TIMEOUT_MS = 60000
+
+_STOP = object()
+
+
+def job_timeout() -> float:
+    """
+    Segundos máximos de un trabajo del pool una vez que un navegador lo toma
+    (SUNAT_POOL_JOB_TIMEOUT). Por defecto tres veces el timeout de página:
+    navegación, envío del formulario y espera del resultado.
+    """
+    return float(os.getenv('SUNAT_POOL_JOB_TIMEOUT', str(3 * PAGE_TIMEOUT_MS / 1000)))
+
+
+def pool_size() -> int:
+    return int(os.getenv('SUNAT_POOL_SIZE', '2'))
+
+
+def launch_browser(playwright, debug_mode: bool = False):
+    """
+    Lanza Chromium con la configuración anti-detección del scraper.
+    """
+    return playwright.chromium.launch(
+        headless=not debug_mode,  # headless=False solo en debug mode
+        slow_mo=500 if debug_mode else 0,    # Slow motion solo en debug
+        args=LAUNCH_ARGS
+    )
+
+
+def new_context(browser):
+    """
+    Crea un BrowserContext aislado (cookies y caché propios) con user agent y viewport realistas.
+    """
+    return browser.new_context(viewport=VIEWPORT, extra_http_headers=EXTRA_HTTP_HEADERS)
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    Hilo dueño de un navegador. La API sync de Playwright solo puede usarse desde
+    el hilo que la creó, por eso cada navegador vive en su propio hilo y recibe
+    trabajos a través de la cola compartida del pool.
+    """
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        super().__init__(name=f"sunat-browser-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.browser = None
+        self.uses = 0
+        self.launches = 0
+        self.recycles = 0
+        # Marcado por el pool cuando un trabajo suyo excede el timeout: al
+        # terminar ese trabajo (si termina) cierra su navegador y sale
+        self.retired = False
+
+    def run(self):
+        with sync_playwright() as p:
+            self._playwright = p
+            try:
+                self._ensure_browser()
+            except Exception as e:
+                print(f"✗ No se pudo lanzar el navegador {self.index}: {str(e)}")
+
+            while True:
+                try:
+                    job = self.pool._jobs.get(timeout=self.pool.health_interval)
+                except queue.Empty:
+                    self._health_check()
+                    continue
+
+                if job is _STOP:
+                    break
+
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                future.worker = self
+                future.started_at = time.monotonic()
+
+                try:
+                    browser = self._ensure_browser()
+                    context = new_context(browser)
+                    try:
+                        future.set_result(fn(context))
+                    finally:
+                        try:
+                            context.close()
+                        except Exception:
+                            pass
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    self.uses += 1
+                    if self.retired:
+                        print(f"♻️ Navegador {self.index} retirado tras exceder el timeout, cerrándolo")
+                    elif self.uses >= self.pool.max_uses:
+                        print(f"♻️ Reciclando navegador {self.index} tras {self.uses} consultas")
+                        self._close_browser()
+                        self.recycles += 1
+
+                if self.retired:
+                    break
+
+            self._close_browser()
+
+    def _ensure_browser(self):
+        if self.browser is None or not self.browser.is_connected():
+            self._close_browser()
+            inicio = time.perf_counter()
+            self.browser = launch_browser(self._playwright)
+            SCRAPE_PHASE_SECONDS.observe(time.perf_counter() - inicio, phase="lanzamiento_navegador")
+            BROWSERS_ACTIVE.inc()
+            self.uses = 0
+            self.launches += 1
+        return self.browser
+
+    def _health_check(self):
+        if self.browser is not None and not self.browser.is_connected():
+            print(f"⚠️ Navegador {self.index} desconectado, relanzando...")
+            try:
+                self._ensure_browser()
+            except Exception as e:
+                print(f"✗ No se pudo relanzar el navegador {self.index}: {str(e)}")
+
+    def _close_browser(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+            BROWSERS_ACTIVE.dec()
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chromium de larga vida. Cada consulta recibe un
+    BrowserContext nuevo sobre un navegador ya lanzado, evitando el arranque
+    en frío de Chromium en cada búsqueda.
+
+    Args:
+        size: Número de navegadores (SUNAT_POOL_SIZE, por defecto 2)
+        max_uses: Consultas antes de reciclar un navegador (SUNAT_POOL_MAX_USES, por defecto 50)
+        health_interval: Segundos entre chequeos de salud en reposo (SUNAT_POOL_HEALTH_INTERVAL, por defecto 30)
+        timeout: Segundos máximos de cada trabajo en un navegador (SUNAT_POOL_JOB_TIMEOUT, ver job_timeout)
+    """
+
+    def __init__(self, size: int = None, max_uses: int = None, health_interval: float = None,
+                 timeout: float = None):
+        self.size = size if size is not None else pool_size()
+        self.max_uses = max_uses if max_uses is not None else int(os.getenv('SUNAT_POOL_MAX_USES', '50'))
+        self.health_interval = health_interval if health_interval is not None else float(os.getenv('SUNAT_POOL_HEALTH_INTERVAL', '30'))
+        self.timeout = timeout if timeout is not None else job_timeout()
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self.timeouts = 0
+
+    @property
+    def running(self) -> bool:
+        return any(worker.is_alive() for worker in self._workers)
+
+    def start(self):
+        if self.running:
+            return self
+        self._workers = [self._new_worker() for _ in range(self.size)]
+        for worker in self._workers:
+            worker.start()
+        print(f"🚀 Pool de navegadores iniciado ({self.size} navegadores)")
+        return self
+
+    def _new_worker(self) -> _BrowserWorker:
+        worker = _BrowserWorker(self, self._next_index)
+        self._next_index += 1
+        return worker
+
+    def stop(self, timeout: float = 30):
+        for _ in self._workers:
+            self._jobs.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+        print("🛑 Pool de navegadores detenido")
+
+    def submit(self, fn) -> Future:
+        """
+        Encola fn(context) para ejecutarse en el siguiente navegador libre.
+        """
+        if not self.running:
+            raise RuntimeError("El pool de navegadores no está iniciado")
+        future = Future()
+        self._jobs.put((fn, future))
+        return future
+
+    def run(self, fn, timeout: float = None):
+        """
+        Ejecuta fn(context) en el pool y espera su resultado. El timeout
+        (por defecto el del pool) cuenta desde que un navegador toma el
+        trabajo, no mientras espera en la cola. Si se excede, el navegador
+        se retira y se reemplaza por uno nuevo.
+
+        Raises:
+            TimeoutError: El navegador no terminó el trabajo a tiempo
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        future = self.submit(fn)
+        while True:
+            started_at = getattr(future, "started_at", None)
+            remaining = self.health_interval if started_at is None else started_at + timeout - time.monotonic()
+            try:
+                return future.result(timeout=max(0.0, min(remaining, self.health_interval)))
+            except FutureTimeoutError:
+                started_at = getattr(future, "started_at", None)
+                if started_at is not None and time.monotonic() - started_at >= timeout:
+                    self._retire(future.worker)
+                    raise TimeoutError(f"El navegador no respondió en {timeout:.0f} segundos")
+
+    def _retire(self, worker: _BrowserWorker):
+        """
+        Saca del pool un navegador trabado y arranca otro en su lugar. El hilo
+        retirado no toma más trabajos; si su llamada a Playwright vuelve,
+        cierra el navegador y termina.
+        """
+        with self._lock:
+            if worker.retired or worker not in self._workers:
+                return
+            worker.retired = True
+            self.timeouts += 1
+            reemplazo = self._new_worker()
+            self._workers[self._workers.index(worker)] = reemplazo
+        print(f"⏱️ Navegador {worker.index} excedió el timeout, reemplazándolo por el {reemplazo.index}")
+        reemplazo.start()
+
+    def stats(self) -> dict:
+        return {
+            "navegadores": self.size,
+            "activos": sum(1 for w in self._workers if w.browser is not None),
+            "pendientes": self._jobs.qsize(),
+            "lanzamientos": sum(w.launches for w in self._workers),
+            "reciclados": sum(w.recycles for w in self._workers),
+            "timeouts": self.timeouts,
+        }
+
+
+_pool = None
+
+
+def start_browser_pool(size: int = None) -> BrowserPool:
+    """
+    Inicia el pool global usado por scrape_sunat. Con tamaño 0 el pool queda
+    deshabilitado y cada consulta lanza su propio navegador.
+    """
+    global _pool
+    pool = BrowserPool(size=size)
+    if pool.size <= 0:
+        return None
+    _pool = pool.start()
+    return _pool
+
+
+def stop_browser_pool():
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def get_browser_pool():
+    if _pool is not None and _pool.running:
+        return _pool
+    return None
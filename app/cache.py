@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from .scraper import scrape_sunat, iter_scrape_sunat
+from .metrics import CACHE_LOOKUPS_TOTAL
+from .resultados import es_resultado_error, es_resultado_negativo
+
+# TTL por defecto (segundos) según tipo de búsqueda
+DEFAULT_TTLS = {
+    "ruc": 24 * 3600,
+    "documento": 24 * 3600,
+    "nombre": 6 * 3600,
+}
+
+
+class ResultCache:
+    """
+    Caché en disco (SQLite) de resultados de scrape_sunat.
+
+    Clave: (search_type, search_value, document_type). Cada tipo de búsqueda
+    tiene su propio TTL, las respuestas "No se encontraron" se guardan con un
+    TTL negativo más corto y los demás errores nunca se guardan. Cada 100
+    escrituras se purgan las entradas vencidas y, si se supera max_entries,
+    las usadas hace más tiempo (LRU).
+
+    Las lecturas no escriben en la base: el último acceso de cada acierto se
+    anota en memoria (solo si el guardado tiene más de touch_interval
+    segundos) y se vuelca junto con la siguiente escritura, o al juntar
+    MAX_PENDING_TOUCHES accesos.
+
+    Args:
+        touch_interval: Segundos de antigüedad del último acceso guardado a
+            partir de los cuales un acierto lo actualiza (SUNAT_CACHE_TOUCH_INTERVAL, por defecto 60)
+    """
+
+    MAX_PENDING_TOUCHES = 1000
+
+    def __init__(self, path: str = None, max_entries: int = None, ttls: dict = None, negative_ttl: float = None,
+                 touch_interval: float = None):
+        self.path = path or os.getenv('SUNAT_CACHE_PATH', 'data/cache/resultados.sqlite')
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SUNAT_CACHE_MAX_ENTRIES', '50000'))
+        self.ttls = ttls or {
+            tipo: float(os.getenv(f'SUNAT_CACHE_TTL_{tipo.upper()}', str(ttl)))
+            for tipo, ttl in DEFAULT_TTLS.items()
+        }
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(os.getenv('SUNAT_CACHE_TTL_NEGATIVO', '3600'))
+        self.touch_interval = touch_interval if touch_interval is not None else float(os.getenv('SUNAT_CACHE_TOUCH_INTERVAL', '60'))
+        self._lock = threading.Lock()
+        self._writes = 0
+        # clave -> último acceso aún no guardado
+        self._touches = {}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Una conexión compartida entre hilos; WAL permite lectores de otros procesos (runner por lotes)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                clave TEXT PRIMARY KEY,
+                tipo_busqueda TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                creado REAL NOT NULL,
+                expira REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_acceso ON resultados (ultimo_acceso)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(search_type: str, search_value: str, document_type: str = "1") -> str:
+        # El tipo de documento solo distingue búsquedas por documento
+        document_type = document_type if search_type == "documento" else ""
+        return f"{search_type}|{document_type}|{search_value.strip().upper()}"
+
+    def get(self, search_type: str, search_value: str, document_type: str = "1"):
+        """
+        Returns:
+            Lista de resultados guardada, o None si no existe o expiró
+        """
+        resultados = self._leer(self.make_key(search_type, search_value, document_type))
+        CACHE_LOOKUPS_TOTAL.inc(search_type=search_type, result="miss" if resultados is None else "hit")
+        return resultados
+
+    def _leer(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expira, ultimo_acceso FROM resultados WHERE clave = ?", (key,)
+            ).fetchone()
+            # Las entradas vencidas se borran en la próxima purga (o al reemplazarse)
+            if row is None or row[1] <= now:
+                return None
+            if now - row[2] >= self.touch_interval:
+                self._touches[key] = now
+                if len(self._touches) >= self.MAX_PENDING_TOUCHES:
+                    self._flush_touches()
+                    self._conn.commit()
+        return json.loads(row[0])
+
+    def _flush_touches(self):
+        """
+        Guarda los últimos accesos anotados en memoria (dentro de la
+        transacción del llamador, con el lock tomado)
+        """
+        if not self._touches:
+            return
+        self._conn.executemany(
+            "UPDATE resultados SET ultimo_acceso = MAX(ultimo_acceso, ?) WHERE clave = ?",
+            [(acceso, key) for key, acceso in self._touches.items()]
+        )
+        self._touches = {}
+
+    def set(self, search_type: str, search_value: str, document_type: str, resultados: list) -> bool:
+        """
+        Guarda resultados exitosos y negativos. Devuelve False si no son cacheables.
+        """
+        if es_resultado_negativo(resultados):
+            ttl = self.negative_ttl
+        elif es_resultado_error(resultados):
+            return False
+        else:
+            ttl = self.ttls.get(search_type, DEFAULT_TTLS["nombre"])
+
+        key = self.make_key(search_type, search_value, document_type)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resultados (clave, tipo_busqueda, payload, creado, expira, ultimo_acceso) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, search_type, json.dumps(resultados, ensure_ascii=False), now, now + ttl, now)
+            )
+            self._touches.pop(key, None)
+            self._flush_touches()
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(now)
+            self._conn.commit()
+        return True
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM resultados WHERE expira <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM resultados WHERE clave IN ("
+            "SELECT clave FROM resultados ORDER BY ultimo_acceso DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._touches = {}
+            self._conn.execute("DELETE FROM resultados")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total, vigentes = self._conn.execute(
+                "SELECT COUNT(*), SUM(expira > ?) FROM resultados", (time.time(),)
+            ).fetchone()
+        return {"entradas": total, "vigentes": vigentes or 0, "max_entradas": self.max_entries}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Caché global del proceso, o None si está deshabilitada (SUNAT_CACHE=false)
+    """
+    global _cache
+    if os.getenv('SUNAT_CACHE', 'true').lower() != 'true':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def scrape_con_cache(search_value: str, search_type: str = "nombre", document_type: str = "1",
+                     debug_mode: bool = False, usar_cache: bool = True, solo_cache: bool = False,
+                     metadata: dict = None, perfil=None):
+    """
+    scrape_sunat con la caché de resultados delante.
+
+    Args:
+        usar_cache: Si es False se ignora la caché al leer (el resultado nuevo sí se guarda)
+        solo_cache: Si es True nunca se consulta SUNAT
+        metadata: Diccionario opcional que se completa con datos de la consulta
+        perfil: PerfilConsulta opcional que se pasa a scrape_sunat
+
+    Returns:
+        (resultados, desde_cache). resultados es None si solo_cache y no hay entrada.
+    """
+    cache = get_cache()
+
+    if cache is not None and usar_cache:
+        cached = cache.get(search_type, search_value, document_type)
+        if cached is not None:
+            if metadata is not None:
+                metadata["motor"] = "cache"
+            return cached, True
+
+    if solo_cache:
+        return None, False
+
+    resultados = scrape_sunat(
+        search_value, search_type=search_type, document_type=document_type, debug_mode=debug_mode, metadata=metadata,
+        perfil=perfil
+    )
+    if cache is not None:
+        cache.set(search_type, search_value, document_type, resultados)
+    return resultados, False
+
+
+def iter_scrape_con_cache(search_value: str, search_type: str = "nombre", document_type: str = "1",
+                          debug_mode: bool = False, usar_cache: bool = True, metadata: dict = None):
+    """
+    iter_scrape_sunat con la caché delante: con entrada vigente se entregan
+    los resultados guardados; si no, cada resultado en cuanto se obtiene, y la
+    lista completa se guarda al terminar.
+
+    Yields:
+        Diccionario de cada resultado (o de error)
+    """
+    cache = get_cache()
+
+    if cache is not None and usar_cache:
+        cached = cache.get(search_type, search_value, document_type)
+        if cached is not None:
+            if metadata is not None:
+                metadata["motor"] = "cache"
+            yield from cached
+            return
+
+    resultados = []
+    for resultado in iter_scrape_sunat(
+        search_value, search_type=search_type, document_type=document_type, debug_mode=debug_mode, metadata=metadata
+    ):
+        resultados.append(resultado)
+        yield resultado
+    if cache is not None:
+        cache.set(search_type, search_value, document_type, resultados)
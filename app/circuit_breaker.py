@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitBreaker:
+    """
+    Corta las consultas a SUNAT durante una caída. Tras threshold consultas
+    seguidas que terminan en error de conexión (reset, red, timeout) el
+    circuito se abre y las consultas fallan al instante, sin lanzar el
+    navegador ni esperar reintentos. Pasados reset_timeout segundos queda
+    semiabierto: una sola consulta de prueba pasa; si funciona el circuito se
+    cierra y si falla vuelve a abrirse.
+
+    Args:
+        threshold: Fallos de conexión consecutivos para abrir (SUNAT_BREAKER_THRESHOLD, por defecto 5)
+        reset_timeout: Segundos abierto antes de probar de nuevo (SUNAT_BREAKER_RESET_TIMEOUT, por defecto 30)
+    """
+
+    def __init__(self, threshold: int = None, reset_timeout: float = None):
+        self.threshold = threshold if threshold is not None else int(os.getenv('SUNAT_BREAKER_THRESHOLD', '5'))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv('SUNAT_BREAKER_RESET_TIMEOUT', '30'))
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self.fallos_consecutivos = 0
+        self.aperturas = 0
+        self.rechazadas = 0
+        self.ultimo_error = None
+        self._abierto_hasta = 0.0
+        self._sonda_en_curso = False
+
+    def permitir(self) -> bool:
+        """
+        Indica si la consulta puede ir a SUNAT. En estado semiabierto solo
+        deja pasar una consulta de prueba a la vez.
+        """
+        with self._lock:
+            if self.estado == ABIERTO and time.monotonic() >= self._abierto_hasta:
+                self.estado = SEMIABIERTO
+                self._sonda_en_curso = False
+                print("🔌 Circuito semiabierto: probando si SUNAT responde...")
+            if self.estado == CERRADO:
+                return True
+            if self.estado == SEMIABIERTO and not self._sonda_en_curso:
+                self._sonda_en_curso = True
+                return True
+            self.rechazadas += 1
+            return False
+
+    def record_success(self):
+        """
+        SUNAT respondió (con datos o con un "No se encontraron")
+        """
+        with self._lock:
+            if self.estado != CERRADO:
+                print("✅ Circuito cerrado: SUNAT vuelve a responder")
+            self.estado = CERRADO
+            self.fallos_consecutivos = 0
+            self._sonda_en_curso = False
+
+    def record_failure(self, error: str = None):
+        """
+        La consulta terminó en error de conexión (después de sus reintentos)
+        """
+        with self._lock:
+            self.fallos_consecutivos += 1
+            self.ultimo_error = error
+            self._sonda_en_curso = False
+            # threshold 0 desactiva el circuito
+            if self.threshold > 0 and (self.estado == SEMIABIERTO or self.fallos_consecutivos >= self.threshold):
+                self.estado = ABIERTO
+                self._abierto_hasta = time.monotonic() + self.reset_timeout
+                self.aperturas += 1
+                print(f"⛔ Circuito abierto tras {self.fallos_consecutivos} fallos de conexión; "
+                      f"se vuelve a probar en {self.reset_timeout:.0f}s")
+
+    def release(self):
+        """
+        La consulta terminó con un error que no dice nada de la disponibilidad
+        de SUNAT: no cuenta como éxito ni como fallo, pero libera la prueba.
+        """
+        with self._lock:
+            self._sonda_en_curso = False
+
+    def reintentar_en(self) -> float:
+        """
+        Segundos hasta la próxima consulta de prueba (0 si el circuito no está abierto)
+        """
+        with self._lock:
+            if self.estado != ABIERTO:
+                return 0.0
+            return max(0.0, self._abierto_hasta - time.monotonic())
+
+    def error_result(self) -> list:
+        """
+        Resultado de una consulta rechazada con el circuito abierto (mismo
+        formato de error que scrape_sunat; la API lo responde con 503)
+        """
+        return [{"error": f"Error de conexión: SUNAT no disponible (circuito abierto). "
+                          f"Reintente en {max(1, round(self.reintentar_en()))} segundos."}]
+
+    def stats(self) -> dict:
+        reintentar_en = self.reintentar_en()
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_consecutivos": self.fallos_consecutivos,
+                "umbral": self.threshold,
+                "reintentar_en": round(reintentar_en, 1),
+                "aperturas": self.aperturas,
+                "rechazadas": self.rechazadas,
+                "ultimo_error": self.ultimo_error,
+            }
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker()
+        return _breaker
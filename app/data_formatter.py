@@ -1,6 +1,21 @@
 import re
+from functools import lru_cache
 from typing import Dict, Any
 
+# Patrones compilados una sola vez
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+UNDERSCORES_PATTERN = re.compile(r'_+')
+DNI_PATTERN = re.compile(r'DNI\s+(\d+)\s*-\s*(.+)')
+ACTIVIDAD_PATTERN = re.compile(r'Principal\s*-\s*(\d+)\s*-\s*(.+)')
+AFILIADO_DESDE_PATTERN = re.compile(r'(.+?)\s+AFILIADO\s+DESDE\s+(\d{2}/\d{2}/\d{4})', re.IGNORECASE)
+DESDE_PARENTESIS_PATTERN = re.compile(r'(.+?)\s*\(desde\s+(\d{2}/\d{2}/\d{4})\)', re.IGNORECASE)
+DESDE_PATTERN = re.compile(r'(.+?)\s+desde\s+(\d{2}/\d{2}/\d{4})', re.IGNORECASE)
+FECHA_PATTERN = re.compile(r'(\d{2}/\d{2}/\d{4})')
+
+# Los labels de SUNAT son un conjunto pequeño; la memoria de conversiones se acota igual
+LABEL_CACHE_SIZE = 4096
+
 def clean_and_format_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Limpia y formatea los datos extraídos de SUNAT.
@@ -22,21 +37,54 @@ def clean_and_format_data(data: Dict[str, Any]) -> Dict[str, Any]:
     
     return cleaned_data
 
+def format_record(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    clean_and_format_data + apply_field_mapping en una sola pasada sobre el registro.
+    El resultado es idéntico a aplicar ambas funciones por separado.
+    """
+    if not isinstance(data, dict):
+        return data
+
+    record = {}
+    seen = set()
+    # Clave mapeada -> clave snake_case cuyo valor prevalece (la última en aparecer por primera vez)
+    winners = {}
+
+    for key, value in data.items():
+        snake_key, mapped_key = field_keys(key)
+        if snake_key not in seen:
+            seen.add(snake_key)
+            winners[mapped_key] = snake_key
+        elif winners[mapped_key] != snake_key:
+            continue
+        record[mapped_key] = clean_value_text(value) if isinstance(value, str) else value
+
+    return record
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def field_keys(label: str) -> tuple:
+    """
+    (clave snake_case, clave estandarizada) de un label de SUNAT
+    """
+    snake_key = convert_to_snake_case(label)
+    return snake_key, FIELD_MAPPING.get(snake_key, snake_key)
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
 def convert_to_snake_case(text: str) -> str:
     """
     Convierte texto a snake_case.
     """
     # Reemplazar caracteres especiales y espacios
-    text = re.sub(r'[^\w\s]', '', text)
+    text = NON_WORD_PATTERN.sub('', text)
     
     # Reemplazar espacios múltiples con uno solo
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = WHITESPACE_PATTERN.sub(' ', text).strip()
     
     # Convertir a snake_case
     text = text.lower().replace(' ', '_')
     
     # Limpiar underscores múltiples
-    text = re.sub(r'_+', '_', text)
+    text = UNDERSCORES_PATTERN.sub('_', text)
     
     # Remover underscores al inicio y final
     text = text.strip('_')
@@ -51,7 +99,7 @@ def clean_value_text(text: str) -> str:
         return None
     
     # Remover tabs, saltos de línea y espacios extra
-    text = re.sub(r'\s+', ' ', text.strip())
+    text = WHITESPACE_PATTERN.sub(' ', text.strip())
     
     # Casos especiales según el contenido
     if 'RUC' in text and '-' in text:
@@ -70,10 +118,6 @@ def clean_value_text(text: str) -> str:
         # Limpiar fechas con "desde"
         return format_date_field(text)
     
-    # Convertir fechas simples
-    if re.match(r'^\d{2}/\d{2}/\d{4}$', text):
-        return text
-    
     return text
 
 def format_ruc_field(text: str) -> str:
@@ -92,23 +136,21 @@ def format_dni_field(text: str) -> str:
     Formatea campo de DNI limpiando tabs y espacios extra
     """
     # Buscar patrón DNI número - NOMBRE
-    pattern = r'DNI\s+(\d+)\s*-\s*(.+)'
-    match = re.search(pattern, text)
+    match = DNI_PATTERN.search(text)
     
     if match:
         dni = match.group(1)
-        name = re.sub(r'\s+', ' ', match.group(2).strip())
+        name = WHITESPACE_PATTERN.sub(' ', match.group(2).strip())
         return f"DNI {dni} - {name}"
     
-    return re.sub(r'\s+', ' ', text.strip())
+    return WHITESPACE_PATTERN.sub(' ', text.strip())
 
 def format_economic_activity(text: str) -> str:
     """
     Formatea actividades económicas: 'Principal - 6202 - DESCRIPCIÓN'
     """
     # Buscar patrón Principal - código - descripción
-    pattern = r'Principal\s*-\s*(\d+)\s*-\s*(.+)'
-    match = re.search(pattern, text)
+    match = ACTIVIDAD_PATTERN.search(text)
     
     if match:
         code = match.group(1)
@@ -123,8 +165,7 @@ def format_date_field(text: str) -> str:
     """
     # Caso: "RECIBOS POR HONORARIOS AFILIADO DESDE 03/01/2017"
     if 'AFILIADO DESDE' in text.upper():
-        pattern = r'(.+?)\s+AFILIADO\s+DESDE\s+(\d{2}/\d{2}/\d{4})'
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = AFILIADO_DESDE_PATTERN.search(text)
         if match:
             description = match.group(1).strip()
             date = match.group(2)
@@ -132,14 +173,12 @@ def format_date_field(text: str) -> str:
     
     # Caso: "RECIBO POR HONORARIO (desde 03/01/2017)"
     elif 'desde' in text.lower():
-        pattern = r'(.+?)\s*\(desde\s+(\d{2}/\d{2}/\d{4})\)'
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = DESDE_PARENTESIS_PATTERN.search(text)
         if match:
             return text  # Ya está bien formateado
         
         # Otro formato de desde
-        pattern = r'(.+?)\s+desde\s+(\d{2}/\d{2}/\d{4})'
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = DESDE_PATTERN.search(text)
         if match:
             description = match.group(1).strip()
             date = match.group(2)
@@ -151,8 +190,7 @@ def extract_date_from_text(text: str) -> str:
     """
     Extrae solo la fecha de un texto si existe
     """
-    pattern = r'(\d{2}/\d{2}/\d{4})'
-    match = re.search(pattern, text)
+    match = FECHA_PATTERN.search(text)
     return match.group(1) if match else text
 
 # Mapeo de campos comunes para estandarizar nombres
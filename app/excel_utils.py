@@ -1,4 +1,7 @@
+import math
+import os
 import pandas as pd
+from openpyxl import load_workbook
 
 def read_excel(path="data/empresas.xlsx", column_name=None):
     """
@@ -34,3 +37,119 @@ def read_excel_multiple_columns(path="data/empresas.xlsx"):
     """
     df = pd.read_excel(path)
     return df, list(df.columns)
+
+# Lectura en streaming: los valores se entregan de a uno, sin cargar el
+# archivo completo en un DataFrame. Formatos según la extensión.
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+CSV_EXTENSIONS = (".csv", ".txt")
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+CHUNK_SIZE = 10000
+
+
+def iter_values(path="data/empresas.xlsx", column_name=None, skip_rows=0, with_row_numbers=False,
+                chunk_size=CHUNK_SIZE):
+    """
+    Lee una columna de un archivo Excel, CSV o Parquet en streaming.
+
+    Entrega los mismos valores que read_excel (texto, sin celdas vacías) pero
+    de a uno y con memoria constante: openpyxl en modo read-only para xlsx,
+    lectura por bloques para CSV y por lotes de filas para Parquet.
+
+    Args:
+        path: Ruta al archivo (.xlsx, .xlsm, .xls, .csv, .txt, .parquet)
+        column_name: Columna a leer. Si es None, usa la primera columna.
+        skip_rows: Filas de datos a saltar desde el inicio (para retomar una corrida)
+        with_row_numbers: Si es True entrega (número de fila, valor); la fila 1 es el encabezado
+        chunk_size: Filas por bloque en CSV y Parquet
+
+    Yields:
+        Valor de cada fila no vacía, o (fila, valor) con with_row_numbers
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXCEL_EXTENSIONS:
+        filas = _iter_excel(path, column_name, skip_rows)
+    elif extension in CSV_EXTENSIONS:
+        filas = _iter_csv(path, column_name, skip_rows, chunk_size)
+    elif extension in PARQUET_EXTENSIONS:
+        filas = _iter_parquet(path, column_name, skip_rows, chunk_size)
+    else:
+        # .xls y otros formatos que solo lee pandas
+        filas = _iter_pandas(path, column_name, skip_rows)
+
+    for fila, valor in filas:
+        if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+            continue
+        valor = str(valor)
+        yield (fila, valor) if with_row_numbers else valor
+
+
+def _columna(columnas: list, column_name, tipo: str = "Excel") -> int:
+    if not columnas:
+        raise ValueError(f"El archivo {tipo} está vacío")
+    if column_name is None:
+        return 0
+    if column_name not in columnas:
+        raise ValueError(f"El {tipo} debe tener una columna llamada '{column_name}'. Columnas disponibles: {columnas}")
+    return columnas.index(column_name)
+
+
+def _iter_excel(path, column_name, skip_rows):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        hoja = workbook.worksheets[0]
+        # Algunos generadores de xlsx declaran mal el rango usado de la hoja
+        hoja.reset_dimensions()
+        encabezado = next(hoja.iter_rows(min_row=1, max_row=1, values_only=True), None) or ()
+        # Encabezados vacíos con el mismo nombre que les da pandas
+        columnas = [columna if columna is not None else f"Unnamed: {i}" for i, columna in enumerate(encabezado)]
+        indice = _columna(columnas, column_name)
+
+        primera = 2 + skip_rows
+        for fila, valores in enumerate(
+            hoja.iter_rows(min_row=primera, min_col=indice + 1, max_col=indice + 1, values_only=True),
+            start=primera
+        ):
+            yield fila, valores[0]
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path, column_name, skip_rows, chunk_size):
+    columnas = list(pd.read_csv(path, nrows=0).columns)
+    columna = columnas[_columna(columnas, column_name, "CSV")]
+    fila = 2 + skip_rows
+    # dtype=str conserva los ceros a la izquierda de RUC/DNI
+    for bloque in pd.read_csv(path, usecols=[columna], dtype=str, chunksize=chunk_size,
+                              skiprows=range(1, skip_rows + 1)):
+        for valor in bloque[columna].tolist():
+            yield fila, valor
+            fila += 1
+
+
+def _iter_parquet(path, column_name, skip_rows, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Para leer archivos Parquet se necesita pyarrow (pip install pyarrow)")
+
+    archivo = pq.ParquetFile(path)
+    columnas = archivo.schema_arrow.names
+    columna = columnas[_columna(columnas, column_name, "Parquet")]
+    fila = 2
+    for lote in archivo.iter_batches(batch_size=chunk_size, columns=[columna]):
+        # Los lotes enteros anteriores a skip_rows no se convierten
+        if fila - 2 + lote.num_rows <= skip_rows:
+            fila += lote.num_rows
+            continue
+        for valor in lote.column(0).to_pylist():
+            if fila - 2 >= skip_rows:
+                yield fila, valor
+            fila += 1
+
+
+def _iter_pandas(path, column_name, skip_rows):
+    df = pd.read_excel(path)
+    columnas = list(df.columns)
+    columna = columnas[_columna(columnas, column_name)]
+    for fila, valor in enumerate(df[columna].tolist()[skip_rows:], start=2 + skip_rows):
+        yield fila, valor
@@ -0,0 +1,217 @@
+import gzip
+import os
+import random
+import string
+import threading
+from http.cookiejar import Cookie, CookieJar
+from urllib.parse import urlencode, urljoin
+from urllib.request import build_opener, HTTPCookieProcessor, Request
+from bs4 import BeautifulSoup
+from .parser import parse_resultado
+from .rate_limiter import get_rate_limiter
+
+# Base de las URLs de consulta. Se puede apuntar a un servidor local que sirva
+# páginas guardadas de SUNAT para pruebas y benchmarks.
+SUNAT_BASE_URL = os.getenv('SUNAT_BASE_URL', 'https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc').rstrip('/')
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
+    'Accept-Encoding': 'gzip',
+    'Connection': 'keep-alive'
+}
+
+
+def http_fast_path_enabled() -> bool:
+    return os.getenv('SUNAT_HTTP_FAST_PATH', 'true').lower() == 'true'
+
+
+class SunatHttpClient:
+    """
+    Cliente HTTP sin navegador para la consulta por RUC. Mantiene una sesión
+    con cookies, reutiliza los campos del formulario de búsqueda y envía el
+    mismo POST que hace el botón #btnAceptar.
+    """
+
+    def __init__(self, base_url: str = None, timeout: float = None):
+        self.base_url = (base_url or SUNAT_BASE_URL).rstrip('/')
+        self.timeout = timeout if timeout is not None else float(os.getenv('SUNAT_HTTP_TIMEOUT', '15'))
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._jar = CookieJar()
+        self._opener = build_opener(HTTPCookieProcessor(self._jar))
+        self._form = None
+
+    def _request(self, url: str, data: dict = None, referer: str = None) -> str:
+        headers = dict(HTTP_HEADERS)
+        if referer:
+            headers['Referer'] = referer
+        body = urlencode(data).encode('ascii') if data is not None else None
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        with get_rate_limiter().request():
+            with self._opener.open(Request(url, data=body, headers=headers), timeout=self.timeout) as response:
+                raw = response.read()
+                if response.headers.get('Content-Encoding', '').lower() == 'gzip':
+                    raw = gzip.decompress(raw)
+                charset = response.headers.get_content_charset()
+
+        if charset:
+            return raw.decode(charset, errors='replace')
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError:
+            return raw.decode('iso-8859-1')
+
+    def _load_form(self):
+        """
+        Abre la página de búsqueda (establece cookies de sesión) y lee el
+        action y los campos ocultos del formulario.
+        """
+        search_url = f"{self.base_url}/FrameCriterioBusquedaWeb.jsp"
+        soup = BeautifulSoup(self._request(search_url), "lxml")
+        form = soup.select_one("form[action*='jcrS00Alias']") or soup.select_one("form")
+
+        action = form.get("action") if form and form.get("action") else "jcrS00Alias"
+        fields = {}
+        if form:
+            for field in form.select("input[name]"):
+                if field.get("type", "text").lower() in ("hidden", "text"):
+                    fields[field["name"]] = field.get("value", "")
+
+        self._form = {
+            "url": urljoin(search_url, action),
+            "referer": search_url,
+            "fields": fields,
+        }
+
+    def consultar_ruc(self, ruc: str) -> dict:
+        """
+        Consulta un RUC por HTTP.
+
+        Returns:
+            Diccionario formateado igual que parse_resultado, o None si la
+            respuesta no corresponde a la vista de resultado esperada
+        """
+        with self._lock:
+            if self._form is None:
+                self._load_form()
+            form = self._form
+
+        data = dict(form["fields"])
+        data.update({
+            "accion": "consPorRuc",
+            "nroRuc": ruc,
+            "search1": ruc,
+            "contexto": data.get("contexto") or "ti-it",
+            "modo": data.get("modo") or "1",
+            "rbtnTipo": "1",
+            "tipdoc": data.get("tipdoc") or "1",
+            # El formulario genera un token aleatorio en el navegador
+            "token": "".join(random.choices(string.ascii_lowercase + string.digits, k=52)),
+        })
+
+        html = self._request(form["url"], data=data, referer=form["referer"])
+        result = _resultado_del_ruc(parse_resultado(html), ruc)
+        if result is not None:
+            return result
+
+        # Sesión posiblemente vencida: la próxima consulta vuelve a cargar el formulario
+        with self._lock:
+            self._reset()
+        return None
+
+
+class SesionListado(SunatHttpClient):
+    """
+    Sesión del navegador que cargó un listado de resultados (sus cookies y el
+    formulario selecXNroRuc de la página): abre cada página de detalle con el
+    mismo POST que el click en su enlace a.aRucs, sin volver a pasar por el
+    formulario de búsqueda. Se puede usar desde varios hilos a la vez.
+
+    Args:
+        formulario: {"url", "fields", "referer"} del formulario de detalle, o
+                    None para el de SUNAT (accion=consPorRuc)
+        cookies: Cookies del BrowserContext (context.cookies())
+    """
+
+    def __init__(self, formulario: dict = None, cookies: list = (), base_url: str = None, timeout: float = None):
+        super().__init__(base_url=base_url, timeout=timeout)
+        for cookie in cookies:
+            self._jar.set_cookie(_cookie_de_navegador(cookie))
+        self._form = formulario or {
+            "url": f"{self.base_url}/jcrS00Alias",
+            "referer": f"{self.base_url}/jcrS00Alias",
+            "fields": {"accion": "consPorRuc", "actReturn": "1"},
+        }
+
+    def consultar_detalle(self, ruc: str) -> dict:
+        """
+        Página de detalle de un RUC del listado.
+
+        Returns:
+            Diccionario formateado igual que parse_resultado, o None si la
+            respuesta no corresponde al detalle del RUC (sesión vencida, etc.)
+        """
+        data = dict(self._form["fields"])
+        data["nroRuc"] = ruc
+        html = self._request(self._form["url"], data=data, referer=self._form.get("referer"))
+        return _resultado_del_ruc(parse_resultado(html), ruc)
+
+
+def _resultado_del_ruc(result: dict, ruc: str) -> dict:
+    """
+    Solo se acepta la vista de resultado del RUC consultado ("ruc", "número_de_ruc", ...)
+    """
+    if result and "error" not in result and any(
+        key.endswith("ruc") and str(value or "").startswith(ruc) for key, value in result.items()
+    ):
+        return result
+    return None
+
+
+def _cookie_de_navegador(cookie: dict) -> Cookie:
+    """
+    Cookie de Playwright (context.cookies()) como cookie de http.cookiejar
+    """
+    domain = cookie["domain"]
+    expires = cookie.get("expires", -1)
+    sesion = expires is None or expires < 0
+    return Cookie(
+        0, cookie["name"], cookie["value"], None, False, domain, True, domain.startswith("."),
+        cookie.get("path", "/"), True, cookie.get("secure", False), None if sesion else int(expires), sesion,
+        None, None, {}
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> SunatHttpClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SunatHttpClient()
+        return _client
+
+
+def scrape_ruc_http(ruc: str) -> dict:
+    """
+    Camino rápido sin navegador para búsquedas por RUC.
+
+    Returns:
+        Resultado formateado, o None si hay que recurrir a Playwright
+    """
+    try:
+        result = get_http_client().consultar_ruc(ruc)
+        if result is not None:
+            print(f"⚡ RUC {ruc} obtenido por HTTP directo")
+        return result
+    except Exception as e:
+        print(f"✗ Fallo el camino HTTP para {ruc}: {str(e)}")
+        return None
@@ -0,0 +1,464 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from .cache import get_cache
+from .async_scraper import run_batch
+from .batch import nombre_base_archivos
+from .excel_utils import iter_values
+from .save_utils import StreamingResultWriter, ruta_journal
+from .preflight import planificar
+from .metrics import BATCH_ROWS_TOTAL
+
+EXCEL_ENTRADA = "data/empresas.xlsx"
+TIPOS_DOCUMENTO = {"1": "DNI", "4": "Carnet de Extranjería", "7": "Pasaporte", "A": "Cédula Diplomática"}
+
+ESTADOS_FINALES = {"completado", "cancelado", "error"}
+
+
+def consulta_masiva(tipo_busqueda: str = "nombre", tipo_documento: str = "1", debug: bool = False,
+                    concurrencia: int = None, sin_cache: bool = False, solo_cache: bool = False,
+                    reanudar: bool = False, archivo_excel: str = EXCEL_ENTRADA, base_filename: str = None,
+                    on_progress=None, cancel_event: threading.Event = None, columna: str = None,
+                    saltar_filas: int = 0) -> dict:
+    """
+    Consulta todas las empresas del Excel y guarda los resultados (JSON, Excel,
+    CSV, reporte) a medida que terminan. La usan /consulta-excel y los jobs.
+
+    Args:
+        on_progress: Callback opcional on_progress(evento, datos) por cada fila registrada
+        cancel_event: Si se activa, no se inician más consultas y se guardan las ya hechas
+        columna: Columna de entrada (por defecto la primera)
+        saltar_filas: Filas de datos del inicio que no se leen
+
+    Returns:
+        Resumen de la consulta
+    """
+    print(f"🚀 Iniciando consulta masiva por {tipo_busqueda} desde Excel...")
+    # Revisión previa mientras se lee el archivo en streaming: solo claves
+    # limpias y únicas llegan al scraper
+    plan = planificar(
+        iter_values(archivo_excel, columna, skip_rows=saltar_filas, with_row_numbers=True),
+        tipo_busqueda, tipo_documento, numerados=True
+    )
+    print(f"📋 Se encontraron {plan.filas} registros para consultar")
+    plan.imprimir()
+    total = len(plan.orden)
+
+    # Cada resultado se escribe a disco en cuanto termina, en un journal
+    # estable por Excel y tipo de búsqueda que permite reanudar la consulta
+    filename_base = base_filename or nombre_base_archivos(tipo_busqueda, tipo_documento)
+    tipo_doc = tipo_documento if tipo_busqueda == "documento" else None
+    writer = StreamingResultWriter(
+        filename_base,
+        tipo_busqueda=tipo_busqueda,
+        tipo_documento=tipo_doc,
+        orden=plan.orden,
+        journal_file=ruta_journal(archivo_excel, tipo_busqueda, tipo_doc),
+        reanudar=reanudar
+    )
+    # Filas que el journal ya tiene completas no se vuelven a consultar
+    completados = writer.completados()
+    reanudados = len(completados)
+    processed = 0
+
+    def cancelado():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def avisar(evento, **datos):
+        if on_progress is not None:
+            on_progress(evento, {**datos, "completados": len(completados), "total": total})
+
+    avisar("inicio", reanudados=reanudados, preflight=plan.resumen())
+
+    def registrar(valor, resultados, error_msg=None):
+        completados.add(valor)
+        writer.write(valor, resultados, error_msg)
+        BATCH_ROWS_TOTAL.inc(search_type=tipo_busqueda, outcome="error" if error_msg else "ok")
+        if error_msg:
+            avisar("fila", valor=valor, estado="error", error=error_msg)
+        else:
+            avisar("fila", valor=valor, estado="ok", resultados=len(resultados))
+
+    for _, original, error_msg in plan.rechazados:
+        if original not in completados:
+            registrar(original, [{"error": error_msg}], error_msg)
+    pendientes = [valor for valor in plan.claves if valor not in completados]
+
+    if reanudados:
+        print(f"♻️ {reanudados} registros ya completos en el journal; se consultan {len(pendientes)}")
+
+    cache = get_cache()
+    desde_cache = 0
+
+    def registrar_resultado(valor, resultados, cacheado=False):
+        nonlocal processed
+        if cache is not None and not cacheado:
+            cache.set(tipo_busqueda, valor, tipo_documento, resultados)
+        if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
+            registrar(valor, resultados, f"{valor}: {resultados[0]['error']}")
+            print(f"❌ Error en {valor}: {resultados[0]['error']}")
+        else:
+            registrar(valor, resultados)
+            print(f"✅ Datos obtenidos para {valor}: {len(resultados)} resultado(s)")
+
+        processed += 1
+        # Mostrar progreso cada 5 registros
+        if processed % 5 == 0:
+            print(f"📈 Progreso: {processed}/{plan.filas} registros procesados")
+
+    with writer:
+        # Resolver primero lo que ya está en caché
+        if cache is not None and not sin_cache:
+            for valor in pendientes:
+                if valor in completados:
+                    continue
+                cached = cache.get(tipo_busqueda, valor, tipo_documento)
+                if cached is not None:
+                    registrar_resultado(valor, cached, cacheado=True)
+                    desde_cache += 1
+            pendientes = [valor for valor in pendientes if valor not in completados]
+
+        if solo_cache:
+            for valor in pendientes:
+                registrar_resultado(valor, [{"error": "No hay resultados en caché"}], cacheado=True)
+            pendientes = []
+
+        # Realizar scraping concurrente sobre navegadores compartidos
+        if pendientes and not cancelado():
+            try:
+                run_batch(
+                    pendientes,
+                    search_type=tipo_busqueda,
+                    document_type=tipo_documento,
+                    concurrency=concurrencia,
+                    debug_mode=debug,
+                    on_result=registrar_resultado,
+                    keep_results=False,
+                    cancel_event=cancel_event
+                )
+            except Exception as e:
+                for valor in pendientes:
+                    if valor not in completados:
+                        registrar(valor, [{"error": f"Error procesando {valor}: {str(e)}"}],
+                                  f"Error procesando {valor}: {str(e)}")
+                print(f"💥 Error inesperado en la consulta masiva: {str(e)}")
+
+    print(f"\n📁 Generando archivos finales...")
+
+    # JSON, Excel, CSV (en el orden del Excel) y reporte resumen desde el stream
+    saved_files = writer.close()
+
+    # Preparar respuesta resumida
+    summary = {
+        "mensaje": "⏹️ Consulta cancelada" if cancelado() else "✅ Consulta completada exitosamente",
+        "tipo_busqueda": tipo_busqueda,
+        "total_registros": plan.filas,
+        "registros_procesados": processed,
+        "registros_desde_cache": desde_cache,
+        "registros_reanudados": reanudados,
+        "preflight": plan.resumen(),
+        "total_errores": writer.total_errores,
+        "archivos_generados": saved_files,
+        "resumen": {
+            "registros_con_datos": writer.registros_con_datos,
+            "total_resultados": writer.total_resultados
+        }
+    }
+
+    if cancelado():
+        summary["registros_pendientes"] = total - len(completados)
+
+    if tipo_busqueda == "documento":
+        summary["tipo_documento"] = TIPOS_DOCUMENTO.get(tipo_documento, tipo_documento)
+
+    if writer.total_errores:
+        summary["errores_muestra"] = list(writer.errores_muestra)  # Solo mostrar los primeros 5 errores
+        if writer.total_errores > 5:
+            summary["errores_muestra"].append(f"... y {writer.total_errores - 5} errores más (ver archivo de reporte)")
+
+    print(f"\n🎉 ¡Proceso {'cancelado' if cancelado() else 'completado'}!")
+    print(f"📊 Registros procesados: {processed}")
+    print(f"📁 Archivos guardados en: data/resultados/")
+
+    return summary
+
+
+class BatchJob:
+    """
+    Consulta masiva en segundo plano: estado, contadores y eventos de progreso.
+
+    Los eventos se numeran y se guardan en un buffer acotado
+    (SUNAT_JOBS_EVENTS_BUFFER, por defecto 1000); un cliente SSE que se
+    atrasa más que el buffer continúa desde el evento más antiguo disponible.
+    """
+
+    def __init__(self, params: dict, buffer: int = None):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.estado = "pendiente"
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        self.total = None
+        self.completados = 0
+        self.errores = 0
+        self.reanudados = 0
+        self.resumen = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+        self._eventos = deque(maxlen=buffer or int(os.getenv('SUNAT_JOBS_EVENTS_BUFFER', '1000')))
+        self._siguiente_evento = 0
+        # Reentrante: terminar() publica con el lock tomado
+        self._lock = threading.RLock()
+        # Clientes SSE: asyncio.Event de cada uno -> su event loop
+        self._suscriptores = {}
+
+    @property
+    def finalizado(self) -> bool:
+        return self.estado in ESTADOS_FINALES
+
+    def publicar(self, evento: str, datos: dict):
+        with self._lock:
+            self._eventos.append((self._siguiente_evento, evento, datos))
+            self._siguiente_evento += 1
+            suscriptores = list(self._suscriptores.items())
+        # El job corre en un hilo: cada cliente se despierta en su propio loop
+        for aviso, loop in suscriptores:
+            try:
+                loop.call_soon_threadsafe(aviso.set)
+            except RuntimeError:
+                # Loop cerrado: el cliente ya se fue
+                self.desuscribir(aviso)
+
+    def suscribir(self) -> asyncio.Event:
+        """
+        asyncio.Event del loop actual que se activa con cada evento publicado
+        (ver eventos_sse). Hay que liberarlo con desuscribir().
+        """
+        aviso = asyncio.Event()
+        with self._lock:
+            self._suscriptores[aviso] = asyncio.get_running_loop()
+        return aviso
+
+    def desuscribir(self, aviso: asyncio.Event):
+        with self._lock:
+            self._suscriptores.pop(aviso, None)
+
+    def terminar(self, estado: str):
+        """
+        Marca el estado final y publica el último evento en un solo paso, para
+        que un cliente nunca vea el job terminado sin su evento final.
+        """
+        with self._lock:
+            self.terminado = time.time()
+            self.estado = estado
+            self.publicar(estado, self.as_dict())
+
+    def on_progress(self, evento: str, datos: dict):
+        """
+        Callback de consulta_masiva: actualiza los contadores y publica el evento
+        """
+        self.total = datos["total"]
+        self.completados = datos["completados"]
+        if evento == "inicio":
+            self.reanudados = datos["reanudados"]
+        elif datos.get("estado") == "error":
+            self.errores += 1
+        self.publicar(evento, datos)
+
+    def eventos_desde(self, desde: int) -> list:
+        """
+        Eventos con id >= desde que siguen en el buffer (sin esperar)
+        """
+        with self._lock:
+            return [evento for evento in self._eventos if evento[0] >= desde]
+
+    def filas_por_segundo(self):
+        """
+        Ritmo de las filas de esta corrida (sin las reanudadas del journal)
+        """
+        if self.finalizado or self.iniciado is None:
+            return None
+        hechos = self.completados - self.reanudados
+        transcurrido = time.time() - self.iniciado
+        if hechos <= 0 or transcurrido <= 0:
+            return None
+        return hechos / transcurrido
+
+    def eta(self):
+        """
+        Segundos estimados hasta terminar, según el ritmo de las filas de esta corrida
+        """
+        ritmo = self.filas_por_segundo()
+        if ritmo is None or not self.total:
+            return None
+        return round((self.total - self.completados) / ritmo, 1)
+
+    def as_dict(self) -> dict:
+        def fecha(marca):
+            return datetime.fromtimestamp(marca).isoformat(timespec="seconds") if marca else None
+
+        datos = {
+            "job_id": self.id,
+            "estado": self.estado,
+            "parametros": self.params,
+            "creado": fecha(self.creado),
+            "iniciado": fecha(self.iniciado),
+            "terminado": fecha(self.terminado),
+            "total": self.total,
+            "completados": self.completados,
+            "errores": self.errores,
+            "reanudados": self.reanudados,
+            "progreso": round(100 * self.completados / self.total, 1) if self.total else None,
+            "eta_segundos": self.eta(),
+        }
+        if self.resumen is not None:
+            datos["resumen"] = self.resumen
+        if self.error is not None:
+            datos["error"] = self.error
+        return datos
+
+
+class JobManager:
+    """
+    Ejecuta consultas masivas en un pool de hilos propio, fuera de los hilos
+    que atienden peticiones HTTP.
+
+    Args:
+        max_workers: Jobs simultáneos (SUNAT_JOBS_MAX_WORKERS, por defecto 2)
+        historial: Jobs terminados que se conservan para consulta (SUNAT_JOBS_HISTORY, por defecto 100)
+    """
+
+    def __init__(self, max_workers: int = None, historial: int = None):
+        self.max_workers = max_workers or int(os.getenv('SUNAT_JOBS_MAX_WORKERS', '2'))
+        self.historial = historial or int(os.getenv('SUNAT_JOBS_HISTORY', '100'))
+        self._executor = None
+        self._jobs = {}
+        self._journals = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sunat-job")
+
+    def stop(self):
+        """
+        Cancela los jobs activos y espera a que guarden lo ya consultado
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, **params) -> BatchJob:
+        """
+        Encola una consulta masiva (mismos parámetros que consulta_masiva).
+
+        Raises:
+            RuntimeError: Si ya hay un job activo sobre el mismo journal
+        """
+        tipo_busqueda = params.get("tipo_busqueda", "nombre")
+        tipo_doc = params.get("tipo_documento", "1") if tipo_busqueda == "documento" else None
+        journal = ruta_journal(params.get("archivo_excel", EXCEL_ENTRADA), tipo_busqueda, tipo_doc)
+
+        job = BatchJob(params)
+        with self._lock:
+            if self._executor is None:
+                raise RuntimeError("El gestor de jobs no está iniciado")
+            activo = self._journals.get(journal)
+            if activo is not None:
+                raise RuntimeError(f"Ya hay un job en curso para este Excel y tipo de búsqueda: {activo}")
+            self._journals[journal] = job.id
+            self._jobs[job.id] = job
+            self._purgar()
+            job.publicar("encolado", {"job_id": job.id})
+            self._executor.submit(self._ejecutar, job, journal)
+        return job
+
+    def _ejecutar(self, job: BatchJob, journal: str):
+        estado = "cancelado"
+        try:
+            if job.cancel_event.is_set():
+                return
+            job.estado = "en_curso"
+            job.iniciado = time.time()
+            # Cada job escribe sus propios archivos finales
+            base = "{}_{}".format(
+                nombre_base_archivos(job.params.get("tipo_busqueda", "nombre"), job.params.get("tipo_documento", "1")),
+                job.id[:8]
+            )
+            job.resumen = consulta_masiva(
+                **job.params, base_filename=base, on_progress=job.on_progress, cancel_event=job.cancel_event
+            )
+            estado = "cancelado" if job.cancel_event.is_set() else "completado"
+        except Exception as e:
+            job.error = str(e)
+            estado = "error"
+            print(f"💥 Error en el job {job.id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._journals.pop(journal, None)
+            job.terminar(estado)
+
+    def _purgar(self):
+        terminados = [job for job in self._jobs.values() if job.finalizado]
+        for job in terminados[:max(0, len(terminados) - self.historial)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str):
+        """
+        Pide la cancelación del job: las consultas en curso terminan, no se
+        inician más y se generan los archivos con lo ya consultado.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.finalizado:
+            job.cancel_event.set()
+            job.publicar("cancelando", {"job_id": job.id})
+        return job
+
+
+async def eventos_sse(job: BatchJob, desde: int = 0, keepalive: float = 15.0):
+    """
+    Genera los eventos del job en formato text/event-stream hasta que termina.
+    Espera en el event loop (job.suscribir) sin ocupar un hilo por cliente.
+    """
+    aviso = job.suscribir()
+    try:
+        while True:
+            # Se limpia antes de leer: un evento publicado después despierta la espera
+            aviso.clear()
+            eventos = job.eventos_desde(desde)
+            if not eventos:
+                if job.finalizado:
+                    return
+                try:
+                    await asyncio.wait_for(aviso.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    # Comentario para que proxies no cierren la conexión
+                    yield ": keepalive\n\n"
+                continue
+            for id_evento, evento, datos in eventos:
+                yield f"id: {id_evento}\nevent: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+                desde = id_evento + 1
+                if evento in ESTADOS_FINALES:
+                    return
+    finally:
+        job.desuscribir(aviso)
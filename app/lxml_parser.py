@@ -0,0 +1,249 @@
+from lxml import etree
+
+# Motor de parseo sobre lxml con XPath precompilado. Reproduce exactamente la
+# extracción del parser BeautifulSoup (mismos selectores y mismo get_text),
+# pero recorre cada .list-group-item una sola vez.
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+PANEL_XPATH = etree.XPath(f"(//*[{_has_class('panel')} and {_has_class('panel-primary')}])[1]")
+ITEMS_XPATH = etree.XPath(f".//*[{_has_class('list-group-item')}]")
+
+DIRECT_VIEW_TEXT = "Resultado de la Búsqueda"
+
+# Etiquetas cuyos textos BeautifulSoup tipa aparte (Script, Stylesheet...):
+# get_text() de un elemento solo incluye los textos de su mismo tipo
+_STRING_CONTAINERS = {"script", "style", "template", "rp", "rt"}
+_PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+_ASCII_SPACES = {ord(c): None for c in "\x20\x0a\x09\x0c\x0d"}
+
+_HTML_PARSER = etree.HTMLParser()
+_HTML_PARSER_UTF8 = etree.HTMLParser(encoding="utf-8")
+
+
+def _parse_document(html: str):
+    if not html or not html.strip():
+        return None
+    try:
+        return etree.fromstring(html, _HTML_PARSER)
+    except ValueError:
+        # Cadenas con declaración de encoding: se parsean como bytes
+        return etree.fromstring(html.encode("utf-8"), _HTML_PARSER_UTF8)
+
+
+def _classes(el) -> set:
+    value = el.get("class")
+    return set(value.split()) if value else set()
+
+
+def _is_last_child(el) -> bool:
+    sibling = el.getnext()
+    while sibling is not None:
+        if isinstance(sibling.tag, str):
+            return False
+        sibling = sibling.getnext()
+    return True
+
+
+def _is_second_of_type(el) -> bool:
+    position = 0
+    sibling = el.getprevious()
+    while sibling is not None:
+        if sibling.tag == el.tag:
+            position += 1
+            if position > 1:
+                return False
+        sibling = sibling.getprevious()
+    return position == 1
+
+
+def _text_context(el) -> tuple:
+    """
+    Contenedor de textos más cercano y si se preservan los espacios, según
+    los ancestros de el (incluido él mismo).
+    """
+    container = None
+    preserve = False
+    while el is not None:
+        if container is None and el.tag in _STRING_CONTAINERS:
+            container = el.tag
+        preserve = preserve or el.tag in _PRESERVE_WHITESPACE_TAGS
+        el = el.getparent()
+    return container, preserve
+
+
+def _strings(el, container, preserve):
+    """
+    Textos del subárbol en orden de documento, con el contenedor y la
+    preservación de espacios que les asigna BeautifulSoup al parsear.
+    """
+    if el.text:
+        yield el.text, container, preserve
+    for child in el:
+        if isinstance(child.tag, str):
+            yield from _strings(
+                child,
+                child.tag if child.tag in _STRING_CONTAINERS else container,
+                preserve or child.tag in _PRESERVE_WHITESPACE_TAGS,
+            )
+        if child.tail:
+            yield child.tail, container, preserve
+
+
+def get_text(el, separator: str = "", strip: bool = False) -> str:
+    """
+    Equivalente a Tag.get_text(separator, strip=strip) de BeautifulSoup:
+    sin comentarios y sin textos de scripts, estilos o plantillas (salvo que
+    el propio elemento sea uno de ellos).
+    """
+    target = el.tag if el.tag in _STRING_CONTAINERS else None
+    parts = []
+    for text, container, preserve in _strings(el, *_text_context(el)):
+        if container != target:
+            continue
+        if strip:
+            text = text.strip()
+            if not text:
+                continue
+        elif not preserve and not text.translate(_ASCII_SPACES):
+            # BeautifulSoup colapsa los textos formados solo por espacios
+            text = "\n" if "\n" in text else " "
+        parts.append(text)
+    return separator.join(parts)
+
+
+def _context_flags(item) -> tuple:
+    """
+    Clases de los ancestros del item (incluido él mismo) que intervienen en
+    los selectores descendientes: (.col-sm-5|.col-sm-3, .col-sm-7, .col-sm-3:last-child)
+    """
+    label_ctx = col7_ctx = col3_last_ctx = False
+    el = item
+    while el is not None:
+        classes = _classes(el)
+        label_ctx = label_ctx or "col-sm-5" in classes or "col-sm-3" in classes
+        col7_ctx = col7_ctx or "col-sm-7" in classes
+        col3_last_ctx = col3_last_ctx or ("col-sm-3" in classes and _is_last_child(el))
+        el = el.getparent()
+    return label_ctx, col7_ctx, col3_last_ctx
+
+
+def _scan_item(item) -> dict:
+    """
+    Recorre una sola vez los descendientes del item y guarda el primer
+    elemento (en orden de documento) que cumple cada selector del parser.
+    """
+    found = {}
+
+    def keep(name, el):
+        if name not in found:
+            found[name] = el
+
+    def walk(parent, label_ctx, col7_ctx, col3_last_ctx):
+        for el in parent:
+            if not isinstance(el.tag, str):
+                continue
+            classes = _classes(el)
+            col3 = "col-sm-3" in classes
+            col7 = "col-sm-7" in classes
+            col3_last = col3 and _is_last_child(el)
+
+            # Vista de lista: .col-sm-5, .col-sm-3 / .col-sm-7, .col-sm-3:nth-of-type(2)
+            if col3 or "col-sm-5" in classes:
+                keep("label", el)
+            if col7 or (col3 and _is_second_of_type(el)):
+                keep("value", el)
+
+            # Vista directa
+            if "list-group-item-heading" in classes:
+                if label_ctx:
+                    keep("heading_label", el)
+                if col7_ctx:
+                    keep("col7_heading", el)
+            if "list-group-item-text" in classes:
+                if col7_ctx:
+                    keep("col7_text", el)
+                if col3_last_ctx:
+                    keep("col3_last_text", el)
+            if el.tag == "table" and (col7_ctx or col3_last_ctx):
+                keep("table", el)
+            if col7 or col3_last:
+                keep("container", el)
+
+            walk(
+                el,
+                label_ctx or col3 or "col-sm-5" in classes,
+                col7_ctx or col7,
+                col3_last_ctx or col3_last,
+            )
+
+    walk(item, *_context_flags(item))
+    return found
+
+
+def _campos_vista_directa(panel) -> dict:
+    data = {}
+    for item in ITEMS_XPATH(panel):
+        found = _scan_item(item)
+        label_elem = found.get("heading_label")
+        if label_elem is None:
+            continue
+
+        label = get_text(label_elem, strip=True).replace(":", "")
+
+        value_elem = found.get("col7_text")
+        if value_elem is None:
+            value_elem = found.get("col7_heading")
+        if value_elem is None:
+            value_elem = found.get("col3_last_text")
+
+        if value_elem is not None:
+            value = get_text(value_elem, " ", strip=True)
+        elif "table" in found:
+            rows = list(found["table"].iter("tr"))
+            if len(rows) == 1:
+                value = get_text(rows[0], " ", strip=True)
+            else:
+                value = " | ".join([get_text(row, " ", strip=True) for row in rows if get_text(row, strip=True)])
+        elif "container" in found:
+            value = get_text(found["container"], " ", strip=True)
+        else:
+            value = ""
+
+        if label and value:
+            data[label] = value
+    return data
+
+
+def _campos_lista(panel) -> dict:
+    data = {}
+    for item in ITEMS_XPATH(panel):
+        found = _scan_item(item)
+        label = found.get("label")
+        value = found.get("value")
+        if label is not None and value is not None:
+            data[get_text(label, strip=True).replace(":", "")] = get_text(value, " ", strip=True)
+    return data
+
+
+def extract_raw_fields(html: str):
+    """
+    Extrae los pares campo/valor sin formatear del panel de resultado.
+
+    Returns:
+        Diccionario de campos, o None si el HTML no tiene .panel.panel-primary
+    """
+    root = _parse_document(html)
+    if root is None:
+        return None
+    panels = PANEL_XPATH(root)
+    if not panels:
+        return None
+    panel = panels[0]
+
+    if DIRECT_VIEW_TEXT in get_text(panel):
+        return _campos_vista_directa(panel)
+    return _campos_lista(panel)
@@ -1,10 +1,167 @@
-from fastapi import FastAPI, HTTPException, Query
-from .scraper import scrape_sunat
-from .excel_utils import read_excel
-from .save_utils import save_results_to_files, save_summary_report
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import Body, FastAPI, Header, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from .cache import ResultCache, get_cache, scrape_con_cache, iter_scrape_con_cache
+from .singleflight import SingleFlight
+from .preflight import planificar
+from .browser_pool import start_browser_pool, stop_browser_pool, get_browser_pool
+from .circuit_breaker import get_circuit_breaker
+from .rate_limiter import get_rate_limiter
+from .metrics import REGISTRY, CONTENT_TYPE, BATCH_ROWS_PER_SECOND, CIRCUIT_OPEN, RATE_LIMIT
+from .profiling import PerfilConsulta, profiling_enabled, ruta_archivo
+from .jobs import JobManager, consulta_masiva, eventos_sse
 from .data_formatter import clean_and_format_data, apply_field_mapping
 
-app = FastAPI(title="SUNAT Scraper API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Mantiene el pool de navegadores y el gestor de jobs vivos durante toda la
+    vida de la aplicación
+    """
+    start_browser_pool()
+    job_manager.start()
+    yield
+    job_manager.stop()
+    stop_browser_pool()
+
+app = FastAPI(title="SUNAT Scraper API", lifespan=lifespan)
+
+# Consultas idénticas simultáneas comparten un solo scraping en curso
+consultas_en_curso = SingleFlight()
+
+# Consultas masivas en segundo plano (POST /jobs)
+job_manager = JobManager()
+
+# Perfilado bajo demanda de las consultas (ver app/profiling.py)
+DESCRIPCION_PERFIL = ("Perfilar la consulta: CPU, traza de Playwright y tiempos por paso en "
+                      "SUNAT_PROFILE_DIR, enlazados en metadatos.perfil (siempre consulta SUNAT)")
+
+# Gauges que se calculan al momento de exponer /metrics
+CIRCUIT_OPEN.set_function(lambda: 0 if get_circuit_breaker().estado == "cerrado" else 1)
+RATE_LIMIT.set_function(lambda: get_rate_limiter().stats().get("peticiones_por_segundo"))
+BATCH_ROWS_PER_SECOND.set_function(
+    lambda: round(sum(job.filas_por_segundo() or 0 for job in job_manager.list_jobs()), 3)
+)
+
+def consultar(valor: str, tipo_busqueda: str, tipo_documento: str = "1", debug: bool = False,
+              sin_cache: bool = False, solo_cache: bool = False, perfil: bool = False):
+    """
+    Ejecuta una consulta pasando por la caché de resultados. Las llamadas
+    concurrentes con la misma clave comparten el mismo scraping (y su error).
+    Con perfil la consulta va siempre a SUNAT, sin compartirse, y los enlaces
+    al perfil quedan en metadatos["perfil"].
+    
+    Returns:
+        (resultados, desde_cache, metadatos)
+    """
+    def ejecutar(perfil_consulta=None):
+        metadatos = {}
+        resultados, desde_cache = scrape_con_cache(
+            valor,
+            search_type=tipo_busqueda,
+            document_type=tipo_documento,
+            debug_mode=debug,
+            usar_cache=not sin_cache and perfil_consulta is None,
+            solo_cache=solo_cache,
+            metadata=metadatos,
+            perfil=perfil_consulta
+        )
+        return resultados, desde_cache, metadatos
+    
+    if solo_cache:
+        resultados, desde_cache, metadatos = ejecutar()
+    elif perfil:
+        perfil_consulta = PerfilConsulta(valor, tipo_busqueda)
+        try:
+            resultados, desde_cache, metadatos = ejecutar(perfil_consulta)
+        except Exception:
+            perfil_consulta.cerrar()
+            raise
+        metadatos["perfil"] = perfil_consulta.cerrar()
+    else:
+        clave = (ResultCache.make_key(tipo_busqueda, valor, tipo_documento), debug, sin_cache)
+        resultados, desde_cache, metadatos = consultas_en_curso.do(clave, ejecutar)
+    if resultados is None:
+        raise HTTPException(status_code=404, detail=f"No hay resultados en caché para: {valor}")
+    return resultados, desde_cache, metadatos
+
+def error_de_consulta(error_msg: str, metadatos: dict = None) -> HTTPException:
+    """
+    Error HTTP para una consulta cuyo primer resultado es un error. Si la
+    consulta se perfiló, el enlace al perfil va en la cabecera X-Sunat-Perfil.
+    """
+    headers = {}
+    if metadatos and "perfil" in metadatos:
+        headers["X-Sunat-Perfil"] = metadatos["perfil"]["url"]
+    if "conexión" in error_msg.lower() or "connection" in error_msg.lower():
+        # Con el circuito abierto se indica cuándo vale la pena reintentar
+        reintentar_en = get_circuit_breaker().reintentar_en()
+        if reintentar_en > 0:
+            headers["Retry-After"] = str(max(1, round(reintentar_en)))
+        return HTTPException(status_code=503, detail=error_msg, headers=headers or None)
+    return HTTPException(status_code=400, detail=error_msg, headers=headers or None)
+
+def perfil_solicitado(perfil: bool, x_sunat_perfil: str = None, stream: bool = False) -> bool:
+    """
+    Perfilado pedido con ?perfil=true o con la cabecera X-Sunat-Perfil: 1
+    """
+    solicitado = perfil or (x_sunat_perfil or "").strip().lower() in ("1", "true", "si", "sí")
+    if not solicitado:
+        return False
+    if not profiling_enabled():
+        raise HTTPException(status_code=403, detail="El perfilado de consultas está desactivado (SUNAT_PROFILING=false)")
+    if stream:
+        raise HTTPException(status_code=400, detail="El perfilado no está disponible con stream=true")
+    return True
+
+def respuesta_ndjson(valor: str, tipo_busqueda: str, tipo_documento: str = "1", debug: bool = False,
+                     sin_cache: bool = False, solo_cache: bool = False) -> StreamingResponse:
+    """
+    Respuesta NDJSON (application/x-ndjson): una línea por resultado en cuanto
+    se obtiene ({"tipo": "resultado", ...}) y una línea final con el total y
+    los metadatos ({"tipo": "fin", ...}).
+    """
+    metadatos = {}
+    if solo_cache:
+        cacheados, _, metadatos = consultar(valor, tipo_busqueda, tipo_documento, solo_cache=True)
+        resultados = (resultado for resultado in cacheados)
+    else:
+        resultados = iter_scrape_con_cache(
+            valor, tipo_busqueda, tipo_documento, debug_mode=debug, usar_cache=not sin_cache, metadata=metadatos
+        )
+    
+    # El primer resultado se espera antes de responder: si la consulta falla
+    # se devuelve el mismo código HTTP que sin stream
+    primero = next(resultados, None)
+    if primero is not None and isinstance(primero, dict) and "error" in primero:
+        resultados.close()
+        raise error_de_consulta(primero["error"])
+    
+    def lineas():
+        total = 0
+        try:
+            if primero is not None:
+                total += 1
+                yield json.dumps({"tipo": "resultado", "numero_resultado": total, "datos": primero}, ensure_ascii=False) + "\n"
+            for resultado in resultados:
+                total += 1
+                yield json.dumps({"tipo": "resultado", "numero_resultado": total, "datos": resultado}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"tipo": "error", "error": f"Error interno del servidor: {str(e)}"}, ensure_ascii=False) + "\n"
+            return
+        yield json.dumps({
+            "tipo": "fin",
+            "total_resultados": total,
+            "desde_cache": metadatos.get("motor") == "cache",
+            "metadatos": metadatos
+        }, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
 
 @app.get("/")
 def root():
@@ -20,11 +177,72 @@ def root():
         "ejemplo_datos_formateados": "/ejemplo-formato"
     }
 
+@app.get("/estado")
+def estado():
+    """
+    Estado de la conexión con SUNAT: circuit breaker, limitador de
+    peticiones, pool de navegadores y jobs activos
+    """
+    pool = get_browser_pool()
+    circuito = get_circuit_breaker().stats()
+    return {
+        "sunat_disponible": circuito["estado"] != "abierto",
+        "circuito": circuito,
+        "limitador": get_rate_limiter().stats(),
+        "pool_navegadores": pool.stats() if pool is not None else None,
+        "jobs_activos": sum(1 for job in job_manager.list_jobs() if not job.finalizado),
+    }
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus: duración por paso del
+    scraping, consultas y reintentos, caché, navegadores y páginas abiertas,
+    filas de consultas masivas, circuito y limitador
+    """
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/perfiles/{perfil_id}")
+def perfil_consulta(perfil_id: str):
+    """
+    Archivos de un perfil de consulta y sus tiempos por paso
+    """
+    directorio = ruta_archivo(perfil_id)
+    if directorio is None or not os.path.isdir(directorio):
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {perfil_id}")
+    
+    tiempos = None
+    ruta_tiempos = os.path.join(directorio, "tiempos.json")
+    if os.path.exists(ruta_tiempos):
+        with open(ruta_tiempos, encoding="utf-8") as f:
+            tiempos = json.load(f)
+    return {
+        "id": perfil_id,
+        "archivos": [f"/perfiles/{perfil_id}/{archivo}" for archivo in sorted(os.listdir(directorio))],
+        "tiempos": tiempos
+    }
+
+@app.get("/perfiles/{perfil_id}/{archivo}")
+def archivo_de_perfil(perfil_id: str, archivo: str):
+    """
+    Descarga un archivo de un perfil (cpu.prof, cpu.txt, tiempos.json, traza_*.zip)
+    """
+    ruta = ruta_archivo(perfil_id, archivo)
+    if ruta is None or not os.path.isfile(ruta):
+        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {perfil_id}/{archivo}")
+    return FileResponse(ruta, filename=archivo)
+
 @app.get("/debug-ruc/{ruc}")
-def debug_ruc(ruc: str):
+def debug_ruc(
+    ruc: str,
+    visible: bool = Query(False, description="Abrir el navegador visible con slow_mo en lugar de perfilar (requiere pantalla)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT")
+):
     """
-    Endpoint especial para debuggear problemas con búsqueda por RUC
-    Siempre ejecuta en modo debug visible
+    Endpoint especial para debuggear problemas con búsqueda por RUC.
+    Perfila la consulta en el navegador headless (CPU, traza de Playwright y
+    tiempos por paso); con visible=true abre el navegador visible.
     """
     try:
         # Validar formato básico de RUC
@@ -32,14 +250,20 @@ def debug_ruc(ruc: str):
             raise HTTPException(status_code=400, detail="El RUC debe tener 11 dígitos")
         
         print(f"🔍 DEBUGGING RUC: {ruc}")
-        resultados = scrape_sunat(ruc, search_type="ruc", debug_mode=True)  # Forzar debug
+        perfilar = not visible and not solo_cache and profiling_enabled()
+        resultados, desde_cache, metadatos = consultar(
+            ruc, "ruc", debug=visible, sin_cache=sin_cache, solo_cache=solo_cache, perfil=perfilar
+        )
         
         return {
             "ruc": ruc,
             "tipo_busqueda": "ruc",
-            "modo": "debug",
+            "modo": "perfil" if perfilar else "debug",
             "resultados": resultados,
-            "nota": "Este endpoint siempre ejecuta en modo debug para identificar problemas"
+            "desde_cache": desde_cache,
+            "metadatos": metadatos,
+            "nota": "La traza de Playwright (metadatos.perfil.trazas) guarda capturas y el DOM de cada paso; "
+                    "se abre con 'npx playwright show-trace' o en trace.playwright.dev"
         }
     
     except Exception as e:
@@ -79,22 +303,32 @@ def ejemplo_formato():
     }
 
 @app.get("/consulta/{nombre}")
-def consulta(nombre: str, debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)")):
+def consulta(
+    nombre: str,
+    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT"),
+    stream: bool = Query(False, description="Responder en NDJSON, un resultado por línea a medida que se obtiene"),
+    perfil: bool = Query(False, description=DESCRIPCION_PERFIL),
+    x_sunat_perfil: str = Header(None, description="X-Sunat-Perfil: 1 equivale a perfil=true")
+):
     """
     Consulta información de una empresa por nombre o razón social en SUNAT
     """
     try:
-        resultados = scrape_sunat(nombre, search_type="nombre", debug_mode=debug)
+        perfilar = perfil_solicitado(perfil, x_sunat_perfil, stream)
+        if stream:
+            return respuesta_ndjson(nombre, "nombre", debug=debug, sin_cache=sin_cache, solo_cache=solo_cache)
+        
+        resultados, desde_cache, metadatos = consultar(
+            nombre, "nombre", debug=debug, sin_cache=sin_cache, solo_cache=solo_cache, perfil=perfilar
+        )
         
         # Check if we got error results
         if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
-            error_msg = resultados[0]["error"]
-            if "conexión" in error_msg.lower() or "connection" in error_msg.lower():
-                raise HTTPException(status_code=503, detail=error_msg)
-            else:
-                raise HTTPException(status_code=400, detail=error_msg)
+            raise error_de_consulta(resultados[0]["error"], metadatos)
         
-        return {"nombre": nombre, "tipo_busqueda": "nombre", "resultados": resultados}
+        return {"nombre": nombre, "tipo_busqueda": "nombre", "resultados": resultados, "desde_cache": desde_cache, "metadatos": metadatos}
     
     except HTTPException:
         raise
@@ -102,7 +336,14 @@ def consulta(nombre: str, debug: bool = Query(False, description="Ejecutar en mo
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
 @app.get("/consulta-ruc/{ruc}")
-def consulta_ruc(ruc: str, debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)")):
+def consulta_ruc(
+    ruc: str,
+    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT"),
+    perfil: bool = Query(False, description=DESCRIPCION_PERFIL),
+    x_sunat_perfil: str = Header(None, description="X-Sunat-Perfil: 1 equivale a perfil=true")
+):
     """
     Consulta información de una empresa por RUC en SUNAT
     """
@@ -111,33 +352,125 @@ def consulta_ruc(ruc: str, debug: bool = Query(False, description="Ejecutar en m
         if not ruc.isdigit() or len(ruc) != 11:
             raise HTTPException(status_code=400, detail="El RUC debe tener 11 dígitos")
         
-        resultados = scrape_sunat(ruc, search_type="ruc", debug_mode=debug)
+        resultados, desde_cache, metadatos = consultar(
+            ruc, "ruc", debug=debug, sin_cache=sin_cache, solo_cache=solo_cache,
+            perfil=perfil_solicitado(perfil, x_sunat_perfil)
+        )
         
         # Check if we got error results
         if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
-            error_msg = resultados[0]["error"]
-            if "conexión" in error_msg.lower() or "connection" in error_msg.lower():
-                raise HTTPException(status_code=503, detail=error_msg)
-            else:
-                raise HTTPException(status_code=400, detail=error_msg)
+            raise error_de_consulta(resultados[0]["error"], metadatos)
         
-        return {"ruc": ruc, "tipo_busqueda": "ruc", "resultados": resultados}
+        return {"ruc": ruc, "tipo_busqueda": "ruc", "resultados": resultados, "desde_cache": desde_cache, "metadatos": metadatos}
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+@app.post("/consulta-ruc/batch")
+def consulta_ruc_lote(
+    rucs: List[str] = Body(..., description="Lista de RUCs a consultar"),
+    concurrencia: int = Query(None, ge=1, description="Consultas simultáneas (por defecto SUNAT_BATCH_CONCURRENCY)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT")
+):
+    """
+    Consulta muchos RUCs en una sola petición. Elimina duplicados, valida cada
+    RUC, resuelve primero lo que está en caché y consulta el resto en paralelo.
+    Devuelve los resultados por RUC (en el orden recibido) con sus tiempos.
+    """
+    maximo = int(os.getenv('SUNAT_RUC_BATCH_MAX', '10000'))
+    if len(rucs) > maximo:
+        raise HTTPException(status_code=413, detail=f"Se aceptan hasta {maximo} RUCs por petición (se recibieron {len(rucs)})")
+    
+    inicio = time.perf_counter()
+    # Normaliza, valida (dígito verificador) y elimina duplicados
+    plan = planificar(rucs, "ruc")
+    unicos = plan.orden
+    respuesta = {}
+    for _, original, error_msg in plan.rechazados:
+        respuesta[original] = {"error": error_msg, "tiempo": 0.0}
+    pendientes = list(plan.claves)
+    invalidos = len(unicos) - len(pendientes)
+    
+    def consultar_ruc(ruc):
+        inicio_ruc = time.perf_counter()
+        try:
+            resultados, desde_cache, metadatos = consultar(ruc, "ruc", sin_cache=sin_cache, solo_cache=solo_cache)
+            entrada = {"resultados": resultados, "desde_cache": desde_cache, "metadatos": metadatos}
+        except HTTPException as e:
+            entrada = {"error": e.detail}
+        except Exception as e:
+            entrada = {"error": f"Error procesando {ruc}: {str(e)}"}
+        entrada["tiempo"] = round(time.perf_counter() - inicio_ruc, 3)
+        return ruc, entrada
+    
+    # Lo que está en caché se resuelve sin ocupar los hilos de scraping
+    cache = get_cache()
+    if cache is not None and not sin_cache:
+        restantes = []
+        for ruc in pendientes:
+            inicio_ruc = time.perf_counter()
+            cached = cache.get("ruc", ruc)
+            if cached is None:
+                restantes.append(ruc)
+                continue
+            respuesta[ruc] = {
+                "resultados": cached,
+                "desde_cache": True,
+                "metadatos": {"motor": "cache"},
+                "tiempo": round(time.perf_counter() - inicio_ruc, 3)
+            }
+        pendientes = restantes
+    desde_cache = len(unicos) - invalidos - len(pendientes)
+    
+    if solo_cache:
+        for ruc in pendientes:
+            respuesta[ruc] = {"error": f"No hay resultados en caché para: {ruc}", "tiempo": 0.0}
+    elif pendientes:
+        concurrencia = concurrencia or int(os.getenv('SUNAT_BATCH_CONCURRENCY', '4'))
+        print(f"🚀 Consultando {len(pendientes)} RUCs ({concurrencia} a la vez, {desde_cache} desde caché)")
+        with ThreadPoolExecutor(max_workers=min(concurrencia, len(pendientes))) as executor:
+            for ruc, entrada in executor.map(consultar_ruc, pendientes):
+                respuesta[ruc] = entrada
+    
+    def con_error(entrada):
+        if "error" in entrada:
+            return True
+        resultados = entrada["resultados"]
+        return bool(resultados) and isinstance(resultados[0], dict) and "error" in resultados[0]
+    
+    return {
+        "total_recibidos": len(rucs),
+        "total_unicos": len(unicos),
+        "duplicados": len(rucs) - len(unicos),
+        "normalizados": plan.normalizados,
+        "invalidos": invalidos,
+        "desde_cache": desde_cache,
+        "consultados": 0 if solo_cache else len(pendientes),
+        "total_errores": sum(1 for entrada in respuesta.values() if con_error(entrada)),
+        "tiempo_total": round(time.perf_counter() - inicio, 3),
+        "resultados": {ruc: respuesta[ruc] for ruc in unicos}
+    }
+
 @app.get("/consulta-documento/{numero_documento}")
 def consulta_documento(
     numero_documento: str, 
     tipo_documento: str = Query("1", description="Tipo de documento (1=DNI, 4=Carnet Extranjería, 7=Pasaporte, A=Cédula Diplomática)"),
-    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)")
+    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT"),
+    stream: bool = Query(False, description="Responder en NDJSON, un resultado por línea a medida que se obtiene"),
+    perfil: bool = Query(False, description=DESCRIPCION_PERFIL),
+    x_sunat_perfil: str = Header(None, description="X-Sunat-Perfil: 1 equivale a perfil=true")
 ):
     """
     Consulta información de una empresa por número de documento del representante en SUNAT
     """
     try:
+        perfilar = perfil_solicitado(perfil, x_sunat_perfil, stream)
+
         # Validar tipo de documento
         tipos_validos = ["1", "4", "7", "A"]
         if tipo_documento not in tipos_validos:
@@ -151,22 +484,28 @@ def consulta_documento(
             if not numero_documento.isdigit() or len(numero_documento) != 8:
                 raise HTTPException(status_code=400, detail="El DNI debe tener 8 dígitos")
         
-        resultados = scrape_sunat(numero_documento, search_type="documento", document_type=tipo_documento, debug_mode=debug)
+        if stream:
+            return respuesta_ndjson(
+                numero_documento, "documento", tipo_documento, debug=debug, sin_cache=sin_cache, solo_cache=solo_cache
+            )
+        
+        resultados, desde_cache, metadatos = consultar(
+            numero_documento, "documento", tipo_documento, debug=debug, sin_cache=sin_cache, solo_cache=solo_cache,
+            perfil=perfilar
+        )
         
         # Check if we got error results
         if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
-            error_msg = resultados[0]["error"]
-            if "conexión" in error_msg.lower() or "connection" in error_msg.lower():
-                raise HTTPException(status_code=503, detail=error_msg)
-            else:
-                raise HTTPException(status_code=400, detail=error_msg)
+            raise error_de_consulta(resultados[0]["error"], metadatos)
         
         tipos_doc = {"1": "DNI", "4": "Carnet de Extranjería", "7": "Pasaporte", "A": "Cédula Diplomática"}
         return {
             "numero_documento": numero_documento, 
             "tipo_documento": tipos_doc.get(tipo_documento, tipo_documento),
             "tipo_busqueda": "documento", 
-            "resultados": resultados
+            "resultados": resultados,
+            "desde_cache": desde_cache,
+            "metadatos": metadatos
         }
     
     except HTTPException:
@@ -174,135 +513,138 @@ def consulta_documento(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+def validar_parametros_lote(tipo_busqueda: str, tipo_documento: str):
+    """
+    Valida los parámetros de una consulta masiva (HTTP 400 si no son válidos)
+    """
+    tipos_validos = ["nombre", "ruc", "documento"]
+    if tipo_busqueda not in tipos_validos:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Tipo de búsqueda no válido. Use: {', '.join(tipos_validos)}"
+        )
+    
+    if tipo_busqueda == "documento":
+        tipos_doc_validos = ["1", "4", "7", "A"]
+        if tipo_documento not in tipos_doc_validos:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Tipo de documento no válido. Use: {', '.join(tipos_doc_validos)}"
+            )
+
 @app.get("/consulta-excel")
 def consulta_excel(
     tipo_busqueda: str = Query("nombre", description="Tipo de búsqueda (nombre, ruc, documento)"),
     tipo_documento: str = Query("1", description="Para búsqueda por documento: tipo (1=DNI, 4=Carnet Extranjería, 7=Pasaporte, A=Cédula Diplomática)"),
-    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)")
+    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)"),
+    concurrencia: int = Query(None, ge=1, description="Consultas simultáneas (por defecto SUNAT_BATCH_CONCURRENCY)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT"),
+    reanudar: bool = Query(False, description="Continuar la última consulta de este Excel: solo se consultan las filas fallidas o faltantes")
 ):
     """
     Consulta información de todas las empresas listadas en el archivo Excel
-    y guarda los resultados en archivos (JSON, Excel, CSV)
+    y guarda los resultados en archivos (JSON, Excel, CSV).
+    Para lotes largos usar POST /jobs, que no mantiene la conexión abierta.
     """
     try:
-        # Validar tipo de búsqueda
-        tipos_validos = ["nombre", "ruc", "documento"]
-        if tipo_busqueda not in tipos_validos:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Tipo de búsqueda no válido. Use: {', '.join(tipos_validos)}"
-            )
-        
-        if tipo_busqueda == "documento":
-            tipos_doc_validos = ["1", "4", "7", "A"]
-            if tipo_documento not in tipos_doc_validos:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Tipo de documento no válido. Use: {', '.join(tipos_doc_validos)}"
-                )
-        
-        print(f"🚀 Iniciando consulta masiva por {tipo_busqueda} desde Excel...")
-        datos_excel = read_excel()
-        print(f"📋 Se encontraron {len(datos_excel)} registros para consultar")
-        
-        all_results = {}
-        errors = []
-        processed = 0
-        
-        for i, valor in enumerate(datos_excel, 1):
-            try:
-                print(f"📊 Procesando registro {i}/{len(datos_excel)}: {valor}")
-                
-                # Validaciones básicas según tipo de búsqueda
-                if tipo_busqueda == "ruc" and (not valor.isdigit() or len(valor) != 11):
-                    error_msg = f"RUC inválido: {valor} (debe tener 11 dígitos)"
-                    errors.append(error_msg)
-                    all_results[valor] = [{"error": error_msg}]
-                    continue
-                
-                if tipo_busqueda == "documento" and tipo_documento == "1" and (not valor.isdigit() or len(valor) != 8):
-                    error_msg = f"DNI inválido: {valor} (debe tener 8 dígitos)"
-                    errors.append(error_msg)
-                    all_results[valor] = [{"error": error_msg}]
-                    continue
-                
-                # Realizar scraping
-                resultados = scrape_sunat(valor, search_type=tipo_busqueda, document_type=tipo_documento, debug_mode=debug)
-                
-                if resultados and isinstance(resultados[0], dict) and "error" in resultados[0]:
-                    error_msg = f"{valor}: {resultados[0]['error']}"
-                    errors.append(error_msg)
-                    print(f"❌ Error en {valor}: {resultados[0]['error']}")
-                else:
-                    print(f"✅ Datos obtenidos para {valor}: {len(resultados)} resultado(s)")
-                
-                all_results[valor] = resultados
-                processed += 1
-                
-                # Mostrar progreso cada 5 registros
-                if processed % 5 == 0:
-                    print(f"📈 Progreso: {processed}/{len(datos_excel)} registros procesados")
-                    
-            except Exception as e:
-                error_msg = f"Error procesando {valor}: {str(e)}"
-                errors.append(error_msg)
-                all_results[valor] = [{"error": error_msg}]
-                print(f"💥 Error inesperado en {valor}: {str(e)}")
-        
-        # Preparar datos para guardado
-        response_data = {
-            "resultados": all_results,
-            "tipo_busqueda": tipo_busqueda,
-            "tipo_documento": tipo_documento if tipo_busqueda == "documento" else None
-        }
-        if errors:
-            response_data["errores"] = errors
-        
-        print(f"\n📁 Guardando resultados en archivos...")
-        
-        # Guardar en archivos
-        filename_base = f"consulta_sunat_{tipo_busqueda}"
-        if tipo_busqueda == "documento":
-            tipos_doc = {"1": "dni", "4": "carnet", "7": "pasaporte", "A": "cedula"}
-            filename_base += f"_{tipos_doc.get(tipo_documento, tipo_documento)}"
-        
-        saved_files = save_results_to_files(response_data, filename_base)
-        
-        # Generar reporte resumen
-        report_file = save_summary_report(response_data, saved_files)
-        if report_file:
-            saved_files['reporte'] = report_file
-        
-        # Preparar respuesta resumida
-        summary = {
-            "mensaje": "✅ Consulta completada exitosamente",
-            "tipo_busqueda": tipo_busqueda,
-            "total_registros": len(datos_excel),
-            "registros_procesados": processed,
-            "total_errores": len(errors),
-            "archivos_generados": saved_files,
-            "resumen": {
-                "registros_con_datos": len([k for k, v in all_results.items() 
-                                         if v and not (isinstance(v[0], dict) and 'error' in v[0])]),
-                "total_resultados": sum(len(v) for v in all_results.values() 
-                                      if v and not (isinstance(v[0], dict) and 'error' in v[0]))
-            }
-        }
-        
-        if tipo_busqueda == "documento":
-            tipos_doc = {"1": "DNI", "4": "Carnet de Extranjería", "7": "Pasaporte", "A": "Cédula Diplomática"}
-            summary["tipo_documento"] = tipos_doc.get(tipo_documento, tipo_documento)
-        
-        if errors:
-            summary["errores_muestra"] = errors[:5]  # Solo mostrar los primeros 5 errores
-            if len(errors) > 5:
-                summary["errores_muestra"].append(f"... y {len(errors) - 5} errores más (ver archivo de reporte)")
-        
-        print(f"\n🎉 ¡Proceso completado!")
-        print(f"📊 Registros procesados: {processed}")
-        print(f"📁 Archivos guardados en: data/resultados/")
-        
-        return summary
+        validar_parametros_lote(tipo_busqueda, tipo_documento)
+        return consulta_masiva(
+            tipo_busqueda=tipo_busqueda,
+            tipo_documento=tipo_documento,
+            debug=debug,
+            concurrencia=concurrencia,
+            sin_cache=sin_cache,
+            solo_cache=solo_cache,
+            reanudar=reanudar
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+@app.post("/jobs", status_code=202)
+def crear_job(
+    tipo_busqueda: str = Query("nombre", description="Tipo de búsqueda (nombre, ruc, documento)"),
+    tipo_documento: str = Query("1", description="Para búsqueda por documento: tipo (1=DNI, 4=Carnet Extranjería, 7=Pasaporte, A=Cédula Diplomática)"),
+    debug: bool = Query(False, description="Ejecutar en modo debug (navegador visible)"),
+    concurrencia: int = Query(None, ge=1, description="Consultas simultáneas (por defecto SUNAT_BATCH_CONCURRENCY)"),
+    sin_cache: bool = Query(False, description="Ignorar la caché y consultar SUNAT (el resultado nuevo se guarda)"),
+    solo_cache: bool = Query(False, description="Responder solo desde la caché, sin consultar SUNAT"),
+    reanudar: bool = Query(False, description="Continuar la última consulta de este Excel: solo se consultan las filas fallidas o faltantes")
+):
+    """
+    Inicia una consulta masiva desde el Excel en segundo plano y devuelve su id
+    de inmediato. El progreso se consulta en /jobs/{id} o /jobs/{id}/events (SSE).
+    """
+    validar_parametros_lote(tipo_busqueda, tipo_documento)
+    try:
+        job = job_manager.submit(
+            tipo_busqueda=tipo_busqueda,
+            tipo_documento=tipo_documento,
+            debug=debug,
+            concurrencia=concurrencia,
+            sin_cache=sin_cache,
+            solo_cache=solo_cache,
+            reanudar=reanudar
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        "job_id": job.id,
+        "estado": job.estado,
+        "estado_url": f"/jobs/{job.id}",
+        "eventos_url": f"/jobs/{job.id}/events",
+        "cancelar_url": f"/jobs/{job.id}/cancel"
+    }
+
+@app.get("/jobs")
+def listar_jobs():
+    """
+    Jobs activos y terminados recientemente
+    """
+    return {"jobs": [job.as_dict() for job in job_manager.list_jobs()]}
+
+def obtener_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No existe el job: {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}")
+def estado_job(job_id: str):
+    """
+    Estado, contadores, progreso y tiempo estimado restante de un job
+    """
+    return obtener_job(job_id).as_dict()
+
+@app.get("/jobs/{job_id}/events")
+def eventos_job(
+    job_id: str,
+    last_event_id: int = Header(None, description="Reanudar el stream después de este evento")
+):
+    """
+    Progreso del job fila por fila como Server-Sent Events (text/event-stream).
+    El stream termina con el evento completado, cancelado o error.
+    """
+    job = obtener_job(job_id)
+    desde = last_event_id + 1 if last_event_id is not None else 0
+    return StreamingResponse(
+        eventos_sse(job, desde),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs/{job_id}/cancel", status_code=202)
+def cancelar_job(job_id: str):
+    """
+    Cancela un job: las consultas en curso terminan, no se inician más y se
+    generan los archivos con lo ya consultado (se puede continuar con reanudar=true)
+    """
+    job = obtener_job(job_id)
+    if job.finalizado:
+        raise HTTPException(status_code=409, detail=f"El job ya terminó (estado: {job.estado})")
+    job_manager.cancel(job_id)
+    return {"job_id": job.id, "estado": job.estado, "cancelacion_solicitada": True}
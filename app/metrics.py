@@ -0,0 +1,211 @@
+import bisect
+import threading
+
+# Métricas en formato de texto de Prometheus (GET /metrics), sin dependencias:
+# contadores, gauges e histogramas con labels, guardados en memoria del
+# proceso de la API.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets en segundos: desde pasos de milisegundos (parseo) hasta consultas de un minuto
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_labels(nombres: tuple, valores: tuple, extra: str = None) -> str:
+    partes = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        # Sin labels la serie existe desde el inicio (en 0), como en los clientes de Prometheus
+        self._series = {} if self.labels or self.tipo == "histogram" else {(): 0}
+
+    def _clave(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.nombre} espera los labels {self.labels}, se recibieron {tuple(labels)}")
+        return tuple(str(labels[nombre]) for nombre in self.labels)
+
+    def render(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for clave, valor in series:
+            lineas.extend(self._lineas(clave, valor))
+        return lineas
+
+    def _lineas(self, clave: tuple, valor) -> list:
+        return [f"{self.nombre}{_formatear_labels(self.labels, clave)} {_numero(valor)}"]
+
+
+class Counter(_Metrica):
+    tipo = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + amount
+
+
+class Gauge(_Metrica):
+    """
+    Gauge con inc/dec/set, o calculado al momento de exponerlo con set_function
+    """
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = ()):
+        super().__init__(nombre, ayuda, labels)
+        self._funcion = None
+
+    def inc(self, amount: float = 1, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._series[clave] = value
+
+    def set_function(self, funcion):
+        """
+        funcion() devuelve el valor (gauge sin labels) o {tupla de labels: valor}
+        """
+        self._funcion = funcion
+
+    def render(self) -> list:
+        if self._funcion is not None:
+            try:
+                valor = self._funcion()
+            except Exception:
+                valor = None
+            with self._lock:
+                if isinstance(valor, dict):
+                    self._series = dict(valor)
+                elif valor is not None:
+                    self._series = {(): valor}
+        return super().render()
+
+
+class Histogram(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(nombre, ayuda, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        clave = self._clave(labels)
+        posicion = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # Conteos por bucket (el último es +Inf), suma
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicion] += 1
+            serie[1] += value
+
+    def _lineas(self, clave: tuple, serie) -> list:
+        conteos, suma = serie
+        lineas = []
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+            acumulado += conteo
+            le = 'le="' + _numero(limite) + '"'
+            lineas.append(f"{self.nombre}_bucket{_formatear_labels(self.labels, clave, le)} {acumulado}")
+        etiquetas = _formatear_labels(self.labels, clave)
+        lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(round(suma, 6))}")
+        lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+
+class Registry:
+    def __init__(self):
+        self._metricas = []
+        self._lock = threading.Lock()
+
+    def register(self, metrica):
+        with self._lock:
+            self._metricas.append(metrica)
+        return metrica
+
+    def counter(self, nombre: str, ayuda: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(nombre, ayuda, labels))
+
+    def gauge(self, nombre: str, ayuda: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(nombre, ayuda, labels))
+
+    def histogram(self, nombre: str, ayuda: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(nombre, ayuda, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas)
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.render())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRY = Registry()
+
+SCRAPE_PHASE_SECONDS = REGISTRY.histogram(
+    "sunat_scrape_phase_seconds",
+    "Duración de cada paso del scraping (lanzamiento_navegador, navegacion, formulario, envio, "
+    "espera_resultados, contenido, parseo, formateo, detalle, http, limitador, reintento)",
+    ("phase",)
+)
+SCRAPE_SECONDS = REGISTRY.histogram(
+    "sunat_scrape_duration_seconds",
+    "Duración de cada consulta a SUNAT (búsqueda y listado, sin las páginas de detalle)",
+    ("search_type", "engine")
+)
+SCRAPES_TOTAL = REGISTRY.counter(
+    "sunat_scrapes_total",
+    "Consultas a SUNAT por tipo de búsqueda y resultado (ok, no_encontrado, error_conexion, circuito_abierto, error)",
+    ("search_type", "outcome")
+)
+RETRIES_TOTAL = REGISTRY.counter(
+    "sunat_scrape_retries_total",
+    "Reintentos de consultas a SUNAT por tipo de búsqueda",
+    ("search_type",)
+)
+CACHE_LOOKUPS_TOTAL = REGISTRY.counter(
+    "sunat_cache_lookups_total",
+    "Búsquedas en la caché de resultados (hit, miss)",
+    ("search_type", "result")
+)
+BROWSERS_ACTIVE = REGISTRY.gauge("sunat_browsers_active", "Navegadores Chromium abiertos")
+PAGES_ACTIVE = REGISTRY.gauge("sunat_pages_active", "Páginas de navegador abiertas")
+BATCH_ROWS_TOTAL = REGISTRY.counter(
+    "sunat_batch_rows_total",
+    "Filas procesadas por consultas masivas (rate() da el throughput)",
+    ("search_type", "outcome")
+)
+BATCH_ROWS_PER_SECOND = REGISTRY.gauge(
+    "sunat_batch_rows_per_second",
+    "Throughput de los jobs de consulta masiva en curso (filas/s desde su inicio)"
+)
+CIRCUIT_OPEN = REGISTRY.gauge("sunat_circuit_open", "1 si el circuit breaker está abierto o semiabierto")
+RATE_LIMIT = REGISTRY.gauge("sunat_rate_limit_requests_per_second", "Tasa actual del limitador de peticiones a SUNAT")
@@ -0,0 +1,208 @@
+import os
+import re
+from datetime import date, datetime
+from .data_formatter import FIELD_MAPPING, FECHA_PATTERN
+
+# Salida columnar tipada de las consultas. Un archivo Parquet por corrida,
+# particionado al estilo Hive por fecha de ejecución y tipo de búsqueda:
+#   data/parquet/fecha=2025-01-31/tipo_busqueda=ruc/consulta_sunat_ruc_20250131_101500.parquet
+# Las columnas son fijas (los campos estandarizados de FIELD_MAPPING), así
+# que un análisis puede leer solo estado/condicion de todos los archivos.
+# pyarrow viene en requirements.txt; si falta no se genera el Parquet y se
+# avisa una vez (salvo con SUNAT_PARQUET=false).
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Campos estandarizados en el orden de FIELD_MAPPING (sin repetir variantes)
+CAMPOS = list(dict.fromkeys(FIELD_MAPPING.values()))
+CAMPOS_FECHA = {"fecha_inscripcion", "emisor_electronico_desde", "afiliado_ple_desde"}
+# Pocos valores distintos: se guardan con diccionario
+CAMPOS_CATEGORICOS = {"tipo_contribuyente", "estado", "condicion", "sistema_emision_comprobante",
+                      "sistema_contabilidad", "emision_electronica"}
+
+
+_aviso_sin_pyarrow = False
+
+
+def parquet_habilitado() -> bool:
+    global _aviso_sin_pyarrow
+    if os.getenv('SUNAT_PARQUET', 'true').lower() != 'true':
+        return False
+    if pa is None:
+        if not _aviso_sin_pyarrow:
+            print("⚠️ SUNAT_PARQUET=true pero pyarrow no está instalado: no se genera la salida Parquet "
+                  "(pip install pyarrow, o SUNAT_PARQUET=false para no ver este aviso)")
+            _aviso_sin_pyarrow = True
+        return False
+    return True
+
+
+def esquema():
+    """
+    Esquema fijo de las filas de resultados (una por resultado, como filas_planas)
+    """
+    columnas = [
+        ("empresa_buscada", pa.string()),
+        ("numero_resultado", pa.int32()),
+    ]
+    for campo in CAMPOS:
+        if campo in CAMPOS_FECHA:
+            tipo = pa.date32()
+        elif campo in CAMPOS_CATEGORICOS:
+            tipo = pa.dictionary(pa.int32(), pa.string())
+        else:
+            tipo = pa.string()
+        columnas.append((campo, tipo))
+    columnas += [
+        # Campos que SUNAT muestra fuera de FIELD_MAPPING, y fechas que no se pudieron convertir
+        ("otros", pa.map_(pa.string(), pa.string())),
+        ("error", pa.string()),
+    ]
+    return pa.schema(columnas)
+
+
+def parse_fecha(texto) -> date:
+    """
+    Primera fecha dd/mm/aaaa del texto, o None
+    """
+    match = FECHA_PATTERN.search(texto) if isinstance(texto, str) else None
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def _texto(valor):
+    return valor if valor is None or isinstance(valor, str) else str(valor)
+
+
+# Sufijo _YYYYMMDD_HHMMSS de los nombres de archivo con la hora de la corrida
+SELLO_CORRIDA = re.compile(r"_\d{8}_\d{6}$")
+
+
+def nombre_corrida(base_filename: str, inicio: datetime = None) -> str:
+    """
+    Nombre del Parquet de una corrida: el nombre base con la hora de inicio
+    (_YYYYMMDD_HHMMSS), salvo que ya la tenga. Los archivos base fijos (p. ej.
+    consulta_sunat_ruc, reanudable) no se pisan entre corridas.
+    """
+    if SELLO_CORRIDA.search(base_filename):
+        return base_filename
+    return f"{base_filename}_{(inicio or datetime.now()).strftime('%Y%m%d_%H%M%S')}"
+
+
+def ruta_particion(base_filename: str, tipo_busqueda: str, fecha: date = None) -> str:
+    parquet_dir = os.getenv('SUNAT_PARQUET_DIR', 'data/parquet')
+    fecha = fecha or date.today()
+    return os.path.join(parquet_dir, f"fecha={fecha.isoformat()}", f"tipo_busqueda={tipo_busqueda}",
+                        f"{base_filename}.parquet")
+
+
+def _ruta_libre(ruta: str) -> str:
+    """
+    La ruta, o con sufijo _2, _3... si ya existe (dos corridas en el mismo segundo)
+    """
+    base, extension = os.path.splitext(ruta)
+    n = 1
+    while os.path.exists(ruta) or os.path.exists(ruta + ".tmp"):
+        n += 1
+        ruta = f"{base}_{n}{extension}"
+    return ruta
+
+
+class ParquetResultWriter:
+    """
+    Escribe filas de resultados (las de save_utils.filas_planas) en un Parquet
+    con el esquema fijo, por row groups de row_group_size filas: en memoria
+    solo se mantiene el row group en curso. El archivo se escribe aparte y se
+    publica al cerrar, así que quien lee la partición nunca ve uno a medias.
+
+    Args:
+        base_filename: Nombre del archivo dentro de la partición
+        tipo_busqueda: Tipo de búsqueda (partición)
+        fecha: Fecha de ejecución (partición; por defecto hoy)
+        row_group_size: Filas por row group (SUNAT_PARQUET_ROW_GROUP, por defecto 10000)
+    """
+
+    def __init__(self, base_filename: str, tipo_busqueda: str, fecha: date = None, row_group_size: int = None):
+        if pa is None:
+            raise RuntimeError("Para generar Parquet se necesita pyarrow (pip install pyarrow)")
+        self.schema = esquema()
+        self.row_group_size = row_group_size or int(os.getenv('SUNAT_PARQUET_ROW_GROUP', '10000'))
+        self.path = _ruta_libre(ruta_particion(base_filename, tipo_busqueda, fecha))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._temporal = self.path + ".tmp"
+        self._writer = pq.ParquetWriter(self._temporal, self.schema, compression="zstd")
+        self._columnas = {nombre: [] for nombre in self.schema.names}
+        self._pendientes = 0
+        self.filas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.descartar()
+
+    def descartar(self):
+        """
+        Cierra sin publicar: el archivo temporal se borra
+        """
+        self._writer.close()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+    def write_rows(self, filas: list):
+        for fila in filas:
+            self._agregar(fila)
+            if self._pendientes >= self.row_group_size:
+                self._escribir_row_group()
+
+    def _agregar(self, fila: dict):
+        otros = []
+        for campo, valor in fila.items():
+            if campo in self._columnas or valor is None:
+                continue
+            otros.append((campo, _texto(valor)))
+
+        self._columnas["empresa_buscada"].append(_texto(fila.get("empresa_buscada")))
+        self._columnas["numero_resultado"].append(fila.get("numero_resultado"))
+        for campo in CAMPOS:
+            valor = fila.get(campo)
+            if campo in CAMPOS_FECHA and valor is not None:
+                fecha = parse_fecha(valor)
+                if fecha is None:
+                    otros.append((campo, _texto(valor)))
+                valor = fecha
+            else:
+                valor = _texto(valor)
+            self._columnas[campo].append(valor)
+        self._columnas["otros"].append(otros or None)
+        self._columnas["error"].append(_texto(fila.get("error")))
+        self._pendientes += 1
+
+    def _escribir_row_group(self):
+        if not self._pendientes:
+            return
+        tabla = pa.Table.from_pydict(self._columnas, schema=self.schema)
+        self._writer.write_table(tabla, row_group_size=self._pendientes)
+        self.filas += self._pendientes
+        for valores in self._columnas.values():
+            valores.clear()
+        self._pendientes = 0
+
+    def close(self) -> str:
+        """
+        Returns:
+            Ruta del Parquet publicado en la partición
+        """
+        self._escribir_row_group()
+        self._writer.close()
+        os.replace(self._temporal, self.path)
+        return self.path
@@ -1,22 +1,64 @@
+import os
 from bs4 import BeautifulSoup
-from .data_formatter import clean_and_format_data, apply_field_mapping
+from .data_formatter import format_record
+from . import lxml_parser
 
-def parse_resultado(html: str) -> dict:
+# Motores de parseo disponibles (SUNAT_PARSER_ENGINE)
+PARSER_ENGINES = ("lxml", "bs4")
+
+# Panel con los datos del resultado; basta su HTML para parsear
+PANEL_SELECTOR = ".panel.panel-primary"
+PANEL_OUTER_HTML = "(el) => el.outerHTML"
+
+
+def parser_engine() -> str:
+    engine = os.getenv('SUNAT_PARSER_ENGINE', 'lxml').lower()
+    if engine not in PARSER_ENGINES:
+        raise ValueError(f"Motor de parser desconocido: {engine}. Opciones: {', '.join(PARSER_ENGINES)}")
+    return engine
+
+
+def parse_resultado(html: str, engine: str = None, timer=None) -> dict:
     """
     Parsea el HTML de resultado de SUNAT y devuelve datos limpios y formateados.
     Maneja tanto la vista de lista de resultados como la vista directa de RUC.
+
+    Args:
+        html: Página completa o solo el fragmento de .panel.panel-primary
+        engine: "lxml" o "bs4" (por defecto SUNAT_PARSER_ENGINE)
+        timer: StepTimer opcional; mide por separado "parseo" y "formateo"
+    """
+    if timer is None:
+        data = extract_raw_fields(html, engine)
+    else:
+        with timer.step("parseo"):
+            data = extract_raw_fields(html, engine)
+    if data is None:
+        return {"error": "No se encontró información"}
+
+    # Limpiar, formatear y estandarizar los campos en una sola pasada
+    if timer is None:
+        return format_record(data)
+    with timer.step("formateo"):
+        return format_record(data)
+
+
+def extract_raw_fields(html: str, engine: str = None):
+    """
+    Pares campo/valor sin formatear del panel de resultado, o None si no hay panel.
+    Ambos motores devuelven exactamente lo mismo.
     """
+    if (engine or parser_engine()) == "lxml":
+        return lxml_parser.extract_raw_fields(html)
+
     soup = BeautifulSoup(html, "lxml")
     
     # Verificar si es la vista directa de resultado (búsqueda por RUC)
     panel = soup.select_one(".panel.panel-primary")
-    if panel and "Resultado de la Búsqueda" in panel.get_text():
-        return parse_direct_result(panel)
-    
-    # Si no es vista directa, usar el parser original
-    panel = soup.select_one(".panel.panel-primary")
     if not panel:
-        return {"error": "No se encontró información"}
+        return None
+    if "Resultado de la Búsqueda" in panel.get_text():
+        return _campos_vista_directa(panel)
 
     data = {}
     for item in panel.select(".list-group-item"):
@@ -26,19 +68,17 @@ def parse_resultado(html: str) -> dict:
             key = label.get_text(strip=True).replace(":", "")
             val = value.get_text(" ", strip=True)
             data[key] = val
-
-    # Limpiar y formatear los datos
-    cleaned_data = clean_and_format_data(data)
-    
-    # Aplicar mapeo de campos estandarizados
-    formatted_data = apply_field_mapping(cleaned_data)
-    
-    return formatted_data
+    return data
 
 def parse_direct_result(panel) -> dict:
     """
     Parsea la vista directa de resultados (búsqueda por RUC)
     """
+    # Limpiar, formatear y estandarizar los campos en una sola pasada
+    return format_record(_campos_vista_directa(panel))
+
+
+def _campos_vista_directa(panel) -> dict:
     data = {}
     
     for item in panel.select(".list-group-item"):
@@ -81,10 +121,4 @@ def parse_direct_result(panel) -> dict:
         if label and value:
             data[label] = value
     
-    # Limpiar y formatear los datos
-    cleaned_data = clean_and_format_data(data)
-    
-    # Aplicar mapeo de campos estandarizados
-    formatted_data = apply_field_mapping(cleaned_data)
-    
-    return formatted_data
+    return data
@@ -0,0 +1,177 @@
+import re
+
+# Revisión previa de una consulta masiva: normaliza los valores leídos del
+# Excel, descarta los que SUNAT nunca va a encontrar (RUC con dígito
+# verificador incorrecto, DNI mal formado) y elimina duplicados, para que
+# solo las claves limpias y únicas lleguen al scraper.
+
+RUC_PREFIJOS = ("10", "15", "17", "20")
+RUC_PESOS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+# "20100047218.0", "2.0100047218E10": números que pandas leyó como float
+FLOAT_PATTERN = re.compile(r"^\d+(\.\d+)?([eE]\+?\d+)?$")
+SEPARADORES_PATTERN = re.compile(r"[\s\-.]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _texto_numerico(valor: str) -> str:
+    """
+    Deshace los artefactos de float de read_excel ("123.0", "1.23E10") y quita
+    espacios, guiones y puntos separadores ("20-10004721-8").
+    """
+    if FLOAT_PATTERN.match(valor) and ("." in valor or "e" in valor.lower()):
+        numero = float(valor)
+        # Un decimal de verdad no es un número de documento: se deja tal cual
+        return str(int(numero)) if numero.is_integer() and numero < 1e15 else valor
+    return SEPARADORES_PATTERN.sub("", valor)
+
+
+def normalizar_valor(valor, tipo_busqueda: str = "nombre", tipo_documento: str = "1") -> str:
+    """
+    Forma canónica de un valor de entrada según el tipo de búsqueda.
+    """
+    valor = WHITESPACE_PATTERN.sub(" ", str(valor)).strip()
+    if tipo_busqueda == "ruc":
+        return _texto_numerico(valor)
+    if tipo_busqueda == "documento":
+        if tipo_documento == "1":
+            # Los DNI con ceros a la izquierda pierden sus ceros al leerse como número
+            dni = _texto_numerico(valor)
+            return dni.zfill(8) if dni.isdigit() and len(dni) < 8 else dni
+        return valor.upper()
+    return valor
+
+
+def digito_verificador_ruc(ruc: str) -> int:
+    """
+    Dígito verificador (módulo 11) de los 10 primeros dígitos de un RUC
+    """
+    resto = 11 - sum(int(digito) * peso for digito, peso in zip(ruc[:10], RUC_PESOS)) % 11
+    return {10: 0, 11: 1}.get(resto, resto)
+
+
+def validar_ruc(ruc: str) -> str:
+    """
+    Returns:
+        Mensaje de error, o None si el RUC es válido
+    """
+    if not ruc.isdigit() or len(ruc) != 11:
+        return f"RUC inválido: {ruc} (debe tener 11 dígitos)"
+    if not ruc.startswith(RUC_PREFIJOS):
+        return f"RUC inválido: {ruc} (debe empezar con {', '.join(RUC_PREFIJOS)})"
+    if digito_verificador_ruc(ruc) != int(ruc[10]):
+        return f"RUC inválido: {ruc} (dígito verificador incorrecto)"
+    return None
+
+
+def validar_valor(valor: str, tipo_busqueda: str, tipo_documento: str = "1") -> str:
+    """
+    Validaciones de un valor ya normalizado según el tipo de búsqueda.
+
+    Returns:
+        Mensaje de error, o None si el valor es válido
+    """
+    if not valor:
+        return "Valor vacío"
+
+    if tipo_busqueda == "ruc":
+        return validar_ruc(valor)
+
+    # El número de DNI no lleva dígito verificador: solo se valida el formato
+    if tipo_busqueda == "documento" and tipo_documento == "1" and (not valor.isdigit() or len(valor) != 8):
+        return f"DNI inválido: {valor} (debe tener 8 dígitos)"
+
+    return None
+
+
+def clave_duplicado(valor: str, tipo_busqueda: str) -> str:
+    # Los nombres se comparan sin distinguir mayúsculas (como la caché)
+    return valor.upper() if tipo_busqueda == "nombre" else valor
+
+
+class PlanConsulta:
+    """
+    Resultado de la revisión previa de una consulta masiva.
+
+    Attributes:
+        filas: Registros leídos de la entrada
+        etiqueta: Cómo se nombra la posición de un rechazo ("Fila" o "Registro")
+        claves: Valores limpios y únicos a consultar, en el orden de entrada
+        orden: Clave de salida de cada valor distinto (limpio, o el original si
+               se rechazó), en el orden de entrada
+        rechazados: Lista de (fila o registro, valor original, motivo)
+        normalizados: Cantidad de filas cuyo valor cambió al normalizarlo
+        duplicados: Filas descartadas por repetir un valor ya planificado
+    """
+
+    def __init__(self, filas: int = 0, etiqueta: str = "Registro"):
+        self.filas = filas
+        self.etiqueta = etiqueta
+        self.claves = []
+        self.orden = []
+        self.rechazados = []
+        self.normalizados = 0
+        self.duplicados = 0
+
+    def resumen(self, muestra: int = 5) -> dict:
+        datos = {
+            "filas": self.filas,
+            "a_consultar": len(self.claves),
+            "duplicados": self.duplicados,
+            "rechazados": len(self.rechazados),
+            "normalizados": self.normalizados,
+        }
+        if self.rechazados:
+            datos["rechazados_muestra"] = [
+                f"{self.etiqueta} {posicion}: {motivo}" for posicion, _, motivo in self.rechazados[:muestra]
+            ]
+        return datos
+
+    def imprimir(self):
+        print(f"🧮 Revisión previa: {self.filas} registros, {len(self.claves)} a consultar, "
+              f"{self.duplicados} duplicados, {len(self.rechazados)} rechazados, {self.normalizados} normalizados")
+        for posicion, _, motivo in self.rechazados[:10]:
+            print(f"   ⛔ {self.etiqueta} {posicion}: {motivo}")
+        if len(self.rechazados) > 10:
+            print(f"   ... y {len(self.rechazados) - 10} rechazos más")
+
+
+def planificar(valores, tipo_busqueda: str = "nombre", tipo_documento: str = "1",
+               numerados: bool = False) -> PlanConsulta:
+    """
+    Normaliza, valida y elimina duplicados de los valores de entrada. Recorre
+    valores una sola vez, así que acepta un generador (p. ej. iter_values).
+
+    Args:
+        valores: Valores en el orden del archivo
+        numerados: Si es True, valores entrega (número de fila, valor)
+    """
+    plan = PlanConsulta(etiqueta="Fila" if numerados else "Registro")
+    vistos = set()
+    rechazados_vistos = set()
+
+    if not numerados:
+        valores = enumerate(valores, start=1)
+    for registro, original in valores:
+        plan.filas += 1
+        valor = normalizar_valor(original, tipo_busqueda, tipo_documento)
+        if valor != original:
+            plan.normalizados += 1
+
+        error_msg = validar_valor(valor, tipo_busqueda, tipo_documento)
+        if error_msg:
+            plan.rechazados.append((registro, original, error_msg))
+            if original not in rechazados_vistos:
+                rechazados_vistos.add(original)
+                plan.orden.append(original)
+            continue
+
+        clave = clave_duplicado(valor, tipo_busqueda)
+        if clave in vistos:
+            plan.duplicados += 1
+            continue
+        vistos.add(clave)
+        plan.claves.append(valor)
+        plan.orden.append(valor)
+
+    return plan
@@ -0,0 +1,209 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Perfilado bajo demanda de una consulta (?perfil=true o X-Sunat-Perfil: 1).
+# Cada perfil es un directorio en SUNAT_PROFILE_DIR con:
+#   cpu.prof       cProfile del lado Python (se abre con snakeviz o pstats)
+#   cpu.txt        funciones con más tiempo acumulado y propio
+#   tiempos.json   tiempos por paso de cada consulta (también las de detalle)
+#   traza_*.zip    traza de Playwright de cada BrowserContext
+#                  (npx playwright show-trace traza.zip, o trace.playwright.dev)
+
+# Nombres de perfil y de archivo: sin separadores y sin empezar con punto (ni "..")
+ID_PATTERN = re.compile(r"^[\w\-][\w.\-]*$")
+SLUG_PATTERN = re.compile(r"[^\w\-]+")
+
+
+def profiling_enabled() -> bool:
+    return os.getenv('SUNAT_PROFILING', 'true').lower() == 'true'
+
+
+def profile_dir() -> str:
+    return os.getenv('SUNAT_PROFILE_DIR', 'data/perfiles')
+
+
+def _slug(valor: str, largo: int = 40) -> str:
+    return SLUG_PATTERN.sub("_", valor.strip())[:largo].strip("_") or "consulta"
+
+
+def ruta_archivo(perfil_id: str, archivo: str = None) -> str:
+    """
+    Ruta de un perfil (o de uno de sus archivos), o None si el nombre no es válido
+    """
+    if not ID_PATTERN.match(perfil_id) or (archivo is not None and not ID_PATTERN.match(archivo)):
+        return None
+    partes = [profile_dir(), perfil_id] + ([archivo] if archivo is not None else [])
+    ruta = os.path.join(*partes)
+    # Por si acaso (enlaces simbólicos): la ruta tiene que quedar dentro del directorio de perfiles
+    base = os.path.realpath(profile_dir())
+    if os.path.commonpath([base, os.path.realpath(ruta)]) != base or os.path.realpath(ruta) == base:
+        return None
+    return ruta
+
+
+def limpiar_perfiles(maximo: int = None):
+    """
+    Borra los perfiles más antiguos, dejando los últimos maximo (SUNAT_PROFILE_KEEP, por defecto 50)
+    """
+    maximo = maximo if maximo is not None else int(os.getenv('SUNAT_PROFILE_KEEP', '50'))
+    directorio = profile_dir()
+    if maximo <= 0 or not os.path.isdir(directorio):
+        return
+    perfiles = sorted(
+        (entrada for entrada in os.scandir(directorio) if entrada.is_dir()),
+        key=lambda entrada: entrada.stat().st_mtime
+    )
+    for entrada in perfiles[:-maximo]:
+        shutil.rmtree(entrada.path, ignore_errors=True)
+
+
+class PerfilConsulta:
+    """
+    Perfil de una consulta: CPU de cada hilo que trabaja en ella (el de la
+    petición, el navegador del pool y los de las páginas de detalle), trazas
+    de Playwright de cada BrowserContext y tiempos por paso de cada
+    scrape_sunat.
+
+    Args:
+        search_value: Valor consultado
+        search_type: Tipo de búsqueda
+    """
+
+    def __init__(self, search_value: str, search_type: str):
+        self.search_value = search_value
+        self.search_type = search_type
+        self.id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{search_type}_{_slug(search_value)}_{uuid.uuid4().hex[:6]}"
+        self.directorio = ruta_archivo(self.id)
+        os.makedirs(self.directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._perfiles = []
+        self._hilos_sin_perfil = 0
+        self.trazas = []
+        self.consultas = []
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def cpu(self):
+        """
+        Perfila la CPU del hilo actual mientras dura el bloque. Es reentrante:
+        si el hilo ya se está perfilando no hace nada.
+        """
+        if getattr(self._local, "activo", False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Desde Python 3.12 solo puede haber un perfilador activo en el proceso
+            profiler = None
+            with self._lock:
+                self._hilos_sin_perfil += 1
+        self._local.activo = True
+        try:
+            yield
+        finally:
+            self._local.activo = False
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self._perfiles.append(profiler)
+
+    def iniciar_traza(self, context):
+        try:
+            context.tracing.start(screenshots=True, snapshots=True)
+        except Exception as e:
+            print(f"⚠️ No se pudo iniciar la traza de Playwright: {e}")
+
+    def guardar_traza(self, context, search_value: str):
+        with self._lock:
+            nombre = f"traza_{len(self.trazas) + 1:02d}_{_slug(search_value)}.zip"
+            self.trazas.append(nombre)
+        try:
+            context.tracing.stop(path=os.path.join(self.directorio, nombre))
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar la traza de Playwright: {e}")
+            with self._lock:
+                self.trazas.remove(nombre)
+
+    def registrar_consulta(self, search_value: str, search_type: str, metadata: dict):
+        """
+        Tiempos por paso de un scrape_sunat (la consulta principal o una página de detalle)
+        """
+        with self._lock:
+            self.consultas.append({
+                "valor": search_value,
+                "tipo_busqueda": search_type,
+                "motor": metadata.get("motor"),
+                "tiempos": metadata.get("tiempos"),
+            })
+
+    def _escribir_cpu(self) -> bool:
+        with self._lock:
+            perfiles = list(self._perfiles)
+        if not perfiles:
+            return False
+        stats = pstats.Stats(perfiles[0])
+        for profiler in perfiles[1:]:
+            stats.add(profiler)
+        stats.dump_stats(os.path.join(self.directorio, "cpu.prof"))
+
+        resumen = io.StringIO()
+        resumen.write(f"Perfil {self.id}: {len(perfiles)} hilo(s) perfilado(s)")
+        if self._hilos_sin_perfil:
+            resumen.write(f", {self._hilos_sin_perfil} sin perfil (otro perfilador activo)")
+        resumen.write("\n\n")
+        stats.stream = resumen
+        stats.sort_stats("cumulative").print_stats(40)
+        stats.sort_stats("tottime").print_stats(20)
+        with open(os.path.join(self.directorio, "cpu.txt"), "w", encoding="utf-8") as f:
+            f.write(resumen.getvalue())
+        return True
+
+    def cerrar(self, url_base: str = "/perfiles") -> dict:
+        """
+        Escribe los archivos del perfil.
+
+        Returns:
+            Enlaces a los archivos, para la respuesta de la consulta
+        """
+        duracion = time.perf_counter() - self._inicio
+        archivos = {}
+        if self._escribir_cpu():
+            archivos["cpu"] = "cpu.prof"
+            archivos["cpu_resumen"] = "cpu.txt"
+
+        with open(os.path.join(self.directorio, "tiempos.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "perfil": self.id,
+                "valor": self.search_value,
+                "tipo_busqueda": self.search_type,
+                "duracion_total": round(duracion, 3),
+                "consultas": self.consultas,
+            }, f, ensure_ascii=False, indent=2)
+        archivos["tiempos"] = "tiempos.json"
+
+        limpiar_perfiles()
+        enlace = lambda archivo: f"{url_base}/{self.id}/{archivo}"
+        perfil = {
+            "id": self.id,
+            "url": f"{url_base}/{self.id}",
+            "duracion_total": round(duracion, 3),
+            "archivos": {clave: enlace(archivo) for clave, archivo in archivos.items()},
+            "trazas": [enlace(traza) for traza in self.trazas],
+        }
+        if not self.trazas:
+            perfil["nota"] = "La consulta no usó el navegador (camino HTTP o caché): no hay traza de Playwright"
+        return perfil
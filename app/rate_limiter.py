@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.error import URLError
+from playwright._impl._errors import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+try:
+    import fcntl
+except ImportError:
+    # Sin fcntl (Windows) el limitador se comparte solo dentro del proceso
+    fcntl = None
+
+
+def rate_limit_enabled() -> bool:
+    return os.getenv('SUNAT_RATE_LIMIT', 'true').lower() == 'true'
+
+
+def es_error_de_conexion(e: Exception) -> bool:
+    """
+    Errores que indican que SUNAT no responde o corta conexiones (reset,
+    errores de red del navegador, timeouts), a diferencia de errores de la
+    página o del parseo.
+    """
+    if isinstance(e, PlaywrightTimeoutError):
+        return True
+    if isinstance(e, PlaywrightError):
+        error_msg = str(e)
+        return "ERR_CONNECTION_RESET" in error_msg or "net::" in error_msg
+    return isinstance(e, (ConnectionError, TimeoutError, socket.timeout, URLError))
+
+
+class RateLimiter:
+    """
+    Limitador de peticiones a SUNAT: token bucket con tasa adaptativa AIMD.
+
+    Cada petición (navegación, envío del formulario, página de detalle, POST
+    del camino HTTP) toma un token. La tasa sube de a poco (aumento aditivo)
+    mientras SUNAT responde bien, y se reduce a una fracción (disminución
+    multiplicativa) ante resets, timeouts o respuestas más lentas que
+    latency_target; como mucho una reducción por ventana de cooldown, para
+    que una ráfaga de fallos simultáneos no la hunda de golpe.
+
+    El estado (tokens y tasa) vive en un archivo bloqueado con fcntl, así que
+    lo comparten los hilos, las tareas async y los procesos del runner por
+    lotes de la misma máquina. Solo la reserva de turno escribe el archivo en
+    cada petición: los éxitos y fallos se acumulan en memoria y se aplican con
+    la próxima reserva, o cada sync_interval segundos si no hay peticiones.
+
+    Args:
+        state_file: Archivo de estado compartido (SUNAT_RATE_STATE_FILE, por defecto data/cache/rate_limiter.json)
+        initial_rate: Peticiones por segundo al empezar (SUNAT_RATE_INITIAL, por defecto 1.0)
+        min_rate: Tasa mínima (SUNAT_RATE_MIN, por defecto 0.2)
+        max_rate: Tasa máxima (SUNAT_RATE_MAX, por defecto 5.0)
+        burst: Capacidad del bucket (SUNAT_RATE_BURST, por defecto 2)
+        increase: Aumento aditivo por petición exitosa, en peticiones/s (SUNAT_RATE_INCREASE, por defecto 0.05)
+        decrease_factor: Factor de la disminución multiplicativa (SUNAT_RATE_DECREASE_FACTOR, por defecto 0.5)
+        latency_target: Segundos a partir de los cuales una respuesta cuenta como congestión (SUNAT_RATE_LATENCY_TARGET, por defecto 8)
+        cooldown: Segundos mínimos entre dos reducciones (SUNAT_RATE_COOLDOWN, por defecto 5)
+        sync_interval: Segundos máximos con éxitos/fallos sin aplicar al estado compartido (SUNAT_RATE_SYNC_INTERVAL, por defecto 1)
+    """
+
+    def __init__(self, state_file: str = None, initial_rate: float = None, min_rate: float = None,
+                 max_rate: float = None, burst: float = None, increase: float = None,
+                 decrease_factor: float = None, latency_target: float = None, cooldown: float = None,
+                 sync_interval: float = None):
+        self.state_file = state_file or os.getenv('SUNAT_RATE_STATE_FILE', 'data/cache/rate_limiter.json')
+        self.initial_rate = initial_rate if initial_rate is not None else float(os.getenv('SUNAT_RATE_INITIAL', '1.0'))
+        self.min_rate = min_rate if min_rate is not None else float(os.getenv('SUNAT_RATE_MIN', '0.2'))
+        self.max_rate = max_rate if max_rate is not None else float(os.getenv('SUNAT_RATE_MAX', '5.0'))
+        self.burst = burst if burst is not None else float(os.getenv('SUNAT_RATE_BURST', '2'))
+        self.increase = increase if increase is not None else float(os.getenv('SUNAT_RATE_INCREASE', '0.05'))
+        self.decrease_factor = decrease_factor if decrease_factor is not None else float(os.getenv('SUNAT_RATE_DECREASE_FACTOR', '0.5'))
+        self.latency_target = latency_target if latency_target is not None else float(os.getenv('SUNAT_RATE_LATENCY_TARGET', '8'))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv('SUNAT_RATE_COOLDOWN', '5'))
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv('SUNAT_RATE_SYNC_INTERVAL', '1'))
+        self._lock = threading.Lock()
+        self._memoria = None
+        # Éxitos y fallos todavía no aplicados al estado compartido
+        self._aumento = 0.0
+        self._fallo = None
+        self._sincronizado = time.time()
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+
+    def _estado_inicial(self, ahora: float) -> dict:
+        return {"tasa": self.initial_rate, "tokens": self.burst, "actualizado": ahora, "ultima_reduccion": 0.0}
+
+    @contextmanager
+    def _estado(self):
+        """
+        Estado compartido bajo bloqueo (del hilo y del archivo), con los
+        éxitos y fallos pendientes ya aplicados. Los cambios hechos al
+        diccionario se guardan al salir.
+        """
+        with self._lock:
+            ahora = time.time()
+            if fcntl is None:
+                if self._memoria is None:
+                    self._memoria = self._estado_inicial(ahora)
+                self._aplicar_pendientes(self._memoria, ahora)
+                yield self._memoria, ahora
+                return
+
+            with open(self.state_file, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        estado = json.loads(f.read())
+                    except ValueError:
+                        estado = self._estado_inicial(ahora)
+                    self._aplicar_pendientes(estado, ahora)
+                    yield estado, ahora
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(estado))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _leer(self):
+        """
+        Estado compartido para consultarlo, sin escribirlo (bloqueo compartido del archivo)
+        """
+        ahora = time.time()
+        if fcntl is None:
+            with self._lock:
+                return dict(self._memoria or self._estado_inicial(ahora)), ahora
+        try:
+            with open(self.state_file) as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                return json.loads(f.read()), ahora
+        except (FileNotFoundError, ValueError):
+            return self._estado_inicial(ahora), ahora
+
+    def _aplicar_pendientes(self, estado: dict, ahora: float):
+        """
+        Aumento aditivo acumulado y, si hubo un fallo, la disminución
+        multiplicativa (una por cooldown, contando la de otros procesos).
+        Se llama con self._lock tomado.
+        """
+        estado["tasa"] = min(self.max_rate, estado["tasa"] + self._aumento)
+        if self._fallo is not None and ahora - estado["ultima_reduccion"] >= self.cooldown:
+            anterior = estado["tasa"]
+            estado["tasa"] = max(self.min_rate, anterior * self.decrease_factor)
+            estado["ultima_reduccion"] = ahora
+            print(f"🐢 Tasa hacia SUNAT reducida por {self._fallo}: {anterior:.2f} → {estado['tasa']:.2f} peticiones/s")
+        self._aumento = 0.0
+        self._fallo = None
+        self._sincronizado = ahora
+
+    def _sincronizar_si_corresponde(self):
+        with self._lock:
+            vencido = time.time() - self._sincronizado >= self.sync_interval
+        if vencido:
+            with self._estado():
+                pass
+
+    def _reservar(self) -> float:
+        """
+        Toma un token (aunque el bucket quede en negativo) y devuelve cuántos
+        segundos hay que esperar para que ese token exista. Reservar en lugar
+        de reintentar respeta el orden de llegada entre procesos.
+        """
+        with self._estado() as (estado, ahora):
+            tasa = min(self.max_rate, max(self.min_rate, estado["tasa"]))
+            transcurrido = max(0.0, ahora - estado["actualizado"])
+            tokens = min(self.burst, estado["tokens"] + transcurrido * tasa) - 1
+            estado.update(tasa=tasa, tokens=tokens, actualizado=ahora)
+        return -tokens / tasa if tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        """
+        Espera el turno de la próxima petición a SUNAT.
+
+        Returns:
+            Segundos esperados
+        """
+        espera = self._reservar()
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    async def acquire_async(self) -> float:
+        espera = await asyncio.to_thread(self._reservar)
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return espera
+
+    def record_success(self, latency: float):
+        """
+        Petición exitosa: aumento aditivo, o reducción si fue más lenta que latency_target.
+        """
+        if latency > self.latency_target:
+            self.record_failure(f"latencia {latency:.1f}s")
+            return
+        with self._lock:
+            self._aumento += self.increase
+        self._sincronizar_si_corresponde()
+
+    def record_failure(self, motivo: str = "error de conexión"):
+        """
+        Reset, timeout o respuesta lenta: disminución multiplicativa (una por cooldown).
+        """
+        with self._lock:
+            if self._fallo is None:
+                self._fallo = motivo
+        self._sincronizar_si_corresponde()
+
+    def _registrar(self, inicio: float, error: Exception = None):
+        if error is None:
+            self.record_success(time.perf_counter() - inicio)
+        elif es_error_de_conexion(error):
+            self.record_failure(type(error).__name__)
+
+    @contextmanager
+    def request(self, timer=None):
+        """
+        Envuelve una petición a SUNAT: espera su turno y registra el resultado
+        (latencia, o el tipo de error) para ajustar la tasa.
+
+        Args:
+            timer: StepTimer opcional; la espera se acumula en el paso "limitador"
+        """
+        espera = self.acquire()
+        if timer is not None:
+            timer.add("limitador", espera)
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._registrar(inicio, e)
+            raise
+        self._registrar(inicio)
+
+    @asynccontextmanager
+    async def request_async(self, timer=None):
+        espera = await self.acquire_async()
+        if timer is not None:
+            timer.add("limitador", espera)
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            await asyncio.to_thread(self._registrar, inicio, e)
+            raise
+        await asyncio.to_thread(self._registrar, inicio)
+
+    def stats(self) -> dict:
+        estado, ahora = self._leer()
+        tasa = estado["tasa"]
+        tokens = min(self.burst, estado["tokens"] + max(0.0, ahora - estado["actualizado"]) * tasa)
+        return {
+            "habilitado": True,
+            "peticiones_por_segundo": round(tasa, 3),
+            "tokens": round(tokens, 2),
+            "minimo": self.min_rate,
+            "maximo": self.max_rate,
+            "compartido_entre_procesos": fcntl is not None,
+        }
+
+
+class _SinLimite:
+    """
+    Limitador nulo para SUNAT_RATE_LIMIT=false (misma interfaz que RateLimiter)
+    """
+
+    def acquire(self) -> float:
+        return 0.0
+
+    async def acquire_async(self) -> float:
+        return 0.0
+
+    def record_success(self, latency: float):
+        pass
+
+    def record_failure(self, motivo: str = None):
+        pass
+
+    @contextmanager
+    def request(self, timer=None):
+        yield
+
+    @asynccontextmanager
+    async def request_async(self, timer=None):
+        yield
+
+    def stats(self) -> dict:
+        return {"habilitado": False}
+
+
+_limiter = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Limitador del proceso. Los procesos hijos (runner por lotes) crean el
+    suyo sobre el mismo archivo de estado.
+    """
+    global _limiter, _limiter_pid
+    with _limiter_lock:
+        if _limiter is None or _limiter_pid != os.getpid():
+            _limiter = RateLimiter() if rate_limit_enabled() else _SinLimite()
+            _limiter_pid = os.getpid()
+        return _limiter
@@ -0,0 +1,97 @@
+import os
+from urllib.parse import urlparse
+from .http_scraper import SUNAT_BASE_URL
+
+# Tipos de recurso que el parser nunca usa
+DEFAULT_BLOCKED_TYPES = "image,media,font"
+
+# Terceros (analítica, publicidad) que no intervienen en la búsqueda
+DEFAULT_BLOCKED_PATTERNS = "google-analytics.com,googletagmanager.com,doubleclick.net,facebook.net,hotjar.com"
+
+# Recursos del propio sitio de SUNAT de los que depende el formulario
+# (#btnAceptar) y el render de .panel.panel-primary; nunca se bloquean
+ESSENTIAL_TYPES = {"document", "script", "xhr", "fetch"}
+
+
+def _env_list(name: str, default: str) -> list:
+    return [item.strip().lower() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+def resource_blocking_enabled() -> bool:
+    return os.getenv('SUNAT_BLOCK_RESOURCES', 'true').lower() == 'true'
+
+
+class ResourceBlocker:
+    """
+    Perfil de intercepción de peticiones para una página de Playwright.
+    Aborta los tipos de recurso y patrones de URL configurados y cuenta las
+    peticiones bloqueadas y permitidas de la consulta.
+
+    Args:
+        blocked_types: Tipos de recurso a abortar (SUNAT_BLOCK_RESOURCE_TYPES)
+        blocked_patterns: Fragmentos de URL a abortar (SUNAT_BLOCK_URL_PATTERNS)
+    """
+
+    def __init__(self, blocked_types: list = None, blocked_patterns: list = None):
+        self.blocked_types = set(blocked_types if blocked_types is not None
+                                 else _env_list('SUNAT_BLOCK_RESOURCE_TYPES', DEFAULT_BLOCKED_TYPES))
+        self.blocked_patterns = (blocked_patterns if blocked_patterns is not None
+                                 else _env_list('SUNAT_BLOCK_URL_PATTERNS', DEFAULT_BLOCKED_PATTERNS))
+        self.sunat_host = urlparse(SUNAT_BASE_URL).netloc
+        self.blocked = 0
+        self.allowed = 0
+        self.blocked_by_type = {}
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in ESSENTIAL_TYPES and urlparse(url).netloc == self.sunat_host:
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        url = url.lower()
+        return any(pattern in url for pattern in self.blocked_patterns)
+
+    def _count(self, resource_type: str, block: bool):
+        if block:
+            self.blocked += 1
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        else:
+            self.allowed += 1
+
+    def attach(self, page):
+        """
+        Instala el perfil en una página de la API sync.
+        """
+        def handle(route):
+            request = route.request
+            block = self.should_block(request.resource_type, request.url)
+            self._count(request.resource_type, block)
+            if block:
+                route.abort()
+            else:
+                route.continue_()
+
+        page.route("**/*", handle)
+        return self
+
+    async def attach_async(self, page):
+        """
+        Instala el perfil en una página de la API async.
+        """
+        async def handle(route):
+            request = route.request
+            block = self.should_block(request.resource_type, request.url)
+            self._count(request.resource_type, block)
+            if block:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await page.route("**/*", handle)
+        return self
+
+    def stats(self) -> dict:
+        return {
+            "bloqueados": self.blocked,
+            "permitidos": self.allowed,
+            "bloqueados_por_tipo": dict(self.blocked_by_type),
+        }
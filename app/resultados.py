@@ -0,0 +1,13 @@
+# Clasificación de las listas de resultados de scrape_sunat, sin depender del
+# scraper: la usan la caché y el guardado de resultados
+
+
+def es_resultado_negativo(resultados: list) -> bool:
+    """
+    Indica si la respuesta es un "No se encontraron ..." de SUNAT (cacheable con TTL corto)
+    """
+    return bool(resultados) and isinstance(resultados[0], dict) and "No se encontraron" in str(resultados[0].get("error", ""))
+
+
+def es_resultado_error(resultados: list) -> bool:
+    return not resultados or (isinstance(resultados[0], dict) and "error" in resultados[0])
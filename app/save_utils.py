@@ -1,11 +1,100 @@
+import csv
+import hashlib
 import json
-import pandas as pd
-from datetime import datetime
 import os
+import threading
+import pandas as pd
+from datetime import date, datetime
+from itertools import islice
+from openpyxl import Workbook
+from .resultados import es_resultado_error, es_resultado_negativo
+from .parquet_utils import CAMPOS, ParquetResultWriter, nombre_corrida, parquet_habilitado
+
+try:
+    import fcntl
+except ImportError:
+    # Sin fcntl (Windows) el journal no se bloquea entre procesos
+    fcntl = None
+
+OUTPUT_DIR = "data/resultados"
+COLUMNAS_BASE = ['empresa_buscada', 'numero_resultado']
+
+
+# Encabezado inicial del CSV parcial: los campos estandarizados y el error, para
+# no tener que reescribirlo cuando aparecen a mitad de la consulta
+COLUMNAS_CSV = ['empresa_buscada', 'numero_resultado', *CAMPOS, 'error']
+
+
+def ruta_journal(origen: str, tipo_busqueda: str, tipo_documento: str = None) -> str:
+    """
+    Ruta estable del journal de una consulta masiva: la misma para el mismo
+    archivo de entrada y tipo de búsqueda, para poder reanudarla.
+    """
+    journal_dir = os.getenv('SUNAT_JOURNAL_DIR', 'data/journal')
+    nombre = os.path.splitext(os.path.basename(origen))[0]
+    huella = hashlib.sha1(os.path.abspath(origen).encode('utf-8')).hexdigest()[:8]
+    tipo = f"{tipo_busqueda}_{tipo_documento}" if tipo_documento else tipo_busqueda
+    return os.path.join(journal_dir, f"{nombre}_{tipo}_{huella}.jsonl")
+
+
+def es_resultado_final(resultados: list) -> bool:
+    """
+    Resultado que no hace falta volver a consultar al reanudar: datos o un
+    "No se encontraron" de SUNAT. Los demás errores se reintentan.
+    """
+    return not es_resultado_error(resultados) or es_resultado_negativo(resultados)
+
+
+def filas_planas(empresa: str, resultados: list) -> list:
+    """
+    Filas planas (una por resultado) de una empresa para Excel/CSV
+    """
+    filas = []
+    if resultados:
+        for i, resultado in enumerate(resultados):
+            if isinstance(resultado, dict) and 'error' not in resultado:
+                # Añadir información de la empresa y número de resultado
+                filas.append({
+                    'empresa_buscada': empresa,
+                    'numero_resultado': i + 1,
+                    **resultado
+                })
+            elif isinstance(resultado, dict) and 'error' in resultado:
+                # Guardar errores también
+                filas.append({
+                    'empresa_buscada': empresa,
+                    'numero_resultado': i + 1,
+                    'error': resultado['error']
+                })
+    return filas
+
+
+def escribir_parquet(filas, base_filename: str, tipo_busqueda: str, fecha: date = None) -> str:
+    """
+    Escribe filas planas (iterable, se consume por row groups) en el Parquet
+    particionado (ver parquet_utils), con la hora de la corrida en el nombre.
+    Sin pyarrow o con SUNAT_PARQUET=false no escribe nada.
+
+    Returns:
+        Ruta del Parquet, o None si no se generó
+    """
+    if not parquet_habilitado():
+        return None
+    try:
+        with ParquetResultWriter(nombre_corrida(base_filename), tipo_busqueda or "nombre", fecha) as writer:
+            for lote in filas:
+                writer.write_rows(lote)
+            parquet_file = writer.close()
+        print(f"✓ Datos guardados en Parquet: {parquet_file}")
+        return parquet_file
+    except Exception as e:
+        print(f"✗ Error guardando Parquet: {str(e)}")
+        return None
+
 
 def save_results_to_files(results_data: dict, base_filename: str = None) -> dict:
     """
-    Guarda los resultados en múltiples formatos (JSON, Excel, CSV)
+    Guarda los resultados en múltiples formatos (JSON, Excel, CSV y Parquet)
     
     Args:
         results_data: Diccionario con los resultados {empresa: [datos]}
@@ -19,7 +108,7 @@ def save_results_to_files(results_data: dict, base_filename: str = None) -> dict
         base_filename = f"consulta_sunat_{timestamp}"
     
     # Crear directorio de salida si no existe
-    output_dir = "data/resultados"
+    output_dir = OUTPUT_DIR
     os.makedirs(output_dir, exist_ok=True)
     
     # Rutas de archivos
@@ -39,23 +128,7 @@ def save_results_to_files(results_data: dict, base_filename: str = None) -> dict
         # Preparar datos para DataFrame
         flat_data = []
         for empresa, resultados in results_data['resultados'].items():
-            if resultados:
-                for i, resultado in enumerate(resultados):
-                    if isinstance(resultado, dict) and 'error' not in resultado:
-                        # Añadir información de la empresa y número de resultado
-                        resultado_flat = {
-                            'empresa_buscada': empresa,
-                            'numero_resultado': i + 1,
-                            **resultado
-                        }
-                        flat_data.append(resultado_flat)
-                    elif isinstance(resultado, dict) and 'error' in resultado:
-                        # Guardar errores también
-                        flat_data.append({
-                            'empresa_buscada': empresa,
-                            'numero_resultado': i + 1,
-                            'error': resultado['error']
-                        })
+            flat_data.extend(filas_planas(empresa, resultados))
         
         if flat_data:
             df = pd.DataFrame(flat_data)
@@ -83,6 +156,10 @@ def save_results_to_files(results_data: dict, base_filename: str = None) -> dict
                 print(f"✓ Datos guardados en CSV: {csv_file}")
             except Exception as e:
                 print(f"✗ Error guardando CSV: {str(e)}")
+
+            parquet_file = escribir_parquet([flat_data], base_filename, results_data.get('tipo_busqueda'))
+            if parquet_file:
+                saved_files['parquet'] = parquet_file
         
         else:
             print("⚠️ No se encontraron datos válidos para guardar en Excel/CSV")
@@ -96,7 +173,44 @@ def save_summary_report(results_data: dict, saved_files: dict) -> str:
     """
     Genera un reporte resumen en texto plano
     """
-    output_dir = "data/resultados"
+    resumen = ResumenConsulta()
+    for resultados in results_data['resultados'].values():
+        resumen.agregar(resultados)
+    errores = results_data.get('errores') or []
+    return _escribir_reporte(resumen, saved_files, errores, len(errores))
+
+
+class ResumenConsulta:
+    """
+    Contadores del reporte resumen, acumulables empresa por empresa
+    """
+
+    def __init__(self):
+        self.total_empresas = 0
+        self.empresas_con_datos = 0
+        self.empresas_con_errores = 0
+        self.total_resultados = 0
+
+    def agregar(self, resultados: list):
+        self.total_empresas += 1
+        if resultados:
+            tiene_datos = False
+            for resultado in resultados:
+                if isinstance(resultado, dict):
+                    if 'error' in resultado:
+                        self.empresas_con_errores += 1
+                    else:
+                        tiene_datos = True
+                        self.total_resultados += 1
+            if tiene_datos:
+                self.empresas_con_datos += 1
+
+
+def _escribir_reporte(resumen: ResumenConsulta, saved_files: dict, errores, total_errores: int) -> str:
+    """
+    Escribe el reporte. errores puede ser cualquier iterable (p. ej. leído del JSONL).
+    """
+    output_dir = OUTPUT_DIR
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     report_file = os.path.join(output_dir, f"reporte_{timestamp}.txt")
     
@@ -108,28 +222,10 @@ def save_summary_report(results_data: dict, saved_files: dict) -> str:
             f.write(f"Fecha y hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
             
             # Resumen de empresas procesadas
-            total_empresas = len(results_data['resultados'])
-            empresas_con_datos = 0
-            empresas_con_errores = 0
-            total_resultados = 0
-            
-            for empresa, resultados in results_data['resultados'].items():
-                if resultados:
-                    tiene_datos = False
-                    for resultado in resultados:
-                        if isinstance(resultado, dict):
-                            if 'error' in resultado:
-                                empresas_con_errores += 1
-                            else:
-                                tiene_datos = True
-                                total_resultados += 1
-                    if tiene_datos:
-                        empresas_con_datos += 1
-            
-            f.write(f"Total de empresas consultadas: {total_empresas}\n")
-            f.write(f"Empresas con datos encontrados: {empresas_con_datos}\n")
-            f.write(f"Empresas con errores: {empresas_con_errores}\n")
-            f.write(f"Total de resultados obtenidos: {total_resultados}\n\n")
+            f.write(f"Total de empresas consultadas: {resumen.total_empresas}\n")
+            f.write(f"Empresas con datos encontrados: {resumen.empresas_con_datos}\n")
+            f.write(f"Empresas con errores: {resumen.empresas_con_errores}\n")
+            f.write(f"Total de resultados obtenidos: {resumen.total_resultados}\n\n")
             
             # Archivos generados
             f.write("ARCHIVOS GENERADOS:\n")
@@ -138,10 +234,10 @@ def save_summary_report(results_data: dict, saved_files: dict) -> str:
                 f.write(f"- {formato.upper()}: {archivo}\n")
             
             # Errores encontrados
-            if 'errores' in results_data and results_data['errores']:
-                f.write(f"\nERRORES ENCONTRADOS ({len(results_data['errores'])}):\n")
+            if total_errores:
+                f.write(f"\nERRORES ENCONTRADOS ({total_errores}):\n")
                 f.write("-" * 30 + "\n")
-                for error in results_data['errores']:
+                for error in errores:
                     f.write(f"- {error}\n")
         
         print(f"✓ Reporte generado: {report_file}")
@@ -149,4 +245,408 @@ def save_summary_report(results_data: dict, saved_files: dict) -> str:
         
     except Exception as e:
         print(f"✗ Error generando reporte: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+class StreamingResultWriter:
+    """
+    Guarda los resultados de una consulta masiva a medida que terminan.
+
+    Cada empresa se agrega de inmediato a <base>.jsonl y <base>.csv, con flush
+    cada flush_every empresas, así que una caída no pierde lo ya consultado.
+    Al cerrar se generan desde el JSONL el JSON, el CSV y el Excel en el orden
+    de entrada, y el reporte resumen, sin mantener los resultados en memoria.
+
+    El Parquet particionado se escribe a medida que terminan las empresas
+    (por row groups, en el orden de llegada) con la hora de inicio de la
+    corrida en el nombre, y se publica al cerrar. Las empresas reanudadas del
+    journal que no se vuelven a consultar se agregan al final.
+
+    Con journal_file el JSONL se escribe en esa ruta (ver ruta_journal). Si
+    además reanudar es True y el journal existe, se conservan sus líneas: cada
+    empresa vale por su última línea, y completados() indica cuáles no hace
+    falta volver a consultar. El journal queda bloqueado (flock exclusivo)
+    mientras el writer está abierto: una segunda consulta sobre el mismo
+    journal falla de inmediato con RuntimeError en vez de mezclar líneas.
+
+    Args:
+        base_filename: Nombre base de los archivos (como save_results_to_files)
+        tipo_busqueda: Tipo de búsqueda de la consulta
+        tipo_documento: Tipo de documento (solo búsquedas por documento)
+        orden: Valores de entrada; los archivos finales siguen este orden
+        flush_every: Empresas entre flush a disco (SUNAT_STREAM_FLUSH_EVERY, por defecto 20)
+        journal_file: Ruta del JSONL (por defecto <base>.jsonl en OUTPUT_DIR)
+        reanudar: Continuar el journal existente en lugar de empezar uno nuevo
+    """
+
+    def __init__(self, base_filename: str = None, tipo_busqueda: str = "nombre", tipo_documento: str = None,
+                 orden: list = None, flush_every: int = None, journal_file: str = None, reanudar: bool = False):
+        if base_filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_filename = f"consulta_sunat_{timestamp}"
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+        self.base_filename = base_filename
+        self.tipo_busqueda = tipo_busqueda
+        self.tipo_documento = tipo_documento
+        # Partición y nombre del Parquet: fecha y hora en que empezó la ejecución
+        self.inicio = datetime.now()
+        self.fecha = self.inicio.date()
+        self.flush_every = flush_every or int(os.getenv('SUNAT_STREAM_FLUSH_EVERY', '20'))
+        self.jsonl_file = journal_file or os.path.join(OUTPUT_DIR, f"{base_filename}.jsonl")
+        self.json_file = os.path.join(OUTPUT_DIR, f"{base_filename}.json")
+        self.excel_file = os.path.join(OUTPUT_DIR, f"{base_filename}.xlsx")
+        self.csv_file = os.path.join(OUTPUT_DIR, f"{base_filename}.csv")
+
+        self._orden = {}
+        for valor in orden or []:
+            self._orden.setdefault(valor, len(self._orden))
+        self._lock = threading.Lock()
+        # valor -> (posición final, offset de su última línea en el JSONL)
+        self._lineas = {}
+        # Valores cuya última línea tiene error / resultado final
+        self._con_error = set()
+        self._finales = set()
+        self._escritos = 0
+        self.errores_muestra = []
+        self.resumen = None
+        self.reanudados = 0
+
+        os.makedirs(os.path.dirname(self.jsonl_file) or ".", exist_ok=True)
+        existia = os.path.exists(self.jsonl_file)
+        # Se abre sin truncar: primero hay que tener el bloqueo
+        self._jsonl = os.fdopen(os.open(self.jsonl_file, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        self._bloquear_journal()
+
+        # El CSV parcial se crea con la primera fila
+        self._csv = None
+        self._csv_writer = None
+        self._columnas = list(COLUMNAS_CSV)
+        if os.path.exists(self.csv_file):
+            os.remove(self.csv_file)
+
+        if reanudar and existia:
+            self._cargar_journal()
+        else:
+            self._jsonl.truncate(0)
+
+        # Valores del journal reanudado que todavía no pasaron al Parquet
+        self._sin_parquet = set(self._lineas)
+        self._parquet = self._abrir_parquet()
+
+    def _abrir_parquet(self):
+        if not parquet_habilitado():
+            return None
+        try:
+            return ParquetResultWriter(nombre_corrida(self.base_filename, self.inicio),
+                                       self.tipo_busqueda or "nombre", self.fecha)
+        except Exception as e:
+            print(f"✗ Error guardando Parquet: {str(e)}")
+            return None
+
+    def _escribir_parquet(self, valor: str, filas: list):
+        """
+        Agrega las filas de una empresa al Parquet (una sola vez por empresa)
+        """
+        if self._parquet is None:
+            return
+        try:
+            self._parquet.write_rows(filas)
+        except Exception as e:
+            print(f"✗ Error guardando Parquet: {str(e)}")
+            self._parquet.descartar()
+            self._parquet = None
+
+    def _bloquear_journal(self):
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._jsonl, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._jsonl.close()
+            raise RuntimeError(f"El journal {self.jsonl_file} está en uso por otra consulta en curso")
+
+    @property
+    def total_errores(self) -> int:
+        return len(self._con_error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Se deja el JSONL/CSV parcial en disco; el Parquet no se publica
+            self._cerrar_streams()
+            if self._parquet is not None:
+                self._parquet.descartar()
+                self._parquet = None
+
+    def write(self, valor: str, resultados: list, error: str = None):
+        """
+        Registra los resultados de una empresa.
+
+        Args:
+            error: Mensaje para la lista de errores del reporte (None si no hubo error)
+        """
+        linea = json.dumps({"valor": valor, "resultados": resultados, "error": error}, ensure_ascii=False).encode('utf-8')
+        filas = filas_planas(valor, resultados)
+        with self._lock:
+            primera_vez = valor not in self._lineas or valor in self._sin_parquet
+            self._registrar(valor, self._jsonl.tell(), resultados, error)
+            self._jsonl.write(linea + b"\n")
+            self._escribir_filas_csv(filas)
+            if primera_vez:
+                self._sin_parquet.discard(valor)
+                self._escribir_parquet(valor, filas)
+            self._escritos += 1
+            if self._escritos % self.flush_every == 0:
+                self._flush()
+
+    def _registrar(self, valor: str, offset: int, resultados: list, error: str = None):
+        posicion = self._orden.setdefault(valor, len(self._orden))
+        self._lineas[valor] = (posicion, offset)
+        if error:
+            self._con_error.add(valor)
+        else:
+            self._con_error.discard(valor)
+        if es_resultado_final(resultados):
+            self._finales.add(valor)
+        else:
+            self._finales.discard(valor)
+
+    def _cargar_journal(self):
+        """
+        Lee el journal existente. Una última línea incompleta (caída a mitad
+        de escritura) se descarta y se trunca para seguir agregando detrás.
+        """
+        offset = 0
+        for linea in self._jsonl:
+            try:
+                registro = json.loads(linea.decode('utf-8'))
+            except ValueError:
+                break
+            if not linea.endswith(b"\n"):
+                break
+            # Valores que ya no están en la entrada no pasan a los archivos finales
+            if not self._orden or registro["valor"] in self._orden:
+                self._registrar(registro["valor"], offset, registro["resultados"], registro.get("error"))
+            offset += len(linea)
+        self._jsonl.seek(offset)
+        self._jsonl.truncate()
+        self.reanudados = len(self._lineas)
+
+        # El CSV parcial vuelve a incluir lo ya consultado
+        for valor, resultados in self._leer_en_orden():
+            self._escribir_filas_csv(filas_planas(valor, resultados))
+        print(f"♻️ Journal reanudado: {self.reanudados} empresas ({len(self._finales)} completas) en {self.jsonl_file}")
+
+    def completados(self) -> set:
+        """
+        Valores con resultado final en el journal (no hace falta volver a consultarlos)
+        """
+        with self._lock:
+            return set(self._finales)
+
+    def _escribir_filas_csv(self, filas: list):
+        nuevas = [columna for fila in filas for columna in fila if columna not in self._columnas]
+        if nuevas or (filas and self._csv is None):
+            self._columnas.extend(dict.fromkeys(nuevas))
+            self._reescribir_encabezado_csv()
+        for fila in filas:
+            self._csv_writer.writerow(fila)
+
+    def _reescribir_encabezado_csv(self):
+        """
+        Crea el CSV parcial, o lo reescribe con el encabezado ampliado si
+        apareció un campo fuera de COLUMNAS_CSV (pasa pocas veces). Las filas
+        previas se copian de a una a un archivo aparte que después reemplaza
+        al CSV, así que ni se cargan en memoria ni el archivo queda a medias.
+        """
+        temporal = self.csv_file + ".tmp"
+        with open(temporal, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(self._columnas)
+            if self._csv is not None:
+                self._csv.close()
+                with open(self.csv_file, 'r', newline='', encoding='utf-8') as previo:
+                    lector = csv.reader(previo)
+                    next(lector, None)
+                    for fila in lector:
+                        writer.writerow(fila + [''] * (len(self._columnas) - len(fila)))
+        os.replace(temporal, self.csv_file)
+
+        self._csv = open(self.csv_file, 'a', newline='', encoding='utf-8')
+        self._csv_writer = csv.DictWriter(self._csv, fieldnames=self._columnas, lineterminator='\n')
+
+    def _flush(self):
+        for stream in (self._jsonl, self._csv):
+            if stream is not None:
+                stream.flush()
+                os.fsync(stream.fileno())
+
+    def _cerrar_streams(self):
+        with self._lock:
+            if not self._jsonl.closed:
+                self._flush()
+                self._jsonl.close()
+                if self._csv is not None:
+                    self._csv.close()
+
+    def _leer_lineas(self, offsets):
+        with open(self.jsonl_file, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline().decode('utf-8'))
+
+    def _leer_en_orden(self):
+        """
+        (valor, resultados) de la última línea de cada valor, en el orden de entrada
+        """
+        offsets = [offset for _, offset in sorted(self._lineas.values())]
+        for linea in self._leer_lineas(offsets):
+            yield linea["valor"], linea["resultados"]
+
+    def _leer_errores(self):
+        """
+        Errores vigentes (última línea de cada valor), en el orden de entrada
+        """
+        offsets = [offset for _, offset in sorted(self._lineas[valor] for valor in self._con_error)]
+        for linea in self._leer_lineas(offsets):
+            yield linea["error"]
+
+    def close(self) -> dict:
+        """
+        Cierra los streams y genera JSON, CSV y Excel ordenados y el reporte.
+
+        Returns:
+            Diccionario con las rutas de los archivos generados
+        """
+        self._cerrar_streams()
+        saved_files = {'jsonl': self.jsonl_file}
+        self.errores_muestra = list(islice(self._leer_errores(), 5))
+
+        # Primera pasada: columnas (en orden de aparición) y resumen
+        columnas = {}
+        self.resumen = ResumenConsulta()
+        self.registros_con_datos = 0
+        self.total_resultados = 0
+        for valor, resultados in self._leer_en_orden():
+            self.resumen.agregar(resultados)
+            if resultados and not (isinstance(resultados[0], dict) and 'error' in resultados[0]):
+                self.registros_con_datos += 1
+                self.total_resultados += len(resultados)
+            for fila in filas_planas(valor, resultados):
+                columnas.update(dict.fromkeys(fila))
+        columnas = list(columnas)
+
+        try:
+            self._escribir_json()
+            saved_files['json'] = self.json_file
+            print(f"✓ Datos guardados en JSON: {self.json_file}")
+
+            if columnas:
+                try:
+                    self._escribir_excel(columnas)
+                    saved_files['excel'] = self.excel_file
+                    print(f"✓ Datos guardados en Excel: {self.excel_file}")
+                except Exception as e:
+                    print(f"✗ Error guardando Excel: {str(e)}")
+
+                try:
+                    self._escribir_csv(columnas)
+                    saved_files['csv'] = self.csv_file
+                    print(f"✓ Datos guardados en CSV: {self.csv_file}")
+                except Exception as e:
+                    print(f"✗ Error guardando CSV: {str(e)}")
+
+                parquet_file = self._cerrar_parquet()
+                if parquet_file:
+                    saved_files['parquet'] = parquet_file
+            else:
+                print("⚠️ No se encontraron datos válidos para guardar en Excel/CSV")
+        except Exception as e:
+            print(f"✗ Error general guardando archivos: {str(e)}")
+        finally:
+            # Sin filas (o con error antes de publicarlo) el Parquet no queda a medias
+            if self._parquet is not None:
+                self._parquet.descartar()
+                self._parquet = None
+
+        report_file = _escribir_reporte(self.resumen, saved_files, self._leer_errores(), self.total_errores)
+        if report_file:
+            saved_files['reporte'] = report_file
+        return saved_files
+
+    def _cerrar_parquet(self) -> str:
+        """
+        Agrega las empresas reanudadas que no se volvieron a consultar y
+        publica el Parquet
+
+        Returns:
+            Ruta del Parquet, o None si no se generó
+        """
+        if self._parquet is None:
+            return None
+        offsets = [offset for _, offset in sorted(self._lineas[valor] for valor in self._sin_parquet)]
+        for linea in self._leer_lineas(offsets):
+            self._escribir_parquet(linea["valor"], filas_planas(linea["valor"], linea["resultados"]))
+        if self._parquet is None:
+            return None
+        try:
+            parquet_file = self._parquet.close()
+            print(f"✓ Datos guardados en Parquet: {parquet_file}")
+            return parquet_file
+        except Exception as e:
+            print(f"✗ Error guardando Parquet: {str(e)}")
+            return None
+        finally:
+            self._parquet = None
+
+    def _escribir_json(self):
+        """
+        Mismo contenido y formato que json.dump(results_data, indent=2), escrito por partes
+        """
+        def anidado(valor, nivel):
+            return json.dumps(valor, ensure_ascii=False, indent=2).replace("\n", "\n" + "  " * nivel)
+
+        with open(self.json_file, 'w', encoding='utf-8') as f:
+            f.write('{\n  "resultados": {')
+            primero = True
+            for valor, resultados in self._leer_en_orden():
+                f.write(("\n" if primero else ",\n") + f'    {anidado(valor, 2)}: {anidado(resultados, 2)}')
+                primero = False
+            f.write('\n  },' if not primero else '},')
+            f.write(f'\n  "tipo_busqueda": {anidado(self.tipo_busqueda, 1)},')
+            f.write(f'\n  "tipo_documento": {anidado(self.tipo_documento, 1)}')
+            if self.total_errores:
+                f.write(',\n  "errores": [')
+                for i, error in enumerate(self._leer_errores()):
+                    f.write(("\n" if i == 0 else ",\n") + f'    {anidado(error, 2)}')
+                f.write('\n  ]')
+            f.write('\n}')
+
+    def _escribir_excel(self, columnas: list):
+        workbook = Workbook(write_only=True)
+        hoja = workbook.create_sheet('Resultados SUNAT')
+        hoja.append(columnas)
+        for valor, resultados in self._leer_en_orden():
+            for fila in filas_planas(valor, resultados):
+                hoja.append([fila.get(columna) for columna in columnas])
+
+        # Si hay errores, crear una hoja separada
+        if self.total_errores:
+            hoja_errores = workbook.create_sheet('Errores')
+            hoja_errores.append(['error'])
+            for error in self._leer_errores():
+                hoja_errores.append([error])
+        workbook.save(self.excel_file)
+
+    def _escribir_csv(self, columnas: list):
+        # El CSV parcial (orden de llegada) se reemplaza por uno en el orden de entrada
+        temporal = self.csv_file + ".tmp"
+        with open(temporal, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columnas, lineterminator='\n')
+            writer.writeheader()
+            for valor, resultados in self._leer_en_orden():
+                writer.writerows(filas_planas(valor, resultados))
+        os.replace(temporal, self.csv_file)
@@ -1,11 +1,27 @@
 from playwright.sync_api import sync_playwright
-from playwright._impl._errors import Error as PlaywrightError
+from playwright._impl._errors import TimeoutError as PlaywrightTimeoutError
+import threading
 import time
-import random
-import os
-from .parser import parse_resultado
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from .parser import parse_resultado, PANEL_SELECTOR, PANEL_OUTER_HTML
+from .browser_pool import PAGE_TIMEOUT_MS, get_browser_pool, launch_browser, new_context, pool_size
+from .http_scraper import SesionListado, http_fast_path_enabled, scrape_ruc_http
+from .search_flow import (
+    SUNAT_SEARCH_URL, RUC_PATTERN, MAX_RETRIES, JS_LLENAR_CAMPO, JS_FORMULARIO_DETALLE, RESULTADO_RUC,
+    RESULTADO_LISTADO, ENVIO_TIMEOUT_MS, ListadoRucs, detail_fanout, detail_fanout_total, debug_activo,
+    clasificar_resultado, registrar_en_circuito, manejar_error, resultado_de_detalle
+)
+from .circuit_breaker import get_circuit_breaker
+from .rate_limiter import get_rate_limiter
+from .resource_blocking import ResourceBlocker, resource_blocking_enabled
+from .waits import StepTimer, PacingPolicy, click_and_wait_response, wait_overlays_hidden
+from .metrics import SCRAPE_SECONDS, SCRAPES_TOTAL, RETRIES_TOTAL, BROWSERS_ACTIVE, PAGES_ACTIVE
 
-def scrape_sunat(search_value: str, search_type: str = "nombre", document_type: str = "1", debug_mode: bool = False) -> list:
+
+def scrape_sunat(search_value: str, search_type: str = "nombre", document_type: str = "1", debug_mode: bool = False,
+                 metadata: dict = None, perfil=None) -> list:
     """
     Scrapes SUNAT website for company information.
     
@@ -15,274 +31,494 @@ def scrape_sunat(search_value: str, search_type: str = "nombre", document_type:
         document_type: Tipo de documento para búsqueda por documento 
                       ("1"=DNI, "4"=Carnet Extranjería, "7"=Pasaporte, "A"=Cédula Diplomática)
         debug_mode: Si mostrar el navegador
+        metadata: Diccionario opcional que se completa con datos de la consulta
+                  (motor usado, recursos bloqueados/permitidos, tiempos por paso)
+        perfil: PerfilConsulta opcional (ver app/profiling.py): perfila la CPU,
+                guarda la traza de Playwright y los tiempos por paso
     
     Returns:
         Lista de resultados o información de error
     """
-    results = []
-    max_retries = 3
+    if metadata is None:
+        metadata = {}
+    timer = StepTimer()
+    try:
+        with perfil.cpu() if perfil is not None else nullcontext():
+            results = _scrape(search_value, search_type, document_type, debug_mode, metadata, timer, perfil)
+            if isinstance(results, ListadoRucs):
+                with timer.step("detalles"):
+                    return _consultar_detalles(results, metadata, perfil)
+            return results
+    finally:
+        metadata["tiempos"] = timer.as_dict()
+        if timer.avisos:
+            metadata["avisos"] = dict(timer.avisos)
+        if perfil is not None:
+            perfil.registrar_consulta(search_value, search_type, metadata)
+
+
+def iter_scrape_sunat(search_value: str, search_type: str = "nombre", document_type: str = "1",
+                      debug_mode: bool = False, metadata: dict = None):
+    """
+    Versión generadora de scrape_sunat: entrega cada resultado en cuanto está
+    listo, en el mismo orden y con el mismo contenido que la lista de
+    scrape_sunat. En búsquedas por nombre o documento cada página de detalle
+    se entrega apenas se parsea, sin esperar a las demás.
+
+    Yields:
+        Diccionario de cada resultado (o de error)
+    """
+    if metadata is None:
+        metadata = {}
+    timer = StepTimer()
+    try:
+        results = _scrape(search_value, search_type, document_type, debug_mode, metadata, timer)
+        if isinstance(results, ListadoRucs):
+            yield from _iter_detalles(results, metadata, timer)
+        else:
+            yield from results
+    finally:
+        metadata["tiempos"] = timer.as_dict()
+        if timer.avisos:
+            metadata["avisos"] = dict(timer.avisos)
+
+
+def _scrape(search_value: str, search_type: str, document_type: str, debug_mode: bool,
+            metadata: dict, timer: StepTimer, perfil=None) -> list:
+    """
+    Búsqueda con reintentos. En búsquedas por nombre o documento devuelve un
+    ListadoRucs cuyos detalles consulta el llamador.
+    """
+    inicio = time.perf_counter()
+    results = _scrape_con_reintentos(search_value, search_type, document_type, debug_mode, metadata, timer, perfil)
+    SCRAPE_SECONDS.observe(time.perf_counter() - inicio, search_type=search_type, engine=metadata.get("motor", "navegador"))
+    SCRAPES_TOTAL.inc(search_type=search_type, outcome=clasificar_resultado(results))
+    return results
+
+
+def _scrape_con_reintentos(search_value: str, search_type: str, document_type: str, debug_mode: bool,
+                           metadata: dict, timer: StepTimer, perfil=None) -> list:
+    max_retries = MAX_RETRIES
+    # Check if we should run in debug mode (visible browser)
+    debug_mode = debug_activo(debug_mode)
     
+    # Con SUNAT caído se responde al instante, sin lanzar el navegador ni reintentar
+    breaker = get_circuit_breaker()
+    if not breaker.permitir():
+        metadata["motor"] = "circuito_abierto"
+        print(f"⛔ Circuito abierto, consulta rechazada: {search_value}")
+        return breaker.error_result()
+    
+    # Camino rápido: la consulta por RUC se resuelve con un POST directo, sin navegador
+    if search_type == "ruc" and not debug_mode and http_fast_path_enabled():
+        with timer.step("http"):
+            result = scrape_ruc_http(search_value)
+        if result is not None:
+            metadata["motor"] = "http"
+            breaker.record_success()
+            return [result]
+        print("↩️ Respuesta HTTP no reconocida, usando el navegador...")
+    
+    metadata["motor"] = "navegador"
+    # En modo debug se recorre el listado en el mismo navegador, resultado por resultado
+    recolectar_rucs = not debug_mode
     for attempt in range(max_retries):
         try:
-            with sync_playwright() as p:
-                # Configure browser with more realistic settings
-                # Check if we should run in debug mode (visible browser)
-                debug_mode = debug_mode or os.getenv('SUNAT_DEBUG', 'false').lower() == 'true'
-                
-                browser = p.chromium.launch(
-                    headless=not debug_mode,  # headless=False solo en debug mode
-                    slow_mo=500 if debug_mode else 0,    # Slow motion solo en debug
-                    args=[
-                        '--no-sandbox',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-dev-shm-usage',
-                        '--disable-web-security',
-                        '--disable-features=VizDisplayCompositor'
-                    ]
-                )
-                
-                # Create page with realistic user agent and viewport
-                page = browser.new_page()
-                page.set_viewport_size({"width": 1366, "height": 768})
-                page.set_extra_http_headers({
-                    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
-                    'Accept-Encoding': 'gzip, deflate',
-                    'Connection': 'keep-alive'
-                })
-                
-                # Set reasonable timeout
-                page.set_default_timeout(60000)  # Aumentado a 60 segundos
-                
-                print(f"Navegando a SUNAT para buscar: {search_value} (tipo: {search_type})")
-                
-                # Navigate to the page with wait until load
-                page.goto(
-                    "https://e-consultaruc.sunat.gob.pe/cl-ti-itmrconsruc/FrameCriterioBusquedaWeb.jsp",
-                    wait_until="networkidle"
-                )
-                
-                # Wait for page to fully load
-                print("Esperando que la página cargue completamente...")
-                time.sleep(1.5)  # Reducido de 3 a 1.5 segundos
-                
-                # Handle different search types
-                if search_type == "nombre":
-                    print("Configurando búsqueda por nombre/razón social...")
-                    # Click on "Por Nomb./Raz.Soc." button to enable the search field
-                    page.wait_for_selector("#btnPorRazonSocial", state="visible", timeout=30000)
-                    page.click("#btnPorRazonSocial")
-                    time.sleep(0.5)
-                    search_field = "#txtNombreRazonSocial"
-                    
-                elif search_type == "ruc":
-                    print("🔍 Configurando búsqueda por RUC...")
-                    search_field = "#txtRuc"
-                    
-                elif search_type == "documento":
-                    print(f"Configurando búsqueda por documento (tipo: {document_type})...")
-                    # Click on "Por Documento" button
-                    page.wait_for_selector("#btnPorDocumento", state="visible", timeout=30000)
-                    page.click("#btnPorDocumento")
-                    time.sleep(0.5)
-                    
-                    # Select document type
-                    page.select_option("#cmbTipoDoc", value=document_type)
-                    time.sleep(0.5)
-                    search_field = "#txtNumeroDocumento"
-                    
-                else:
-                    raise ValueError(f"Tipo de búsqueda no válido: {search_type}. Use 'nombre', 'ruc' o 'documento'")
-                
-                # Wait for the search input to be visible and interactable
-                print("Esperando que el campo de búsqueda esté disponible...")
-                
-                # First wait for the element to exist
-                page.wait_for_selector(search_field, timeout=30000)
-                
-                # Then wait for it to be visible and enabled
-                search_input = page.locator(search_field)
-                search_input.wait_for(state="visible", timeout=30000)
-                
-                # Check if there are any overlays or modals that might be blocking the element
-                try:
-                    # Look for common modal/overlay patterns that might block interaction
-                    overlays = page.query_selector_all("[class*='modal'], [class*='overlay'], [class*='loading'], [class*='popup']")
-                    if overlays:
-                        print("Detectadas posibles ventanas modales, esperando que se cierren...")
-                        time.sleep(1.5)  # Reducido de 3 a 1.5 segundos
-                except:
-                    pass
-                
-                # Scroll to the element to make sure it's in view
-                search_input.scroll_into_view_if_needed()
-                time.sleep(0.5)  # Reducido de 1 a 0.5 segundos
-                
-                # Try multiple approaches to interact with the element
-                input_filled = False
-                
-                # Approach 1: Direct fill
-                try:
-                    print(f"Intentando llenar el campo directamente con: {search_value}")
-                    search_input.fill(search_value, timeout=10000)
-                    input_filled = True
-                    print("✓ Campo llenado exitosamente")
-                except Exception as e:
-                    print(f"✗ Fallo el llenado directo: {str(e)}")
-                
-                # Approach 2: Click then type
-                if not input_filled:
-                    try:
-                        print("Intentando click + type...")
-                        search_input.click(timeout=10000)
-                        time.sleep(0.3)  # Reducido de 0.5 a 0.3 segundos
-                        search_input.clear()
-                        search_input.type(search_value, delay=50)  # Reducido de 100 a 50ms
-                        input_filled = True
-                        print("✓ Campo llenado con click + type")
-                    except Exception as e:
-                        print(f"✗ Fallo click + type: {str(e)}")
-                
-                # Approach 3: JavaScript injection as last resort
-                if not input_filled:
-                    try:
-                        print("Intentando inyección JavaScript...")
-                        page.evaluate(f"""
-                            const input = document.querySelector('{search_field}');
-                            if (input) {{
-                                input.value = '{search_value}';
-                                input.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                                input.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                            }}
-                        """)
-                        input_filled = True
-                        print("✓ Campo llenado con JavaScript")
-                    except Exception as e:
-                        print(f"✗ Fallo JavaScript: {str(e)}")
-                        raise Exception(f"No se pudo llenar el campo de búsqueda después de múltiples intentos: {str(e)}")
-                
-                time.sleep(0.5)  # Reducido de 1 a 0.5 segundos
-                
-                # Wait for search button to be visible and click it
-                print("Haciendo click en buscar...")
-                page.wait_for_selector("#btnAceptar", state="visible")
-                page.click("#btnAceptar")
-                
-                # Wait for results with longer timeout
-                print("Esperando resultados...")
-                
-                # Para búsqueda por RUC, la página muestra directamente el resultado
-                if search_type == "ruc":
-                    try:
-                        print("🔍 Búsqueda por RUC - esperando resultado directo...")
-                        page.wait_for_selector(".panel.panel-primary", timeout=20000)
-                        time.sleep(1)
-                        
-                        html = page.content()
-                        result = parse_resultado(html)
-                        
-                        # Verificar si realmente hay datos
-                        if result and "error" not in result:
-                            print("✅ Resultado de RUC obtenido exitosamente")
-                            browser.close()
-                            return [result]
-                        else:
-                            print("❌ No se encontraron datos para el RUC")
-                            browser.close()
-                            return [{"error": "No se encontraron datos para el RUC especificado"}]
-                            
-                    except Exception as e:
-                        print(f"❌ Error al obtener resultado directo de RUC: {e}")
-                        browser.close()
-                        return [{"error": f"Error al obtener datos del RUC: {str(e)}"}]
-                
-                # Para búsquedas por nombre y documento, buscar enlaces
-                else:
+            # El pool solo sirve navegadores headless; el modo debug lanza uno propio.
+            # pool.run corta con TimeoutError si el navegador se traba (ver job_timeout)
+            pool = None if debug_mode else get_browser_pool()
+            if pool is not None:
+                results = pool.run(lambda context: _buscar_en_contexto(
+                    context, search_value, search_type, document_type, metadata, timer, recolectar_rucs, perfil
+                ))
+            else:
+                with sync_playwright() as p:
+                    with timer.step("lanzamiento_navegador"):
+                        browser = launch_browser(p, debug_mode)
+                    BROWSERS_ACTIVE.inc()
                     try:
-                        page.wait_for_selector(".aRucs", timeout=20000)
-                    except:
-                        # Try to check if there's a "no results" message
-                        no_results = page.query_selector_all("text=No se encontraron")
-                        if no_results:
-                            browser.close()
-                            return [{"error": "No se encontraron resultados para la búsqueda"}]
-                        raise
-
-                    links = page.query_selector_all("a.aRucs")
-                    print(f"Encontrados {len(links)} resultados")
-                    
-                    if not links:
+                        results = _buscar_en_contexto(
+                            new_context(browser), search_value, search_type, document_type, metadata, timer,
+                            recolectar_rucs, perfil
+                        )
+                    finally:
                         browser.close()
-                        return [{"error": "No se encontraron resultados para la búsqueda"}]
-                
-                for i in range(len(links)):
-                    try:
-                        print(f"Procesando resultado {i+1} de {len(links)}")
-                        # Add delay between requests - optimizado pero realista
-                        time.sleep(random.uniform(1, 2.5))  # Reducido de (2, 4) a (1, 2.5)
-                        
-                        # Vuelve a buscar cada vez (porque DOM cambia tras regresar)
-                        current_links = page.query_selector_all("a.aRucs")
-                        if i < len(current_links):
-                            # Scroll to the link to make sure it's visible
-                            current_links[i].scroll_into_view_if_needed()
-                            time.sleep(0.3)  # Reducido de 0.5 a 0.3 segundos
-                            
-                            print(f"Haciendo click en resultado {i+1}")
-                            current_links[i].click()
-                            
-                            # Wait for detail page to load
-                            print("Esperando que cargue la página de detalles...")
-                            page.wait_for_selector(".panel.panel-primary", timeout=15000)
-                            time.sleep(1)  # Reducido de 2 a 1 segundo
-
-                            html = page.content()
-                            result = parse_resultado(html)
-                            results.append(result)
-                            print(f"Datos extraídos para resultado {i+1}")
-
-                            # Regresar al listado
-                            print("Regresando al listado...")
-                            page.go_back()
-                            page.wait_for_selector(".aRucs", timeout=15000)
-                            time.sleep(0.5)  # Reducido de 1 a 0.5 segundos
-                        
-                    except Exception as e:
-                        print(f"Error procesando resultado {i+1}: {str(e)}")
-                        results.append({"error": f"Error al procesar resultado {i+1}: {str(e)}"})
-                        try:
-                            page.go_back()
-                            page.wait_for_selector(".aRucs", timeout=5000)
-                            time.sleep(0.5)  # Reducido de 1 a 0.5 segundos
-                        except:
-                            print("No se pudo regresar al listado, terminando...")
-                            break
-
-                print(f"Scraping completado. Total de resultados: {len(results)}")
-                browser.close()
-                return results
-                
-        except PlaywrightError as e:
-            error_msg = str(e)
-            if "ERR_CONNECTION_RESET" in error_msg or "net::" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 1.5 + random.uniform(0.5, 2)  # Reducido los tiempos
-                    print(f"Connection error, retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return [{"error": "Error de conexión: No se pudo conectar al sitio web de SUNAT. El servicio puede estar temporalmente no disponible."}]
-            else:
-                return [{"error": f"Error del navegador: {error_msg}"}]
+                        BROWSERS_ACTIVE.dec()
+            
+            registrar_en_circuito(breaker, results)
+            return results
                 
         except Exception as e:
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 1.5 + random.uniform(0.5, 2)  # Reducido los tiempos
-                print(f"Unexpected error, retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+            wait_time, error_result = manejar_error(e, attempt, max_retries)
+            if error_result is not None:
+                registrar_en_circuito(breaker, error_result, e)
+                return error_result
+            RETRIES_TOTAL.inc(search_type=search_type)
+            with timer.step("reintento"):
                 time.sleep(wait_time)
-                continue
-            else:
-                return [{"error": f"Error inesperado: {str(e)}"}]
     
+    breaker.release()
     return [{"error": "Se agotaron todos los intentos de conexión"}]
+
+
+def _consultar_detalles(rucs: list, metadata: dict, perfil=None) -> list:
+    """
+    Consulta en paralelo las páginas de detalle de los RUCs del listado.
+    Conserva el orden del listado y aísla los errores de cada resultado.
+    """
+    results = list(_iter_detalles(rucs, metadata, perfil=perfil))
+    print(f"Scraping completado. Total de resultados: {len(results)}")
+    return results
+
+
+def _iter_detalles(rucs: list, metadata: dict, timer: StepTimer = None, perfil=None):
+    """
+    Entrega el detalle de cada RUC del listado en orden, en cuanto está listo.
+    Las páginas de detalle se abren en paralelo con la sesión del navegador
+    que cargó el listado (rucs.sesion), sin pasar otra vez por el circuit
+    breaker, la caché ni el pool. Solo si una respuesta no se reconoce, ese
+    detalle se consulta en el navegador, de a uno (un único navegador del
+    pool por listado). Si el consumidor deja de iterar, las consultas que aún
+    no empezaron se cancelan.
+    """
+    fanout = min(detail_fanout(), len(rucs))
+    print(f"Consultando {len(rucs)} detalles en paralelo (máximo {fanout} a la vez)")
+    detalles = {"consultados": len(rucs), "concurrencia": fanout, "navegador": 0}
+    metadata["detalles"] = detalles
+    sesion = getattr(rucs, "sesion", None) or SesionListado()
+
+    def consultar(ruc):
+        tiempos = StepTimer()
+        try:
+            with perfil.cpu() if perfil is not None else nullcontext(), tiempos.step("http"):
+                return sesion.consultar_detalle(ruc)
+        except Exception as e:
+            print(f"✗ Fallo el detalle HTTP de {ruc}: {str(e)}")
+            return None
+        finally:
+            if perfil is not None:
+                perfil.registrar_consulta(ruc, "ruc", {"motor": "http", "tiempos": tiempos.as_dict()})
+
+    executor = _executor_detalles()
+    pendientes = deque()
+    siguientes = iter(rucs)
+    try:
+        for i in range(len(rucs)):
+            # Ventana de `fanout` detalles en vuelo por consulta
+            for ruc in siguientes:
+                pendientes.append((ruc, executor.submit(consultar, ruc)))
+                if len(pendientes) >= fanout:
+                    break
+            ruc, future = pendientes.popleft()
+            try:
+                with timer.step("detalles") if timer is not None else nullcontext():
+                    detalle = future.result()
+                    if detalle is None:
+                        detalles["navegador"] += 1
+                        detalle = _detalle_en_navegador(ruc, perfil)
+                    else:
+                        detalle = [detalle]
+                resultado = resultado_de_detalle(i, detalle)
+                if "error" not in resultado:
+                    print(f"Datos extraídos para resultado {i+1}")
+            except Exception as e:
+                print(f"Error procesando resultado {i+1}: {str(e)}")
+                resultado = resultado_de_detalle(i, e)
+            yield resultado
+    finally:
+        for _, future in pendientes:
+            future.cancel()
+
+
+def _detalle_en_navegador(ruc: str, perfil=None) -> list:
+    """
+    Respaldo de un detalle que no se pudo leer con la sesión del listado: un
+    solo intento de búsqueda por RUC en el navegador (del pool, o uno propio)
+    """
+    timer = StepTimer()
+    metadata = {"motor": "navegador"}
+    try:
+        pool = get_browser_pool()
+        if pool is not None:
+            return pool.run(lambda context: _buscar_en_contexto(context, ruc, "ruc", "1", metadata, timer, perfil=perfil))
+        with sync_playwright() as p:
+            browser = launch_browser(p)
+            BROWSERS_ACTIVE.inc()
+            try:
+                return _buscar_en_contexto(new_context(browser), ruc, "ruc", "1", metadata, timer, perfil=perfil)
+            finally:
+                browser.close()
+                BROWSERS_ACTIVE.dec()
+    finally:
+        if perfil is not None:
+            metadata["tiempos"] = timer.as_dict()
+            perfil.registrar_consulta(ruc, "ruc", metadata)
+
+
+_detalles_executor = None
+_detalles_lock = threading.Lock()
+
+
+def _executor_detalles() -> ThreadPoolExecutor:
+    """
+    Hilos compartidos por los detalles de todas las consultas; su tamaño
+    limita el total en vuelo a SUNAT_DETAIL_FANOUT por navegador del pool
+    (ver detail_fanout_total).
+    """
+    global _detalles_executor
+    with _detalles_lock:
+        if _detalles_executor is None:
+            pool = get_browser_pool()
+            total = detail_fanout_total(pool.size if pool is not None else pool_size())
+            _detalles_executor = ThreadPoolExecutor(max_workers=total, thread_name_prefix="sunat-detalle")
+        return _detalles_executor
+
+
+def html_panel(page) -> str:
+    """
+    HTML del panel de resultado (no la página completa); cadena vacía si no existe.
+    """
+    panel = page.query_selector(PANEL_SELECTOR)
+    return panel.evaluate(PANEL_OUTER_HTML) if panel else ""
+
+
+def recolectar_rucs(links) -> list:
+    """
+    Obtiene el RUC de cada enlace a.aRucs del listado (atributo data-ruc o
+    texto del enlace). Devuelve None si algún enlace no tiene RUC reconocible.
+    """
+    rucs = []
+    for link in links:
+        ruc = link.get_attribute("data-ruc")
+        if not ruc:
+            match = RUC_PATTERN.search(link.inner_text())
+            ruc = match.group(1) if match else None
+        if not ruc:
+            return None
+        rucs.append(ruc.strip())
+    return rucs
+
+
+def _buscar_en_contexto(context, search_value: str, search_type: str, document_type: str,
+                        metadata: dict = None, timer: StepTimer = None, recolectar: bool = False,
+                        perfil=None) -> list:
+    """
+    Ejecuta el flujo de búsqueda de SUNAT dentro de un BrowserContext ya creado.
+    Con perfil, la sesión del navegador queda grabada en una traza de Playwright.
+    """
+    timer = timer or StepTimer()
+    if perfil is not None:
+        perfil.iniciar_traza(context)
+    page = context.new_page()
+    PAGES_ACTIVE.inc()
+    blocker = ResourceBlocker().attach(page) if resource_blocking_enabled() else None
+    try:
+        # En el pool esto corre en el hilo del navegador: se perfila aparte
+        with perfil.cpu() if perfil is not None else nullcontext():
+            return _flujo_busqueda(page, search_value, search_type, document_type, timer, PacingPolicy(), recolectar)
+    finally:
+        PAGES_ACTIVE.dec()
+        if perfil is not None:
+            perfil.guardar_traza(context, search_value)
+        if blocker is not None:
+            stats = blocker.stats()
+            print(f"🧱 Recursos bloqueados: {stats['bloqueados']}, permitidos: {stats['permitidos']}")
+            if metadata is not None:
+                metadata["recursos"] = stats
+
+
+def _flujo_busqueda(page, search_value: str, search_type: str, document_type: str,
+                    timer: StepTimer, pacing: PacingPolicy, recolectar: bool = False) -> list:
+    results = []
+    # Turno compartido de peticiones a SUNAT (ver rate_limiter)
+    limiter = get_rate_limiter()
+
+    # Set reasonable timeout
+    page.set_default_timeout(PAGE_TIMEOUT_MS)
+
+    print(f"Navegando a SUNAT para buscar: {search_value} (tipo: {search_type})")
+
+    # El formulario está listo cuando el botón de búsqueda es visible
+    with limiter.request(timer), timer.step("navegacion"):
+        page.goto(SUNAT_SEARCH_URL, wait_until="domcontentloaded")
+        page.wait_for_selector("#btnAceptar", state="visible", timeout=30000)
+
+    with timer.step("formulario"):
+        # Handle different search types
+        if search_type == "nombre":
+            print("Configurando búsqueda por nombre/razón social...")
+            # Click on "Por Nomb./Raz.Soc." button to enable the search field
+            page.wait_for_selector("#btnPorRazonSocial", state="visible", timeout=30000)
+            page.click("#btnPorRazonSocial")
+            search_field = "#txtNombreRazonSocial"
+
+        elif search_type == "ruc":
+            print("🔍 Configurando búsqueda por RUC...")
+            search_field = "#txtRuc"
+
+        elif search_type == "documento":
+            print(f"Configurando búsqueda por documento (tipo: {document_type})...")
+            # Click on "Por Documento" button
+            page.wait_for_selector("#btnPorDocumento", state="visible", timeout=30000)
+            page.click("#btnPorDocumento")
+
+            # Select document type
+            page.wait_for_selector("#cmbTipoDoc", state="visible", timeout=30000)
+            page.select_option("#cmbTipoDoc", value=document_type)
+            search_field = "#txtNumeroDocumento"
+
+        else:
+            raise ValueError(f"Tipo de búsqueda no válido: {search_type}. Use 'nombre', 'ruc' o 'documento'")
+
+        # Wait for the search input to be visible and interactable
+        print("Esperando que el campo de búsqueda esté disponible...")
+        search_input = page.locator(search_field)
+        search_input.wait_for(state="visible", timeout=30000)
+
+        # Si hay capas modales visibles, esperar a que se oculten
+        try:
+            wait_overlays_hidden(page)
+        except Exception:
+            pass
+
+        # Scroll to the element to make sure it's in view
+        search_input.scroll_into_view_if_needed()
+
+        _llenar_campo(page, search_input, search_field, search_value)
+
+    # Enviar el formulario y esperar el resultado (respuesta del POST o página nueva)
+    print("Haciendo click en buscar...")
+    listo = RESULTADO_RUC if search_type == "ruc" else RESULTADO_LISTADO
+    try:
+        with limiter.request(timer), timer.step("envio"):
+            click_and_wait_response(page, "#btnAceptar", listo, timeout=ENVIO_TIMEOUT_MS, timer=timer)
+    except PlaywrightTimeoutError as e:
+        if search_type != "ruc":
+            raise
+        print(f"❌ Error al obtener resultado directo de RUC: {e}")
+        return [{"error": f"Error al obtener datos del RUC: {str(e)}"}]
+
+    print("Esperando resultados...")
+
+    # Para búsqueda por RUC, la página muestra directamente el resultado
+    if search_type == "ruc":
+        try:
+            print("🔍 Búsqueda por RUC - esperando resultado directo...")
+            with timer.step("espera_resultados"):
+                page.wait_for_selector(RESULTADO_RUC, timeout=20000)
+
+            with timer.step("contenido"):
+                html = html_panel(page)
+            result = parse_resultado(html, timer=timer)
+
+            # Verificar si realmente hay datos
+            if result and "error" not in result:
+                print("✅ Resultado de RUC obtenido exitosamente")
+                return [result]
+            else:
+                print("❌ No se encontraron datos para el RUC")
+                return [{"error": "No se encontraron datos para el RUC especificado"}]
+
+        except Exception as e:
+            print(f"❌ Error al obtener resultado directo de RUC: {e}")
+            return [{"error": f"Error al obtener datos del RUC: {str(e)}"}]
+
+    # Para búsquedas por nombre y documento, la página ya tiene el listado o el
+    # aviso de "sin resultados" (RESULTADO_LISTADO)
+    links = page.query_selector_all("a.aRucs")
+    print(f"Encontrados {len(links)} resultados")
+
+    if not links:
+        return [{"error": "No se encontraron resultados para la búsqueda"}]
+
+    # Con los RUCs del listado, los detalles se consultan en paralelo fuera de esta página
+    if recolectar:
+        rucs = recolectar_rucs(links)
+        if rucs:
+            formulario = page.evaluate(JS_FORMULARIO_DETALLE)
+            return ListadoRucs(rucs, sesion=SesionListado(formulario, page.context.cookies()))
+        print("No se pudo leer el RUC de todos los resultados, recorriendo el listado...")
+
+    for i in range(len(links)):
+        try:
+            print(f"Procesando resultado {i+1} de {len(links)}")
+            # Pausa explícita entre páginas de detalle
+            if i > 0:
+                with timer.step("pausa"):
+                    pacing.wait()
+
+            with timer.step("detalle"):
+                # Vuelve a buscar cada vez (porque DOM cambia tras regresar)
+                current_links = page.query_selector_all("a.aRucs")
+                if i < len(current_links):
+                    # Scroll to the link to make sure it's visible
+                    current_links[i].scroll_into_view_if_needed()
+
+                    print(f"Haciendo click en resultado {i+1}")
+                    print("Esperando que cargue la página de detalles...")
+                    with limiter.request(timer):
+                        click_and_wait_response(page, current_links[i], RESULTADO_RUC, timeout=ENVIO_TIMEOUT_MS,
+                                                timer=timer)
+
+                    html = html_panel(page)
+                    result = parse_resultado(html, timer=timer)
+                    results.append(result)
+                    print(f"Datos extraídos para resultado {i+1}")
+
+                    # Regresar al listado
+                    print("Regresando al listado...")
+                    page.go_back(wait_until="domcontentloaded")
+                    page.wait_for_selector(".aRucs", timeout=15000)
+
+        except Exception as e:
+            print(f"Error procesando resultado {i+1}: {str(e)}")
+            results.append({"error": f"Error al procesar resultado {i+1}: {str(e)}"})
+            try:
+                page.go_back(wait_until="domcontentloaded")
+                page.wait_for_selector(".aRucs", timeout=5000)
+            except:
+                print("No se pudo regresar al listado, terminando...")
+                break
+
+    print(f"Scraping completado. Total de resultados: {len(results)}")
+    return results
+
+
+def _llenar_campo(page, search_input, search_field: str, search_value: str):
+    """
+    Llena el campo de búsqueda probando varias estrategias.
+    """
+    # Try multiple approaches to interact with the element
+    input_filled = False
+
+    # Approach 1: Direct fill
+    try:
+        print(f"Intentando llenar el campo directamente con: {search_value}")
+        search_input.fill(search_value, timeout=10000)
+        input_filled = True
+        print("✓ Campo llenado exitosamente")
+    except Exception as e:
+        print(f"✗ Fallo el llenado directo: {str(e)}")
+
+    # Approach 2: Click then type
+    if not input_filled:
+        try:
+            print("Intentando click + type...")
+            search_input.click(timeout=10000)
+            search_input.clear()
+            search_input.type(search_value, delay=50)  # Reducido de 100 a 50ms
+            input_filled = True
+            print("✓ Campo llenado con click + type")
+        except Exception as e:
+            print(f"✗ Fallo click + type: {str(e)}")
+
+    # Approach 3: JavaScript injection as last resort
+    if not input_filled:
+        try:
+            print("Intentando inyección JavaScript...")
+            page.evaluate(JS_LLENAR_CAMPO, [search_field, search_value])
+            input_filled = True
+            print("✓ Campo llenado con JavaScript")
+        except Exception as e:
+            print(f"✗ Fallo JavaScript: {str(e)}")
+            raise Exception(f"No se pudo llenar el campo de búsqueda después de múltiples intentos: {str(e)}")
@@ -0,0 +1,155 @@
+import os
+import random
+import re
+from playwright._impl._errors import Error as PlaywrightError
+from .http_scraper import SUNAT_BASE_URL
+from .rate_limiter import es_error_de_conexion
+
+# Piezas del flujo de búsqueda compartidas por el motor sync (scraper.py) y el
+# async (async_scraper.py): URLs, reintentos, circuit breaker, clasificación de
+# resultados y armado de los resultados de detalle.
+
+SUNAT_SEARCH_URL = f"{SUNAT_BASE_URL}/FrameCriterioBusquedaWeb.jsp"
+
+RUC_PATTERN = re.compile(r"\b(\d{11})\b")
+
+MAX_RETRIES = 3
+
+# Selectores que indican que el resultado de un envío ya está en la página:
+# el panel del contribuyente (RUC o detalle) y el listado o su aviso de
+# "sin resultados" (nombre o documento)
+RESULTADO_RUC = ".panel.panel-primary"
+RESULTADO_LISTADO = "a.aRucs, body:has-text('No se encontraron')"
+
+# Plazo único para el click de envío: respuesta del POST más carga del resultado
+ENVIO_TIMEOUT_MS = 30000
+
+# Último recurso para llenar el campo de búsqueda: asigna el valor y dispara
+# los eventos que escucha el formulario. Recibe [selector, valor].
+JS_LLENAR_CAMPO = """([selector, valor]) => {
+    const input = document.querySelector(selector);
+    if (!input) return false;
+    input.value = valor;
+    input.dispatchEvent(new Event('input', { bubbles: true }));
+    input.dispatchEvent(new Event('change', { bubbles: true }));
+    return true;
+}"""
+
+
+# Formulario con el que cada enlace a.aRucs del listado abre su detalle
+# (selecXNroRuc): action absoluto y campos, para repetir el POST fuera de la página
+JS_FORMULARIO_DETALLE = """() => {
+    const form = document.forms.selecXNroRuc;
+    if (!form) return null;
+    const fields = {};
+    for (const el of form.elements) {
+        if (el.name) fields[el.name] = el.value;
+    }
+    return {url: form.action, fields: fields, referer: location.href};
+}"""
+
+
+class ListadoRucs(list):
+    """
+    RUCs recolectados del listado de resultados (búsqueda por nombre o
+    documento). Sus páginas de detalle se consultan después en paralelo,
+    fuera del navegador que cargó el listado, con la sesión de ese navegador
+    (sesion, un SesionListado de http_scraper).
+    """
+
+    def __init__(self, rucs=(), sesion=None):
+        super().__init__(rucs)
+        self.sesion = sesion
+
+
+def detail_fanout() -> int:
+    return max(1, int(os.getenv('SUNAT_DETAIL_FANOUT', '4')))
+
+
+def detail_fanout_total(pool_size: int) -> int:
+    """
+    Páginas de detalle en vuelo entre todas las consultas a la vez:
+    SUNAT_DETAIL_FANOUT por cada navegador del pool (los listados que
+    pueden estar abiertos en paralelo)
+    """
+    return detail_fanout() * max(1, pool_size)
+
+
+def debug_activo(debug_mode: bool) -> bool:
+    """
+    Modo debug (navegador visible) pedido en la consulta o con SUNAT_DEBUG
+    """
+    return debug_mode or os.getenv('SUNAT_DEBUG', 'false').lower() == 'true'
+
+
+def clasificar_resultado(results: list) -> str:
+    """
+    Resultado de una consulta para las métricas: ok, no_encontrado,
+    error_conexion, circuito_abierto o error
+    """
+    error_msg = results[0].get("error") if results and isinstance(results[0], dict) else None
+    if error_msg is None:
+        return "ok"
+    if "No se encontraron" in error_msg:
+        return "no_encontrado"
+    if "circuito abierto" in error_msg:
+        return "circuito_abierto"
+    if error_msg.startswith("Error de conexión") or error_msg.startswith("Se agotaron"):
+        return "error_conexion"
+    return "error"
+
+
+def registrar_en_circuito(breaker, results: list, error: Exception = None):
+    """
+    Informa al circuit breaker cómo terminó una consulta: los errores de
+    conexión cuentan como fallo; una respuesta de SUNAT (con datos o "No se
+    encontraron") como éxito; cualquier otro error no cuenta.
+    """
+    if error is not None and es_error_de_conexion(error):
+        breaker.record_failure(results[0]["error"] if results else str(error))
+        return
+    error_msg = results[0].get("error") if results and isinstance(results[0], dict) else None
+    if error is None and (error_msg is None or "No se encontraron" in error_msg):
+        breaker.record_success()
+    else:
+        breaker.release()
+
+
+def manejar_error(e: Exception, attempt: int, max_retries: int = MAX_RETRIES):
+    """
+    Clasifica un error de un intento de scraping.
+
+    Returns:
+        (segundos de espera, None) si se debe reintentar, o (None, lista de error) si no
+    """
+    if isinstance(e, PlaywrightError):
+        error_msg = str(e)
+        if "ERR_CONNECTION_RESET" in error_msg or "net::" in error_msg:
+            if attempt < max_retries - 1:
+                wait_time = (attempt + 1) * 1.5 + random.uniform(0.5, 2)  # Reducido los tiempos
+                print(f"Connection error, retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+                return wait_time, None
+            return None, [{"error": "Error de conexión: No se pudo conectar al sitio web de SUNAT. El servicio puede estar temporalmente no disponible."}]
+        return None, [{"error": f"Error del navegador: {error_msg}"}]
+
+    if attempt < max_retries - 1:
+        wait_time = (attempt + 1) * 1.5 + random.uniform(0.5, 2)  # Reducido los tiempos
+        print(f"Unexpected error, retrying in {wait_time:.1f} seconds... (attempt {attempt + 1}/{max_retries})")
+        return wait_time, None
+    return None, [{"error": f"Error inesperado: {str(e)}"}]
+
+
+def resultado_de_detalle(i: int, detalle) -> dict:
+    """
+    Resultado i (desde 0) de un listado a partir de la consulta de su detalle:
+    el registro, o un error que indica la posición en el listado.
+
+    Args:
+        detalle: Lista devuelta por la consulta del detalle, o la excepción que lanzó
+    """
+    if isinstance(detalle, Exception):
+        return {"error": f"Error al procesar resultado {i+1}: {str(detalle)}"}
+    if detalle and isinstance(detalle[0], dict) and "error" not in detalle[0]:
+        return detalle[0]
+    error_msg = detalle[0]["error"] if detalle else "sin datos"
+    return {"error": f"Error al procesar resultado {i+1}: {error_msg}"}
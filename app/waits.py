@@ -0,0 +1,241 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from playwright._impl._errors import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+from .metrics import SCRAPE_PHASE_SECONDS
+
+# Selectores de capas que pueden tapar el formulario
+OVERLAY_SELECTOR = "[class*='modal'], [class*='overlay'], [class*='loading'], [class*='popup']"
+
+# Cada cuánto se revisa la página mientras se espera el resultado de un click
+CLICK_POLL_MS = 50
+
+
+def is_search_post(response) -> bool:
+    """
+    Respuesta del POST del formulario de búsqueda (jcrS00Alias)
+    """
+    return "jcrS00Alias" in response.url and response.request.method == "POST"
+
+
+class StepTimer:
+    """
+    Registra la duración de cada paso del flujo de scraping. Los pasos
+    repetidos (por ejemplo, cada página de detalle) se acumulan; en el
+    histograma de /metrics cuenta cada vez por separado.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.avisos = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        SCRAPE_PHASE_SECONDS.observe(seconds, phase=name)
+
+    def note(self, name: str):
+        """
+        Cuenta un evento del flujo que no es un paso (p. ej. una respuesta de
+        red que no se detectó); se informa en metadata["avisos"].
+        """
+        self.avisos[name] = self.avisos.get(name, 0) + 1
+
+    def as_dict(self) -> dict:
+        tiempos = {name: round(seconds, 3) for name, seconds in self.durations.items()}
+        tiempos["total"] = round(time.perf_counter() - self._start, 3)
+        return tiempos
+
+
+class PacingPolicy:
+    """
+    Pausa explícita entre peticiones consecutivas a SUNAT dentro de una misma
+    consulta (por ejemplo, entre páginas de detalle). Es la única espera fija
+    del flujo; todo lo demás espera condiciones concretas de la página.
+
+    Args:
+        min_delay: Segundos mínimos (MIN_DELAY, por defecto 1.0)
+        max_delay: Segundos máximos (MAX_DELAY, por defecto 2.5)
+    """
+
+    def __init__(self, min_delay: float = None, max_delay: float = None):
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv('MIN_DELAY', '1.0'))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv('MAX_DELAY', '2.5'))
+
+    def delay(self) -> float:
+        if self.max_delay <= 0:
+            return 0.0
+        return random.uniform(self.min_delay, max(self.min_delay, self.max_delay))
+
+    def wait(self) -> float:
+        seconds = self.delay()
+        if seconds > 0:
+            time.sleep(seconds)
+        return seconds
+
+    async def wait_async(self) -> float:
+        seconds = self.delay()
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+        return seconds
+
+
+def wait_overlays_hidden(page, timeout: float = 5000):
+    """
+    Espera a que se oculten las capas modales visibles en vez de dormir un tiempo fijo.
+    """
+    for overlay in page.query_selector_all(OVERLAY_SELECTOR):
+        try:
+            if overlay.is_visible():
+                overlay.wait_for_element_state("hidden", timeout=timeout)
+        except PlaywrightTimeoutError:
+            print("⚠️ Una capa modal sigue visible, continuando...")
+
+
+async def wait_overlays_hidden_async(page, timeout: float = 5000):
+    for overlay in await page.query_selector_all(OVERLAY_SELECTOR):
+        try:
+            if await overlay.is_visible():
+                await overlay.wait_for_element_state("hidden", timeout=timeout)
+        except PlaywrightTimeoutError:
+            print("⚠️ Una capa modal sigue visible, continuando...")
+
+
+class _CarreraClick:
+    """
+    Escucha, mientras dura un click, la respuesta de red esperada y la
+    navegación del frame principal (el documento nuevo que trae el resultado).
+    """
+
+    def __init__(self, page, predicate):
+        self.page = page
+        self.predicate = predicate
+        self.respuesta = False
+        self.navegado = False
+
+    def _on_response(self, response):
+        try:
+            if self.predicate(response):
+                self.respuesta = True
+        except Exception:
+            pass
+
+    def _on_navegacion(self, frame):
+        if frame == self.page.main_frame:
+            self.navegado = True
+
+    def __enter__(self):
+        self.page.on("response", self._on_response)
+        self.page.on("framenavigated", self._on_navegacion)
+        return self
+
+    def __exit__(self, *exc):
+        self.page.remove_listener("response", self._on_response)
+        self.page.remove_listener("framenavigated", self._on_navegacion)
+
+    def listo(self, ready_selector: str = None) -> bool:
+        """
+        Sin selector basta la respuesta. Con selector, el resultado tiene que
+        estar en la página después de la respuesta o de una navegación (no en
+        el documento anterior al click).
+        """
+        if ready_selector is None:
+            return self.respuesta
+        return (self.respuesta or self.navegado) and self._hay(ready_selector)
+
+    def _hay(self, ready_selector: str) -> bool:
+        try:
+            return self.page.query_selector(ready_selector) is not None
+        except PlaywrightError:
+            # El documento se está reemplazando; se revisa en la próxima vuelta
+            return False
+
+    async def listo_async(self, ready_selector: str = None) -> bool:
+        if ready_selector is None:
+            return self.respuesta
+        if not (self.respuesta or self.navegado):
+            return False
+        try:
+            return await self.page.query_selector(ready_selector) is not None
+        except PlaywrightError:
+            return False
+
+    def registrar(self, listo: bool, timer, ready_selector: str, timeout: float):
+        """
+        Anota en el timer cómo terminó la espera; sin resultado a tiempo lanza
+        TimeoutError de Playwright.
+        """
+        if listo:
+            if not self.respuesta and timer is not None:
+                timer.note("respuesta_no_detectada")
+            return
+        if timer is not None:
+            timer.note("sin_resultado")
+        esperado = ready_selector or "la respuesta del formulario"
+        raise PlaywrightTimeoutError(f"Timeout {timeout:.0f}ms esperando {esperado} después del click")
+
+
+def _esperar_carrera(carrera, ready_selector, timeout: float):
+    deadline = time.monotonic() + timeout / 1000
+    while True:
+        if carrera.listo(ready_selector):
+            return True
+        restante_ms = (deadline - time.monotonic()) * 1000
+        if restante_ms <= 0:
+            return False
+        # wait_for_timeout deja correr los eventos de Playwright (response, framenavigated)
+        carrera.page.wait_for_timeout(min(CLICK_POLL_MS, restante_ms))
+
+
+async def _esperar_carrera_async(carrera, ready_selector, timeout: float):
+    deadline = time.monotonic() + timeout / 1000
+    while True:
+        if await carrera.listo_async(ready_selector):
+            return True
+        restante = deadline - time.monotonic()
+        if restante <= 0:
+            return False
+        await asyncio.sleep(min(CLICK_POLL_MS / 1000, restante))
+
+
+def click_and_wait_response(page, target, ready_selector: str = None, predicate=is_search_post,
+                            timeout: float = 20000, timer: StepTimer = None):
+    """
+    Hace click (selector o ElementHandle) y espera, con un único plazo, a que
+    el resultado esté en la página: lo que llegue primero entre la respuesta
+    de red que dispara el click y la navegación a un documento con
+    ready_selector. Si la respuesta no coincide con el predicado (p. ej. la
+    página cambió su forma de enviar el formulario), basta con el selector y
+    la falta queda en timer.avisos["respuesta_no_detectada"].
+
+    Raises:
+        TimeoutError de Playwright si el resultado no aparece en el plazo
+    """
+    with _CarreraClick(page, predicate) as carrera:
+        if isinstance(target, str):
+            page.click(target)
+        else:
+            target.click()
+        listo = _esperar_carrera(carrera, ready_selector, timeout)
+    carrera.registrar(listo, timer, ready_selector, timeout)
+
+
+async def click_and_wait_response_async(page, target, ready_selector: str = None, predicate=is_search_post,
+                                        timeout: float = 20000, timer: StepTimer = None):
+    with _CarreraClick(page, predicate) as carrera:
+        if isinstance(target, str):
+            await page.click(target)
+        else:
+            await target.click()
+        listo = await _esperar_carrera_async(carrera, ready_selector, timeout)
+    carrera.registrar(listo, timer, ready_selector, timeout)
@@ -0,0 +1,58 @@
+import time
+from bs4 import BeautifulSoup
+from app.parser import extract_raw_fields, PARSER_ENGINES, PANEL_SELECTOR
+from app.data_formatter import format_record
+from app.batch_formatter import format_frame, raw_rows
+from . import paginas
+
+# Microbenchmarks del parser y del formateador, sobre páginas generadas con el
+# mismo marcado que la vista de resultado de SUNAT (sin red ni navegador).
+
+
+def medir(funcion, iteraciones: int) -> list:
+    """
+    Ejecuta funcion() iteraciones veces y devuelve la duración de cada llamada
+    """
+    latencias = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion()
+        latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def micro_parser(iteraciones: int) -> dict:
+    """
+    extract_raw_fields con cada motor, sobre la página completa y sobre el
+    fragmento del panel (lo que lee el scraper)
+
+    Returns:
+        {nombre: (latencias, operaciones por llamada)}
+    """
+    pagina = paginas.vista_ruc("20100070970")
+    panel = str(BeautifulSoup(pagina, "lxml").select_one(PANEL_SELECTOR))
+    mediciones = {}
+    for engine in PARSER_ENGINES:
+        mediciones[f"parser_{engine}_pagina"] = (medir(lambda: extract_raw_fields(pagina, engine), iteraciones), 1)
+        mediciones[f"parser_{engine}_panel"] = (medir(lambda: extract_raw_fields(panel, engine), iteraciones), 1)
+    return mediciones
+
+
+def micro_formateador(iteraciones: int, registros_lote: int = 1000) -> dict:
+    """
+    format_record registro por registro y format_frame sobre un lote de
+    registros_lote registros distintos
+
+    Returns:
+        {nombre: (latencias, operaciones por llamada)}
+    """
+    registros = [extract_raw_fields(paginas.vista_ruc(ruc), "lxml")
+                 for ruc in paginas.rucs_para("micro-formateador", registros_lote)]
+    registro = registros[0]
+    lote = raw_rows(registros)
+    # El lote es mucho más pesado que un registro: menos repeticiones
+    repeticiones_lote = max(3, iteraciones // 100)
+    return {
+        "formateo_registro": (medir(lambda: format_record(registro), iteraciones), 1),
+        "formateo_lote": (medir(lambda: format_frame(lote), repeticiones_lote), registros_lote),
+    }
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import random
+from html import escape
+from app.preflight import digito_verificador_ruc
+
+# Páginas que imitan el sitio de consulta RUC de SUNAT, con el marcado que usa
+# el scraper: formulario de búsqueda (#btnAceptar, #txtRuc, #btnPorRazonSocial,
+# #btnPorDocumento, #cmbTipoDoc), vista directa del RUC (.panel.panel-primary
+# con "Resultado de la Búsqueda") y listado de resultados (a.aRucs con data-ruc).
+# Los datos de cada empresa se generan a partir del RUC, siempre iguales.
+#
+# Se pueden reemplazar por páginas guardadas del sitio real (ver cargar_guardadas).
+
+PAGINAS_GUARDADAS = ("formulario", "ruc", "listado", "sin_resultados")
+
+RAZONES_SOCIALES = (
+    "SUPERMERCADOS PERUANOS", "CORPORACION ANDINA DEL SUR", "INVERSIONES SAN MARTIN",
+    "TRANSPORTES LOS ANDES", "DISTRIBUIDORA PACIFICO", "CONSTRUCTORA MIRAFLORES",
+    "SERVICIOS GENERALES AREQUIPA", "COMERCIAL TRUJILLO", "AGROINDUSTRIAS DEL NORTE",
+    "LABORATORIOS CUSCO",
+)
+FORMAS = (("SOCIEDAD ANONIMA CERRADA", "S.A.C."), ("SOCIEDAD ANONIMA", "S.A."),
+          ("EMPRESA INDIVIDUAL DE RESP. LTDA", "E.I.R.L."), ("SOC.COM.RESPONS. LTDA", "S.R.L."))
+ACTIVIDADES = (
+    "4711 - VENTA AL POR MENOR EN COMERCIOS NO ESPECIALIZADOS",
+    "4923 - TRANSPORTE DE CARGA POR CARRETERA",
+    "4100 - CONSTRUCCIÓN DE EDIFICIOS",
+    "6201 - PROGRAMACIÓN INFORMÁTICA",
+    "5610 - ACTIVIDADES DE RESTAURANTES Y DE SERVICIO MÓVIL DE COMIDAS",
+)
+DISTRITOS = ("LIMA - LIMA - MIRAFLORES", "LIMA - LIMA - SAN ISIDRO", "AREQUIPA - AREQUIPA - YANAHUARA",
+             "LA LIBERTAD - TRUJILLO - TRUJILLO", "CUSCO - CUSCO - WANCHAQ")
+
+FORMULARIO = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta RUC</title></head><body>
+<form name="mainForm" id="mainForm" method="post" action="jcrS00Alias">
+<input type="hidden" name="accion" value="consPorRuc">
+<input type="hidden" name="contexto" value="ti-it">
+<input type="hidden" name="modo" value="1">
+<input type="hidden" name="nroRuc" value="">
+<input type="hidden" name="razSoc" value="">
+<input type="hidden" name="nrodoc" value="">
+<input type="hidden" name="token" value="">
+<div class="btn-group">
+ <button type="button" id="btnPorRuc" class="btn btn-default">Por RUC</button>
+ <button type="button" id="btnPorDocumento" class="btn btn-default">Por Documento</button>
+ <button type="button" id="btnPorRazonSocial" class="btn btn-default">Por Nombre/Razón Social</button>
+</div>
+<input type="text" id="txtRuc" name="search1" maxlength="11" value="">
+<select id="cmbTipoDoc" name="tipdoc" style="display:none">
+ <option value="1">DOCUMENTO NACIONAL DE IDENTIDAD</option>
+ <option value="4">CARNET DE EXTRANJERIA</option>
+ <option value="7">PASAPORTE</option>
+ <option value="A">CED. DIPLOMATICA DE IDENTIDAD</option>
+</select>
+<input type="text" id="txtNumeroDocumento" name="search2" style="display:none" value="">
+<input type="text" id="txtNombreRazonSocial" name="search3" style="display:none" value="">
+<button type="button" id="btnAceptar" class="btn btn-primary">Buscar</button>
+</form>
+<script>
+var f = document.getElementById("mainForm");
+function mostrar(accion, visibles) {
+  f.accion.value = accion;
+  ["txtRuc", "cmbTipoDoc", "txtNumeroDocumento", "txtNombreRazonSocial"].forEach(function (id) {
+    document.getElementById(id).style.display = visibles.indexOf(id) >= 0 ? "" : "none";
+  });
+}
+document.getElementById("btnPorRuc").onclick = function () { mostrar("consPorRuc", ["txtRuc"]); };
+document.getElementById("btnPorDocumento").onclick = function () { mostrar("consPorTipdoc", ["cmbTipoDoc", "txtNumeroDocumento"]); };
+document.getElementById("btnPorRazonSocial").onclick = function () { mostrar("consPorRazonSoc", ["txtNombreRazonSocial"]); };
+document.getElementById("btnAceptar").onclick = function () {
+  f.nroRuc.value = document.getElementById("txtRuc").value;
+  f.nrodoc.value = document.getElementById("txtNumeroDocumento").value;
+  f.razSoc.value = document.getElementById("txtNombreRazonSocial").value;
+  f.token.value = Math.random().toString(36).slice(2);
+  f.submit();
+};
+</script>
+</body></html>
+"""
+
+ITEM_VISTA_RUC = """  <div class="list-group-item"><div class="row">
+   <div class="col-sm-5"><h4 class="list-group-item-heading">{label}:</h4></div>
+   <div class="col-sm-7">{valor}</div>
+  </div></div>
+"""
+
+ITEM_LISTADO = """ <a href="#" class="list-group-item clearfix aRucs" data-ruc="{ruc}">
+  <h4 class="list-group-item-heading">RUC: {ruc}</h4>
+  <h4 class="list-group-item-heading">{razon_social}</h4>
+  <p class="list-group-item-text">Ubicación: {ubicacion}</p>
+  <p class="list-group-item-text">Estado: <strong><span class="text-success">{estado}</span></strong></p>
+ </a>
+"""
+
+LISTADO = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta RUC</title></head><body>
+<div class="panel panel-default">
+ <div class="panel-heading">Relación de contribuyentes</div>
+ <div class="list-group">
+{items} </div>
+</div>
+<form name="selecXNroRuc" method="post" action="jcrS00Alias">
+<input type="hidden" name="accion" value="consPorRuc">
+<input type="hidden" name="actReturn" value="1">
+<input type="hidden" name="nroRuc" value="">
+</form>
+<script>
+Array.prototype.forEach.call(document.querySelectorAll("a.aRucs"), function (a) {
+  a.onclick = function (e) {
+    e.preventDefault();
+    var f = document.forms.selecXNroRuc;
+    f.nroRuc.value = a.getAttribute("data-ruc");
+    f.submit();
+  };
+});
+</script>
+</body></html>
+"""
+
+SIN_RESULTADOS = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Consulta RUC</title></head><body>
+<div class="panel panel-primary">
+ <div class="panel-heading">Resultado de la Búsqueda</div>
+ <div class="list-group">
+  <div class="list-group-item"><p class="list-group-item-text">No se encontraron resultados para la búsqueda realizada.</p></div>
+ </div>
+</div>
+</body></html>
+"""
+
+_guardadas = {}
+
+
+def cargar_guardadas(directorio: str) -> list:
+    """
+    Usa páginas guardadas del sitio real en lugar de las generadas. Se leen
+    formulario.html, ruc.html, listado.html y sin_resultados.html (las que
+    existan). En ruc.html y listado.html se reemplazan {{ruc}} y
+    {{razon_social}} por los de la consulta, si la página los tiene.
+
+    Returns:
+        Nombres de las páginas cargadas
+    """
+    cargadas = []
+    for nombre in PAGINAS_GUARDADAS:
+        ruta = os.path.join(directorio, f"{nombre}.html")
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                _guardadas[nombre] = f.read()
+            cargadas.append(nombre)
+    return cargadas
+
+
+def _reemplazar(html: str, ruc: str) -> str:
+    empresa = datos_empresa(ruc)
+    return html.replace("{{ruc}}", ruc).replace("{{razon_social}}", empresa["razon_social"])
+
+
+def ruc_valido(ruc: str) -> bool:
+    return len(ruc) == 11 and ruc.isdigit() and int(ruc[10]) == digito_verificador_ruc(ruc)
+
+
+def _azar(semilla: str) -> random.Random:
+    return random.Random(hashlib.sha1(semilla.encode("utf-8")).hexdigest())
+
+
+def rucs_para(valor: str, cantidad: int) -> list:
+    """
+    RUCs (con dígito verificador válido) del listado de una búsqueda por
+    nombre o documento; siempre los mismos para el mismo valor.
+    """
+    azar = _azar(valor.upper())
+    rucs = []
+    for _ in range(cantidad):
+        base = azar.choice(("10", "20")) + "".join(str(azar.randint(0, 9)) for _ in range(8))
+        rucs.append(base + str(digito_verificador_ruc(base)))
+    return rucs
+
+
+def datos_empresa(ruc: str) -> dict:
+    azar = _azar(ruc)
+    nombre = azar.choice(RAZONES_SOCIALES)
+    forma, sigla = azar.choice(FORMAS)
+    inscripcion = f"{azar.randint(1, 28):02d}/{azar.randint(1, 12):02d}/{azar.randint(1990, 2020)}"
+    return {
+        "razon_social": f"{nombre} {sigla}",
+        "tipo_contribuyente": forma,
+        "fecha_inscripcion": inscripcion,
+        "estado": azar.choice(("ACTIVO", "ACTIVO", "ACTIVO", "BAJA DE OFICIO")),
+        "condicion": azar.choice(("HABIDO", "HABIDO", "NO HABIDO")),
+        "domicilio": f"AV. {azar.choice(('AREQUIPA', 'LARCO', 'JAVIER PRADO', 'ESPAÑA'))} "
+                     f"NRO. {azar.randint(100, 4999)} {azar.choice(DISTRITOS)}",
+        "ubicacion": azar.choice(DISTRITOS).split(" - ")[0],
+        "actividad": azar.choice(ACTIVIDADES),
+        "emisor_desde": f"{azar.randint(1, 28):02d}/{azar.randint(1, 12):02d}/{azar.randint(2014, 2023)}",
+    }
+
+
+def formulario() -> str:
+    return _guardadas.get("formulario", FORMULARIO)
+
+
+def vista_ruc(ruc: str) -> str:
+    """
+    Vista directa del resultado de un RUC (la que también muestra cada página de detalle)
+    """
+    if "ruc" in _guardadas:
+        return _reemplazar(_guardadas["ruc"], ruc)
+
+    empresa = datos_empresa(ruc)
+    texto = '<p class="list-group-item-text">{}</p>'.format
+    tabla = lambda filas: ('<table class="table tblResultado"><tbody>'
+                           + "".join(f"<tr><td>{escape(fila)}</td></tr>" for fila in filas)
+                           + "</tbody></table>")
+    campos = [
+        ("Número de RUC", f'<h4 class="list-group-item-heading">{ruc} - {escape(empresa["razon_social"])}</h4>'),
+        ("Tipo Contribuyente", texto(escape(empresa["tipo_contribuyente"]))),
+        ("Nombre Comercial", texto("-")),
+        ("Fecha de Inscripción", texto(empresa["fecha_inscripcion"])),
+        ("Estado del Contribuyente", texto(empresa["estado"])),
+        ("Condición del Contribuyente", texto(empresa["condicion"])),
+        ("Domicilio Fiscal", texto(escape(empresa["domicilio"]))),
+        ("Sistema Emisión de Comprobante", texto("MANUAL/COMPUTARIZADO")),
+        ("Sistema Contabilidad", texto("COMPUTARIZADO")),
+        ("Actividad(es) Económica(s)", tabla([f"Principal - {empresa['actividad']}"])),
+        ("Sistema de Emisión Electrónica", tabla([f"FACTURA PORTAL DESDE {empresa['emisor_desde']}"])),
+        ("Emisor electrónico desde", texto(empresa["emisor_desde"])),
+        ("Comprobantes Electrónicos", texto(f"FACTURA (desde {empresa['emisor_desde']})")),
+        ("Afiliado al PLE desde", texto("-")),
+        ("Padrones", tabla(["NINGUNO"])),
+    ]
+    items = "".join(ITEM_VISTA_RUC.format(label=label, valor=valor) for label, valor in campos)
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Consulta RUC</title></head><body>\n'
+            '<div class="panel panel-primary">\n <div class="panel-heading">Resultado de la Búsqueda</div>\n'
+            f' <div class="list-group">\n{items} </div>\n</div>\n</body></html>\n')
+
+
+def listado(rucs: list) -> str:
+    """
+    Listado de resultados de una búsqueda por nombre o documento
+    """
+    if "listado" in _guardadas:
+        return _reemplazar(_guardadas["listado"], rucs[0]) if rucs else _guardadas["listado"]
+
+    items = []
+    for ruc in rucs:
+        empresa = datos_empresa(ruc)
+        items.append(ITEM_LISTADO.format(ruc=ruc, razon_social=escape(empresa["razon_social"]),
+                                         ubicacion=empresa["ubicacion"], estado=empresa["estado"]))
+    # replace y no format: la plantilla tiene llaves del script
+    return LISTADO.replace("{items}", "".join(items))
+
+
+def sin_resultados() -> str:
+    return _guardadas.get("sin_resultados", SIN_RESULTADOS)
@@ -0,0 +1,309 @@
+"""
+Benchmark de punta a punta contra el servidor local de SUNAT (o la URL que se
+indique), más microbenchmarks del parser y del formateador.
+
+Flujos:
+    micro       extract_raw_fields (lxml y bs4), format_record y format_frame
+    individual  scrape_sunat por RUC, una consulta a la vez
+    lote        RUCs con el motor async, varias consultas a la vez (como las consultas masivas)
+    nombre      scrape_sunat por nombre: listado + páginas de detalle en paralelo
+
+De cada flujo se informa throughput y latencias p50/p95/p99; el resultado se
+guarda en JSON (data/benchmarks/) para comparar corridas.
+
+Uso:
+    python -m benchmarks.run
+    python -m benchmarks.run --flujos individual,lote --lote 200 --latencia 0.3 --tasa-errores 0.05
+    python -m benchmarks.run --comparar data/benchmarks/benchmark_20250131_120000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from . import paginas
+from .servidor import agregar_argumentos, configuracion_desde, iniciar_servidor
+
+FLUJOS = ("micro", "individual", "lote", "nombre")
+
+
+def resumen(latencias: list, duracion: float = None, operaciones_por_llamada: int = 1, errores: int = 0) -> dict:
+    """
+    Throughput y percentiles de latencia (en segundos) de una serie de llamadas
+    """
+    duracion = duracion if duracion is not None else sum(latencias)
+    operaciones = len(latencias) * operaciones_por_llamada
+    datos = {
+        "operaciones": operaciones,
+        "errores": errores,
+        "duracion_s": round(duracion, 4),
+        "throughput_por_s": round(operaciones / duracion, 2) if duracion > 0 else None,
+    }
+    if latencias:
+        # quantiles necesita al menos dos valores
+        cortes = statistics.quantiles(latencias, n=100, method="inclusive") if len(latencias) > 1 else latencias * 99
+        datos["latencia_s"] = {
+            "p50": round(cortes[49], 6),
+            "p95": round(cortes[94], 6),
+            "p99": round(cortes[98], 6),
+            "media": round(statistics.fmean(latencias), 6),
+            "max": round(max(latencias), 6),
+        }
+    return datos
+
+
+def _es_error(resultados: list) -> bool:
+    return not resultados or (isinstance(resultados[0], dict) and "error" in resultados[0])
+
+
+def _primeros_errores(errores: list, maximo: int = 3) -> list:
+    return list(dict.fromkeys(errores))[:maximo]
+
+
+def flujo_micro(args) -> dict:
+    from .micro import micro_parser, micro_formateador
+
+    mediciones = {**micro_parser(args.iteraciones), **micro_formateador(args.iteraciones)}
+    return {nombre: resumen(latencias, operaciones_por_llamada=por_llamada)
+            for nombre, (latencias, por_llamada) in mediciones.items()}
+
+
+def _secuencial(valores: list, search_type: str) -> dict:
+    """
+    scrape_sunat sobre cada valor, uno a la vez. La primera consulta (sesión
+    HTTP, navegadores del pool) se descarta como calentamiento.
+    """
+    from app.scraper import scrape_sunat
+
+    scrape_sunat(valores[0], search_type=search_type)
+    latencias, errores, motores, resultados_totales = [], [], {}, 0
+    inicio_total = time.perf_counter()
+    for valor in valores[1:]:
+        metadatos = {}
+        inicio = time.perf_counter()
+        resultados = scrape_sunat(valor, search_type=search_type, metadata=metadatos)
+        latencias.append(time.perf_counter() - inicio)
+        motor = metadatos.get("motor", "navegador")
+        motores[motor] = motores.get(motor, 0) + 1
+        if _es_error(resultados):
+            errores.append(resultados[0]["error"] if resultados else "sin resultados")
+        else:
+            resultados_totales += len(resultados)
+    datos = resumen(latencias, time.perf_counter() - inicio_total, errores=len(errores))
+    datos["motores"] = motores
+    datos["resultados"] = resultados_totales
+    if errores:
+        datos["ejemplos_error"] = _primeros_errores(errores)
+    return datos
+
+
+def flujo_individual(args) -> dict:
+    return _secuencial(paginas.rucs_para("benchmark-individual", args.repeticiones + 1), "ruc")
+
+
+def flujo_nombre(args) -> dict:
+    nombres = [f"EMPRESA BENCHMARK {i}" for i in range(args.repeticiones + 1)]
+    return _secuencial(nombres, "nombre")
+
+
+async def _lote(valores: list, concurrencia: int, navegadores: int) -> tuple:
+    """
+    Mismo esquema que scrape_batch (semáforo y navegadores compartidos), pero
+    midiendo cada consulta. Con el camino HTTP no se lanzan navegadores.
+    """
+    from playwright.async_api import async_playwright
+    from app.async_scraper import async_scrape_sunat
+    from app.browser_pool import LAUNCH_ARGS
+
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, errores = [], []
+
+    async def consultar(valor, browser):
+        async with semaforo:
+            inicio = time.perf_counter()
+            resultados = await async_scrape_sunat(valor, "ruc", browser=browser)
+            latencias.append(time.perf_counter() - inicio)
+            if _es_error(resultados):
+                errores.append(resultados[0]["error"] if resultados else "sin resultados")
+
+    if navegadores <= 0:
+        await asyncio.gather(*[consultar(valor, None) for valor in valores])
+        return latencias, errores
+
+    async with async_playwright() as p:
+        lanzados = await asyncio.gather(*[p.chromium.launch(headless=True, args=LAUNCH_ARGS)
+                                          for _ in range(navegadores)])
+        try:
+            await asyncio.gather(*[consultar(valor, lanzados[i % len(lanzados)]) for i, valor in enumerate(valores)])
+        finally:
+            for browser in lanzados:
+                await browser.close()
+    return latencias, errores
+
+
+def flujo_lote(args) -> dict:
+    from app.http_scraper import http_fast_path_enabled
+
+    navegadores = 0 if http_fast_path_enabled() else min(args.navegadores, args.concurrencia)
+    valores = paginas.rucs_para("benchmark-lote", args.lote)
+    inicio = time.perf_counter()
+    latencias, errores = asyncio.run(_lote(valores, args.concurrencia, navegadores))
+    datos = resumen(latencias, time.perf_counter() - inicio, errores=len(errores))
+    datos["concurrencia"] = args.concurrencia
+    datos["navegadores"] = navegadores
+    if errores:
+        datos["ejemplos_error"] = _primeros_errores(errores)
+    return datos
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultados: dict):
+    print(f"\n{'flujo':<24}{'ops':>8}{'errores':>9}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nombre, datos in _aplanar(resultados).items():
+        latencia = datos.get("latencia_s", {})
+        ms = lambda clave: f"{latencia[clave] * 1000:.2f}" if clave in latencia else "-"
+        print(f"{nombre:<24}{datos['operaciones']:>8}{datos['errores']:>9}{datos['throughput_por_s'] or 0:>12.2f}"
+              f"{ms('p50'):>10}{ms('p95'):>10}{ms('p99'):>10}")
+
+
+def _aplanar(resultados: dict) -> dict:
+    """
+    {flujo: datos}, con los microbenchmarks como micro.<nombre>
+    """
+    planos = {}
+    for flujo, datos in resultados.items():
+        if flujo == "micro":
+            planos.update({f"micro.{nombre}": medicion for nombre, medicion in datos.items()})
+        elif "operaciones" in datos:
+            planos[flujo] = datos
+    return planos
+
+
+def comparar(anterior: dict, actual: dict):
+    """
+    Imprime la variación de throughput y p95 de cada flujo respecto de otra corrida
+    """
+    def variacion(antes, despues):
+        if not antes or despues is None:
+            return "-"
+        return f"{100 * (despues - antes) / antes:+.1f}%"
+
+    previos = _aplanar(anterior["resultados"])
+    print(f"\nComparación con {anterior.get('fecha')} (commit {anterior.get('commit')}):")
+    print(f"{'flujo':<24}{'ops/s antes':>14}{'ops/s ahora':>14}{'Δ':>9}{'p95 antes':>12}{'p95 ahora':>12}{'Δ':>9}")
+    for nombre, datos in _aplanar(actual["resultados"]).items():
+        if nombre not in previos:
+            continue
+        previo = previos[nombre]
+        p95_antes = previo.get("latencia_s", {}).get("p95")
+        p95_ahora = datos.get("latencia_s", {}).get("p95")
+        print(f"{nombre:<24}{previo['throughput_por_s'] or 0:>14.2f}{datos['throughput_por_s'] or 0:>14.2f}"
+              f"{variacion(previo['throughput_por_s'], datos['throughput_por_s']):>9}"
+              f"{(p95_antes or 0) * 1000:>10.2f}ms{(p95_ahora or 0) * 1000:>10.2f}ms{variacion(p95_antes, p95_ahora):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del scraper SUNAT contra un servidor local")
+    parser.add_argument("--flujos", default=",".join(FLUJOS), help=f"Flujos separados por coma ({', '.join(FLUJOS)})")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Consultas de los flujos individual y nombre")
+    parser.add_argument("--lote", type=int, default=100, help="RUCs del flujo lote")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Consultas simultáneas del flujo lote")
+    parser.add_argument("--navegadores", type=int, default=2, help="Navegadores del flujo lote sin camino HTTP")
+    parser.add_argument("--iteraciones", type=int, default=500, help="Iteraciones de los microbenchmarks")
+    parser.add_argument("--sin-http", action="store_true", help="Desactivar el camino rápido HTTP (todo por navegador)")
+    parser.add_argument("--con-limitador", action="store_true", help="Mantener el limitador de peticiones activo")
+    parser.add_argument("--base-url", default=None, help="Usar otro servidor en lugar de levantar uno local")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados (por defecto data/benchmarks/)")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior para comparar")
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    flujos = [flujo.strip() for flujo in args.flujos.split(",") if flujo.strip()]
+    desconocidos = set(flujos) - set(FLUJOS)
+    if desconocidos:
+        parser.error(f"Flujos desconocidos: {', '.join(sorted(desconocidos))}")
+
+    servidor = None
+    if args.base_url:
+        base_url = args.base_url.rstrip("/")
+    else:
+        servidor = iniciar_servidor(configuracion_desde(args))
+        base_url = servidor.base_url
+    print(f"🧪 SUNAT en {base_url}")
+
+    # La configuración del scraper se lee al importar app.*: se fija antes
+    os.environ["SUNAT_BASE_URL"] = base_url
+    if args.sin_http:
+        os.environ["SUNAT_HTTP_FAST_PATH"] = "false"
+    if not args.con_limitador:
+        os.environ["SUNAT_RATE_LIMIT"] = "false"
+
+    from app.browser_pool import start_browser_pool, stop_browser_pool
+    from app.parser import parser_engine
+
+    necesita_navegador = "nombre" in flujos or (args.sin_http and "individual" in flujos)
+    if necesita_navegador:
+        try:
+            start_browser_pool()
+        except Exception as e:
+            print(f"⚠️ No se pudo iniciar el pool de navegadores: {e}")
+
+    ejecutores = {"micro": flujo_micro, "individual": flujo_individual, "lote": flujo_lote, "nombre": flujo_nombre}
+    resultados = {}
+    try:
+        for flujo in flujos:
+            print(f"\n⏱️ Flujo {flujo}...")
+            try:
+                resultados[flujo] = ejecutores[flujo](args)
+            except Exception as e:
+                print(f"❌ Falló el flujo {flujo}: {e}")
+                resultados[flujo] = {"error": str(e)}
+    finally:
+        if necesita_navegador:
+            stop_browser_pool()
+
+    reporte = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "configuracion": {
+            **{clave: valor for clave, valor in vars(args).items() if clave not in ("salida", "comparar")},
+            "base_url": base_url,
+            "motor_parseo": parser_engine(),
+            "camino_http": os.getenv('SUNAT_HTTP_FAST_PATH', 'true').lower() == 'true',
+            "limitador": os.getenv('SUNAT_RATE_LIMIT', 'true').lower() == 'true',
+        },
+        "resultados": resultados,
+    }
+    if servidor is not None:
+        reporte["servidor"] = servidor.estadisticas.as_dict()
+        servidor.shutdown()
+
+    salida = args.salida or os.path.join(
+        "data", "benchmarks", f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(salida) or ".", exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+    imprimir(resultados)
+    print(f"\n📁 Resultados: {salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(json.load(f), reporte)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Servidor local que reemplaza al sitio de consulta RUC de SUNAT para benchmarks
+y pruebas de carga, con latencia configurable e inyección de errores.
+
+Sirve el formulario de búsqueda, la vista directa del RUC, el listado de
+resultados (a.aRucs) y las páginas de detalle bajo la misma ruta que SUNAT,
+así que basta apuntar SUNAT_BASE_URL a él.
+
+Uso:
+    python -m benchmarks.servidor --puerto 8765 --latencia 0.2 --tasa-errores 0.05
+    SUNAT_BASE_URL=http://127.0.0.1:8765/cl-ti-itmrconsruc uvicorn app.main:app
+"""
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from . import paginas
+
+RUTA_BASE = "/cl-ti-itmrconsruc"
+TIPOS_ERROR = ("reset", "503", "lento")
+
+
+class ConfiguracionServidor:
+    """
+    Args:
+        latencia: Segundos de demora de cada respuesta
+        jitter: Segundos extra al azar (uniforme entre 0 y jitter)
+        tasa_errores: Fracción de peticiones que fallan (0 a 1)
+        tipo_error: "reset" (se corta la conexión), "503" o "lento" (responde tras demora_lenta segundos)
+        demora_lenta: Segundos de las respuestas "lento"
+        resultados: Empresas del listado en búsquedas por nombre o documento (0 = sin resultados)
+    """
+
+    def __init__(self, latencia: float = 0.05, jitter: float = 0.0, tasa_errores: float = 0.0,
+                 tipo_error: str = "reset", demora_lenta: float = 30.0, resultados: int = 3):
+        if tipo_error not in TIPOS_ERROR:
+            raise ValueError(f"Tipo de error desconocido: {tipo_error}. Opciones: {', '.join(TIPOS_ERROR)}")
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_errores = tasa_errores
+        self.tipo_error = tipo_error
+        self.demora_lenta = demora_lenta
+        self.resultados = resultados
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class EstadisticasServidor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticiones = {}
+        self.errores_inyectados = 0
+        self.sin_sesion = 0
+
+    def contar(self, ruta: str, error: bool = False, sin_sesion: bool = False):
+        with self._lock:
+            self.peticiones[ruta] = self.peticiones.get(ruta, 0) + 1
+            if error:
+                self.errores_inyectados += 1
+            if sin_sesion:
+                self.sin_sesion += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "peticiones": dict(self.peticiones),
+                "total": sum(self.peticiones.values()),
+                "errores_inyectados": self.errores_inyectados,
+                "sin_sesion": self.sin_sesion,
+            }
+
+
+class SunatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self) -> ConfiguracionServidor:
+        return self.server.config
+
+    def do_GET(self):
+        ruta = urlparse(self.path).path
+        if ruta == "/__estadisticas":
+            self._responder(200, json.dumps(self.server.estadisticas.as_dict()), "application/json")
+            return
+        if ruta == f"{RUTA_BASE}/FrameCriterioBusquedaWeb.jsp":
+            if self._simular("formulario"):
+                # Como SUNAT, el formulario abre la sesión que esperan los POST
+                sesion = uuid.uuid4().hex
+                self.server.sesiones.add(sesion)
+                self._responder(200, paginas.formulario(),
+                                cabeceras={"Set-Cookie": f"JSESSIONID={sesion}; Path={RUTA_BASE}"})
+            return
+        self._responder(404, "No encontrado", "text/plain")
+
+    def do_POST(self):
+        ruta = urlparse(self.path).path
+        largo = int(self.headers.get("Content-Length") or 0)
+        datos = {clave: valores[0] for clave, valores in
+                 parse_qs(self.rfile.read(largo).decode("utf-8", errors="replace")).items()}
+        if ruta != f"{RUTA_BASE}/jcrS00Alias":
+            self._responder(404, "No encontrado", "text/plain")
+            return
+
+        accion = datos.get("accion", "consPorRuc")
+        if accion == "consPorRuc":
+            nombre_ruta = "detalle" if datos.get("actReturn") else "ruc"
+        else:
+            nombre_ruta = "listado"
+        if not self._simular(nombre_ruta, sin_sesion=not self._con_sesion()):
+            return
+
+        if accion == "consPorRuc":
+            ruc = (datos.get("nroRuc") or datos.get("search1") or "").strip()
+            html = paginas.vista_ruc(ruc) if paginas.ruc_valido(ruc) else paginas.sin_resultados()
+        else:
+            if accion == "consPorTipdoc":
+                valor = f"{datos.get('tipdoc', '1')}-{datos.get('nrodoc') or datos.get('search2') or ''}"
+                cantidad = min(1, self.config.resultados)
+            else:
+                valor = datos.get("razSoc") or datos.get("search3") or ""
+                cantidad = self.config.resultados
+            rucs = paginas.rucs_para(valor.strip(), cantidad)
+            html = paginas.listado(rucs) if rucs else paginas.sin_resultados()
+        self._responder(200, html)
+
+    def _con_sesion(self) -> bool:
+        cookie = SimpleCookie(self.headers.get("Cookie") or "").get("JSESSIONID")
+        return cookie is not None and cookie.value in self.server.sesiones
+
+    def _simular(self, nombre_ruta: str, sin_sesion: bool = False) -> bool:
+        """
+        Aplica la latencia y, según tasa_errores, el error configurado.
+
+        Returns:
+            False si la petición ya se respondió (o se cortó) con un error
+        """
+        config = self.config
+        demora = config.latencia + (random.uniform(0, config.jitter) if config.jitter > 0 else 0)
+        falla = config.tasa_errores > 0 and random.random() < config.tasa_errores
+        self.server.estadisticas.contar(nombre_ruta, error=falla, sin_sesion=sin_sesion)
+
+        if falla and config.tipo_error == "lento":
+            demora = config.demora_lenta
+            falla = False
+        if demora > 0:
+            time.sleep(demora)
+        if not falla:
+            return True
+
+        if config.tipo_error == "503":
+            self._responder(503, "Servicio no disponible", "text/plain")
+        else:
+            # SO_LINGER en 0: el cierre envía un RST (net::ERR_CONNECTION_RESET en el navegador)
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            self.connection.close()
+        return False
+
+    def finish(self):
+        # Tras un "reset" el socket ya está cerrado
+        try:
+            super().finish()
+        except (OSError, ValueError):
+            pass
+
+    def _responder(self, estado: int, cuerpo: str, tipo: str = "text/html", cabeceras: dict = None):
+        datos = cuerpo.encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+
+class ServidorSunat(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion: tuple, config: ConfiguracionServidor):
+        super().__init__(direccion, SunatHandler)
+        self.config = config
+        self.estadisticas = EstadisticasServidor()
+        self.sesiones = set()
+
+    @property
+    def base_url(self) -> str:
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}{RUTA_BASE}"
+
+
+def iniciar_servidor(config: ConfiguracionServidor = None, host: str = "127.0.0.1", puerto: int = 0) -> ServidorSunat:
+    """
+    Inicia el servidor en un hilo en segundo plano (puerto 0 = uno libre).
+    Se detiene con servidor.shutdown().
+    """
+    servidor = ServidorSunat((host, puerto), config or ConfiguracionServidor())
+    threading.Thread(target=servidor.serve_forever, name="servidor-sunat", daemon=True).start()
+    return servidor
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser):
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos de demora de cada respuesta")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Segundos extra al azar por respuesta")
+    parser.add_argument("--tasa-errores", type=float, default=0.0, help="Fracción de peticiones que fallan (0 a 1)")
+    parser.add_argument("--tipo-error", default="reset", choices=TIPOS_ERROR)
+    parser.add_argument("--demora-lenta", type=float, default=30.0, help="Segundos de las respuestas con error 'lento'")
+    parser.add_argument("--resultados", type=int, default=3, help="Empresas por listado en búsquedas por nombre")
+    parser.add_argument("--paginas", default=None,
+                        help="Directorio con páginas guardadas de SUNAT (formulario.html, ruc.html, listado.html, sin_resultados.html)")
+
+
+def configuracion_desde(args) -> ConfiguracionServidor:
+    if args.paginas:
+        cargadas = paginas.cargar_guardadas(args.paginas)
+        print(f"📄 Páginas guardadas: {', '.join(cargadas) or 'ninguna'}")
+    return ConfiguracionServidor(
+        latencia=args.latencia,
+        jitter=args.jitter,
+        tasa_errores=args.tasa_errores,
+        tipo_error=args.tipo_error,
+        demora_lenta=args.demora_lenta,
+        resultados=args.resultados,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la consulta RUC de SUNAT")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+
+    servidor = ServidorSunat((args.host, args.puerto), configuracion_desde(args))
+    print(f"🧪 SUNAT local en {servidor.base_url}")
+    print(f"   SUNAT_BASE_URL={servidor.base_url}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import pytest
+
+# app/ y benchmarks/ se importan como paquetes desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Páginas guardadas con el marcado del sitio de SUNAT ({{ruc}} y {{razon_social}}
+# se reemplazan por los de cada consulta, ver benchmarks/paginas.py)
+FIXTURES_SUNAT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sunat")
+
+
+def leer_fixture(nombre: str) -> str:
+    with open(os.path.join(FIXTURES_SUNAT, nombre), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def servidor_sunat(monkeypatch):
+    """
+    Inicia el servidor local que imita SUNAT (benchmarks/servidor.py) con las
+    páginas guardadas de tests/fixtures/sunat. Se llama con los argumentos de
+    ConfiguracionServidor y devuelve el servidor (servidor.base_url).
+    """
+    from benchmarks import paginas
+    from benchmarks.servidor import ConfiguracionServidor, iniciar_servidor
+
+    monkeypatch.setattr(paginas, "_guardadas", {})
+    paginas.cargar_guardadas(FIXTURES_SUNAT)
+    servidores = []
+
+    def iniciar(**config):
+        config.setdefault("latencia", 0)
+        servidor = iniciar_servidor(ConfiguracionServidor(**config))
+        servidores.append(servidor)
+        return servidor
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@pytest.fixture
+def sin_limitador(monkeypatch):
+    """
+    Sin limitador de peticiones ni circuit breaker compartidos entre tests
+    """
+    from app import http_scraper, scraper
+    from app.circuit_breaker import CircuitBreaker
+    from app.rate_limiter import _SinLimite
+
+    limitador = _SinLimite()
+    breaker = CircuitBreaker(threshold=100)
+    monkeypatch.setattr(http_scraper, "get_rate_limiter", lambda: limitador)
+    monkeypatch.setattr(scraper, "get_rate_limiter", lambda: limitador)
+    monkeypatch.setattr(scraper, "get_circuit_breaker", lambda: breaker)
+    return breaker
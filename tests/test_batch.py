@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+import os
+import pytest
+from app import batch, save_utils
+
+pytestmark = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="el scraper falso llega a los procesos worker heredado por fork"
+)
+
+
+@pytest.fixture
+def scraper_falso(tmp_path, monkeypatch):
+    """
+    Reemplaza scrape_con_cache en los workers. Cada consulta queda anotada en
+    un archivo (los workers son otros procesos) y los valores de fallan
+    devuelven un error de conexión.
+    """
+    registro = tmp_path / "consultas.txt"
+    fallan = set()
+
+    def fake_scrape_con_cache(valor, search_type="nombre", document_type="1", usar_cache=True, **kwargs):
+        with open(registro, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\t{valor}\n")
+        if valor in fallan:
+            return [{"error": "Error de conexión: SUNAT no responde"}], False
+        return [{"razón_social": valor.upper(), "estado": "ACTIVO"}], False
+
+    def consultados():
+        if not registro.exists():
+            return []
+        lineas = registro.read_text(encoding="utf-8").splitlines()
+        return [linea.split("\t")[1] for linea in lineas]
+
+    monkeypatch.setattr(batch, "scrape_con_cache", fake_scrape_con_cache)
+    monkeypatch.setattr(batch, "_iniciar_worker", lambda: None)
+    monkeypatch.setattr(save_utils, "OUTPUT_DIR", str(tmp_path / "resultados"))
+    monkeypatch.setenv("SUNAT_JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setenv("SUNAT_PARQUET", "false")
+    fake_scrape_con_cache.fallan = fallan
+    fake_scrape_con_cache.consultados = consultados
+    return fake_scrape_con_cache
+
+
+def test_dividir_en_shards_cubre_todo_en_orden():
+    valores = [f"empresa {i}" for i in range(10)]
+    shards = batch.dividir_en_shards(valores, 3)
+
+    assert [len(shard) for shard in shards] == [3, 3, 3, 1]
+    assert [valor for shard in shards for valor in shard] == valores
+    assert batch.dividir_en_shards([], 3) == []
+
+
+def test_ejecutar_lote_une_los_shards_en_el_orden_de_entrada(scraper_falso):
+    valores = [f"empresa {i}" for i in range(9)] + ["empresa 3", "  empresa   4 "]
+    scraper_falso.fallan.add("empresa 5")
+
+    data = batch.ejecutar_lote(valores, "nombre", procesos=3, tamano_shard=2)
+
+    unicos = [f"empresa {i}" for i in range(9)]
+    assert list(data["resultados"]) == unicos
+    assert data["resultados"]["empresa 0"] == [{"razón_social": "EMPRESA 0", "estado": "ACTIVO"}]
+    assert data["errores"] == ["empresa 5: Error de conexión: SUNAT no responde"]
+    # Los duplicados se consultan una sola vez, repartidos en varios procesos
+    assert sorted(scraper_falso.consultados()) == unicos
+
+
+def test_ejecutar_lote_con_on_result_y_omitir(scraper_falso):
+    recibidos = {}
+    data = batch.ejecutar_lote(
+        ["a", "b", "c", "d"], "nombre", procesos=2, tamano_shard=1,
+        on_result=lambda valor, resultados, error: recibidos.setdefault(valor, resultados),
+        omitir={"b"}
+    )
+
+    assert data["resultados"] == {}
+    assert set(recibidos) == {"a", "c", "d"}
+    assert "b" not in scraper_falso.consultados()
+
+
+def test_main_reanuda_solo_los_fallidos_y_une_el_journal(scraper_falso, tmp_path):
+    entrada = tmp_path / "empresas.csv"
+    entrada.write_text("empresa\nalfa\nbeta\ngamma\ndelta\n", encoding="utf-8")
+    argumentos = ["--archivo", str(entrada), "--procesos", "2", "--tamano-shard", "1"]
+
+    scraper_falso.fallan.add("beta")
+    batch.main(argumentos)
+    assert sorted(scraper_falso.consultados()) == ["alfa", "beta", "delta", "gamma"]
+
+    scraper_falso.fallan.clear()
+    batch.main(argumentos + ["--reanudar"])
+    # La segunda corrida solo vuelve a consultar el fallido
+    assert sorted(scraper_falso.consultados()) == ["alfa", "beta", "beta", "delta", "gamma"]
+
+    with open(tmp_path / "resultados" / "consulta_sunat_nombre.json", encoding="utf-8") as f:
+        data = json.load(f)
+    assert list(data["resultados"]) == ["alfa", "beta", "gamma", "delta"]
+    assert data["resultados"]["beta"] == [{"razón_social": "BETA", "estado": "ACTIVO"}]
+    assert "errores" not in data
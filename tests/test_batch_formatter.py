@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+from app.batch_formatter import format_frame, raw_rows
+from app.data_formatter import format_record
+from app.parser import extract_raw_fields
+from benchmarks import paginas
+from conftest import leer_fixture
+
+# Registros sin formatear con cada regla de clean_value_text y de claves
+REGISTROS = [
+    {
+        "Número de RUC": "20100070970 - EMPRESA  DE PRUEBA S.A.C. ",
+        "Nombre Comercial": "-",
+        "Padrones": "NINGUNO",
+        "Domicilio Fiscal": "",
+        "Actividad(es) Económica(s)": "Principal    - 4711 - VENTA AL POR MENOR | Secundaria 1 - 4690 - VENTA AL POR MAYOR",
+        "Afiliado al PLE desde": "AFILIADO DESDE 01/01/2013",
+        "Sistema de Emisión Electrónica": "FACTURA PORTAL   DESDE 18/08/2014",
+        "Comprobantes Electrónicos": "FACTURA (desde 18/08/2014)",
+    },
+    {
+        "Número de RUC": "RUC 10456789012 - PEREZ GOMEZ JUAN CARLOS",
+        "Tipo de Documento": "DNI  45678901  - PEREZ   GOMEZ, JUAN CARLOS",
+        "Estado del Contribuyente": "  BAJA\tDE OFICIO ",
+        "Actividad(es) Económica(s)": "Principal    - 0 - NINGUNO",
+        "Emisor electrónico desde": "-",
+    },
+    {
+        # Labels que se repiten en snake_case o que mapean a la misma clave
+        "Estado": "ACTIVO",
+        "Estado:": "SUSPENSION TEMPORAL",
+        "Estado del Contribuyente": "ACTIVO",
+        "Condición": "Afiliado desde 05/05/2020 ÉXITO",
+    },
+    {},
+]
+
+
+def como_objetos(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Valores como objetos de Python con None en los faltantes (pandas puede
+    inferir otro dtype de texto según la versión)
+    """
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def comparar(registros: list):
+    esperado = pd.DataFrame([format_record(r) for r in registros])
+    esperado.index.name = "registro"
+    obtenido = format_frame(raw_rows(registros))
+
+    pd.testing.assert_frame_equal(como_objetos(obtenido), como_objetos(esperado), check_index_type=False)
+
+
+def test_format_frame_igual_a_format_record():
+    comparar(REGISTROS)
+
+
+@pytest.mark.parametrize("nombre", ["ruc.html", "ruc_persona.html", "vista_lista.html"])
+def test_format_frame_sobre_paginas_guardadas(nombre):
+    registros = [extract_raw_fields(paginas._reemplazar(leer_fixture(nombre), ruc), "lxml")
+                 for ruc in paginas.rucs_para(nombre, 3)]
+
+    comparar(registros)
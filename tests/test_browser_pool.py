@@ -0,0 +1,125 @@
+import threading
+from contextlib import contextmanager
+import pytest
+from app import browser_pool
+from app.browser_pool import BrowserPool
+from app.metrics import SCRAPE_PHASE_SECONDS
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, numero):
+        self.numero = numero
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def new_context(self, **kwargs):
+        return FakeContext(self)
+
+    def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def navegadores(monkeypatch):
+    """
+    Reemplaza Playwright por navegadores falsos y devuelve los lanzados
+    """
+    lanzados = []
+
+    @contextmanager
+    def fake_sync_playwright():
+        yield object()
+
+    def fake_launch(playwright, debug_mode=False):
+        browser = FakeBrowser(len(lanzados) + 1)
+        lanzados.append(browser)
+        return browser
+
+    monkeypatch.setattr(browser_pool, "sync_playwright", fake_sync_playwright)
+    monkeypatch.setattr(browser_pool, "launch_browser", fake_launch)
+    return lanzados
+
+
+def test_recicla_el_navegador_tras_max_uses(navegadores):
+    pool = BrowserPool(size=1, max_uses=3, health_interval=0.05, timeout=5).start()
+    try:
+        usados = [pool.run(lambda context: context.browser.numero) for _ in range(7)]
+    finally:
+        pool.stop(timeout=5)
+
+    assert usados == [1, 1, 1, 2, 2, 2, 3]
+    assert not navegadores[0].connected and not navegadores[1].connected
+    assert pool.stats()["navegadores"] == 1
+
+
+def test_cada_trabajo_recibe_un_contexto_nuevo_que_se_cierra(navegadores):
+    pool = BrowserPool(size=1, max_uses=50, health_interval=0.05, timeout=5).start()
+    try:
+        contextos = [pool.run(lambda context: context) for _ in range(2)]
+    finally:
+        pool.stop(timeout=5)
+
+    assert contextos[0] is not contextos[1]
+    assert all(context.closed for context in contextos)
+
+
+def test_timeout_retira_el_navegador_trabado_y_lo_reemplaza(navegadores):
+    pool = BrowserPool(size=1, max_uses=50, health_interval=0.05, timeout=0.3).start()
+    liberar = threading.Event()
+    try:
+        with pytest.raises(TimeoutError):
+            pool.run(lambda context: liberar.wait(10))
+        assert pool.stats()["timeouts"] == 1
+
+        # El reemplazo atiende la siguiente consulta con un navegador nuevo
+        assert pool.run(lambda context: context.browser.numero) == 2
+
+        # Si la llamada trabada vuelve, el navegador retirado se cierra
+        liberar.set()
+        for _ in range(50):
+            if not navegadores[0].connected:
+                break
+            threading.Event().wait(0.05)
+        assert not navegadores[0].connected
+    finally:
+        liberar.set()
+        pool.stop(timeout=5)
+
+
+def test_el_timeout_no_cuenta_la_espera_en_cola(navegadores):
+    pool = BrowserPool(size=1, max_uses=50, health_interval=0.05, timeout=0.5).start()
+    try:
+        ocupado = pool.submit(lambda context: threading.Event().wait(0.35))
+        # Espera ~0.35 s en cola y corre ~0.35 s: más que el timeout en total
+        assert pool.run(lambda context: threading.Event().wait(0.35) or "ok") == "ok"
+        ocupado.result(timeout=5)
+        assert pool.stats()["timeouts"] == 0
+    finally:
+        pool.stop(timeout=5)
+
+
+def test_lanzamientos_en_el_histograma_de_pasos(navegadores):
+    def lanzamientos():
+        serie = SCRAPE_PHASE_SECONDS._series.get(("lanzamiento_navegador",))
+        return sum(serie[0]) if serie else 0
+
+    antes = lanzamientos()
+    pool = BrowserPool(size=1, max_uses=2, health_interval=0.05, timeout=5).start()
+    try:
+        for _ in range(3):
+            pool.run(lambda context: None)
+    finally:
+        pool.stop(timeout=5)
+
+    assert lanzamientos() - antes == len(navegadores) == 2
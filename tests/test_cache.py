@@ -0,0 +1,74 @@
+import time
+from app.cache import ResultCache
+
+DATOS = [{"razón_social": "EMPRESA S.A.C.", "estado": "ACTIVO"}]
+
+
+def nueva_cache(tmp_path, **kwargs):
+    return ResultCache(path=str(tmp_path / "cache.sqlite"), **kwargs)
+
+
+def ultimo_acceso(cache, search_type, valor):
+    return cache._conn.execute(
+        "SELECT ultimo_acceso FROM resultados WHERE clave = ?", (ResultCache.make_key(search_type, valor),)
+    ).fetchone()[0]
+
+
+def test_los_aciertos_no_escriben_en_la_base(tmp_path):
+    cache = nueva_cache(tmp_path, touch_interval=0)
+    cache.set("ruc", "20100070970", "1", DATOS)
+    cambios = cache._conn.total_changes
+
+    for _ in range(20):
+        assert cache.get("ruc", "20100070970") == DATOS
+
+    assert cache._conn.total_changes == cambios
+    assert not cache._conn.in_transaction
+
+
+def test_los_accesos_se_guardan_con_la_siguiente_escritura(tmp_path):
+    cache = nueva_cache(tmp_path, touch_interval=0)
+    cache.set("ruc", "20100070970", "1", DATOS)
+    guardado = ultimo_acceso(cache, "ruc", "20100070970")
+
+    time.sleep(0.01)
+    cache.get("ruc", "20100070970")
+    assert ultimo_acceso(cache, "ruc", "20100070970") == guardado
+
+    cache.set("ruc", "20100047218", "1", DATOS)
+    assert ultimo_acceso(cache, "ruc", "20100070970") > guardado
+
+
+def test_acceso_reciente_no_se_vuelve_a_anotar(tmp_path):
+    cache = nueva_cache(tmp_path, touch_interval=3600)
+    cache.set("ruc", "20100070970", "1", DATOS)
+
+    cache.get("ruc", "20100070970")
+    assert cache._touches == {}
+
+
+def test_lru_conserva_las_entradas_leidas(tmp_path):
+    cache = nueva_cache(tmp_path, max_entries=50, touch_interval=0)
+    for i in range(99):
+        cache.set("nombre", f"empresa {i}", "1", DATOS)
+    time.sleep(0.01)
+    # Leída después de guardarse las demás: pasa a ser de las más recientes
+    assert cache.get("nombre", "empresa 0") == DATOS
+
+    # La escritura 100 guarda el acceso y purga: quedan las 50 usadas más recientemente
+    cache.set("nombre", "empresa 99", "1", DATOS)
+
+    assert cache.stats()["entradas"] == 50
+    assert cache.get("nombre", "empresa 0") == DATOS
+    assert cache.get("nombre", "empresa 50") is None
+    assert cache.get("nombre", "empresa 51") == DATOS
+
+
+def test_entrada_vencida_no_se_devuelve(tmp_path):
+    cache = nueva_cache(tmp_path, ttls={"ruc": 0.01})
+    cache.set("ruc", "20100070970", "1", DATOS)
+    time.sleep(0.02)
+
+    assert cache.get("ruc", "20100070970") is None
+    cache.set("ruc", "20100070970", "1", DATOS)
+    assert cache.get("ruc", "20100070970") == DATOS
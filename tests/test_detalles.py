@@ -0,0 +1,82 @@
+from http.cookiejar import CookieJar
+from urllib.request import build_opener, HTTPCookieProcessor
+import pytest
+from app import scraper
+from app.http_scraper import SesionListado
+from app.search_flow import ListadoRucs
+from benchmarks import paginas
+
+RUCS = paginas.rucs_para("EMPRESA", 3)
+# Dígito verificador inválido: el servidor responde "No se encontraron"
+RUC_INVALIDO = RUCS[1][:10] + str((int(RUCS[1][10]) + 1) % 10)
+
+
+class PoolFalso:
+    """
+    Pool de navegadores que no lanza Chromium: anota las consultas que le llegan
+    """
+    size = 1
+
+    def __init__(self):
+        self.consultas = 0
+
+    def run(self, fn, timeout=None):
+        self.consultas += 1
+        return [{"error": "No se encontraron datos para el RUC especificado"}]
+
+
+def cookies_del_navegador(servidor) -> list:
+    """
+    Abre el formulario como lo haría el navegador del listado y devuelve sus
+    cookies con la forma de context.cookies()
+    """
+    jar = CookieJar()
+    build_opener(HTTPCookieProcessor(jar)).open(f"{servidor.base_url}/FrameCriterioBusquedaWeb.jsp").read()
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": -1,
+         "httpOnly": False, "secure": False, "sameSite": "Lax"}
+        for c in jar
+    ]
+
+
+@pytest.fixture
+def listado(servidor_sunat, sin_limitador, monkeypatch):
+    servidor = servidor_sunat()
+    pool = PoolFalso()
+    monkeypatch.setattr(scraper, "get_browser_pool", lambda: pool)
+    monkeypatch.setenv("SUNAT_DETAIL_FANOUT", "2")
+
+    def crear(rucs):
+        sesion = SesionListado(cookies=cookies_del_navegador(servidor), base_url=servidor.base_url, timeout=5)
+        return ListadoRucs(rucs, sesion=sesion)
+
+    return servidor, pool, crear
+
+
+def test_detalles_con_la_sesion_del_listado(listado):
+    servidor, pool, crear = listado
+    metadata = {}
+
+    resultados = scraper._consultar_detalles(crear(RUCS), metadata)
+
+    assert [r["número_de_ruc"].split(" - ")[0] for r in resultados] == RUCS
+    assert metadata["detalles"] == {"consultados": 3, "concurrencia": 2, "navegador": 0}
+    assert pool.consultas == 0
+    # Todos los detalles van con la cookie del listado, sin volver a cargar el formulario
+    estadisticas = servidor.estadisticas.as_dict()
+    assert estadisticas["peticiones"] == {"formulario": 1, "detalle": 3}
+    assert estadisticas["sin_sesion"] == 0
+
+
+def test_detalle_no_reconocido_recurre_al_navegador(listado):
+    servidor, pool, crear = listado
+    metadata = {}
+    rucs = [RUCS[0], RUC_INVALIDO, RUCS[2]]
+
+    resultados = list(scraper._iter_detalles(crear(rucs), metadata))
+
+    assert resultados[0]["número_de_ruc"].startswith(RUCS[0])
+    assert resultados[1] == {"error": "Error al procesar resultado 2: No se encontraron datos para el RUC especificado"}
+    assert resultados[2]["número_de_ruc"].startswith(RUCS[2])
+    assert metadata["detalles"]["navegador"] == 1
+    assert pool.consultas == 1
@@ -0,0 +1,100 @@
+import pytest
+from app import http_scraper, scraper
+from app.http_scraper import SunatHttpClient
+from benchmarks import paginas
+
+RUC = "20100070970"
+
+
+class PoolFalso:
+    """
+    Pool de navegadores que no lanza Chromium: anota las consultas que le llegan
+    """
+
+    def __init__(self):
+        self.consultas = 0
+
+    def run(self, fn, timeout=None):
+        self.consultas += 1
+        return [{"error": "No se encontraron datos para el RUC especificado"}]
+
+
+@pytest.fixture
+def camino_http(servidor_sunat, sin_limitador, monkeypatch):
+    """
+    Apunta el camino HTTP al servidor local y reemplaza el navegador por un
+    pool falso. Devuelve una función que inicia el servidor con la
+    configuración dada y retorna (servidor, pool).
+    """
+    monkeypatch.setenv("SUNAT_HTTP_FAST_PATH", "true")
+    monkeypatch.delenv("SUNAT_DEBUG", raising=False)
+    monkeypatch.setenv("SUNAT_BLOCK_RESOURCES", "false")
+    pool = PoolFalso()
+    monkeypatch.setattr(scraper, "get_browser_pool", lambda: pool)
+
+    def iniciar(**config):
+        servidor = servidor_sunat(**config)
+        monkeypatch.setattr(http_scraper, "_client", SunatHttpClient(base_url=servidor.base_url, timeout=5))
+        return servidor, pool
+
+    return iniciar
+
+
+def test_respuesta_reconocida_se_resuelve_por_http(camino_http):
+    servidor, pool = camino_http()
+    metadata = {}
+
+    resultados = scraper.scrape_sunat(RUC, "ruc", metadata=metadata)
+    segunda = scraper.scrape_sunat(RUC, "ruc")
+
+    assert metadata["motor"] == "http"
+    assert "http" in metadata["tiempos"]
+    assert pool.consultas == 0
+    resultado = resultados[0]
+    assert resultado["número_de_ruc"] == f"{RUC} - {paginas.datos_empresa(RUC)['razon_social']}"
+    assert resultado["estado"] == "ACTIVO"
+    assert segunda == resultados
+
+    # Una sola carga del formulario: la segunda consulta reutiliza la sesión
+    # y todos los POST llevan la cookie que abrió el formulario
+    estadisticas = servidor.estadisticas.as_dict()
+    assert estadisticas["peticiones"] == {"formulario": 1, "ruc": 2}
+    assert estadisticas["sin_sesion"] == 0
+
+
+def test_respuesta_no_reconocida_recurre_al_navegador(camino_http):
+    servidor, pool = camino_http()
+    metadata = {}
+
+    # RUC con dígito verificador inválido: el servidor responde "No se encontraron"
+    resultados = scraper.scrape_sunat("20100070971", "ruc", metadata=metadata)
+
+    assert metadata["motor"] == "navegador"
+    assert pool.consultas == 1
+    assert resultados == [{"error": "No se encontraron datos para el RUC especificado"}]
+
+    # La sesión se descarta: la siguiente consulta vuelve a cargar el formulario
+    assert scraper.scrape_sunat(RUC, "ruc")[0]["estado"] == "ACTIVO"
+    assert servidor.estadisticas.as_dict()["peticiones"]["formulario"] == 2
+
+
+@pytest.mark.parametrize("tipo_error", ["reset", "503"])
+def test_error_de_conexion_recurre_al_navegador(camino_http, tipo_error):
+    servidor, pool = camino_http(tasa_errores=1.0, tipo_error=tipo_error)
+    metadata = {}
+
+    resultados = scraper.scrape_sunat(RUC, "ruc", metadata=metadata)
+
+    assert metadata["motor"] == "navegador"
+    assert pool.consultas == 1
+    assert resultados == [{"error": "No se encontraron datos para el RUC especificado"}]
+    assert servidor.estadisticas.as_dict()["errores_inyectados"] >= 1
+
+
+def test_cliente_http_propaga_errores_de_conexion(camino_http):
+    servidor, _ = camino_http(tasa_errores=1.0, tipo_error="reset")
+    cliente = SunatHttpClient(base_url=servidor.base_url, timeout=5)
+
+    with pytest.raises(OSError):
+        cliente.consultar_ruc(RUC)
+
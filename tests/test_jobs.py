@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from app.jobs import BatchJob, eventos_sse
+
+
+async def leer(stream, cantidad: int = None) -> list:
+    mensajes = []
+    async for mensaje in stream:
+        mensajes.append(mensaje)
+        if cantidad is not None and len(mensajes) == cantidad:
+            break
+    return mensajes
+
+
+def test_eventos_publicados_desde_otro_hilo():
+    job = BatchJob({})
+
+    def correr_job():
+        job.on_progress("inicio", {"total": 2, "completados": 0, "reanudados": 0})
+        job.on_progress("fila", {"total": 2, "completados": 1, "valor": "alfa", "estado": "ok"})
+        job.terminar("completado")
+
+    async def main():
+        stream = eventos_sse(job, keepalive=5)
+        lectura = asyncio.create_task(leer(stream))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=correr_job).start()
+        return await asyncio.wait_for(lectura, 2)
+
+    mensajes = asyncio.run(main())
+
+    assert [m.split("\n")[:2] for m in mensajes] == [
+        ["id: 0", "event: inicio"], ["id: 1", "event: fila"], ["id: 2", "event: completado"]
+    ]
+    # El cliente terminó y dejó de estar suscripto
+    assert job._suscriptores == {}
+
+
+def test_keepalive_y_reanudacion_desde_un_evento():
+    job = BatchJob({})
+    job.publicar("inicio", {"total": 1})
+    job.publicar("fila", {"valor": "alfa"})
+
+    async def main():
+        stream = eventos_sse(job, desde=1, keepalive=0.05)
+        mensajes = await leer(stream, 2)
+        await stream.aclose()
+        return mensajes
+
+    mensajes = asyncio.run(main())
+
+    assert mensajes[0].startswith("id: 1\nevent: fila\n")
+    assert mensajes[1] == ": keepalive\n\n"
+    assert job._suscriptores == {}
+
+
+def test_job_ya_terminado():
+    job = BatchJob({})
+    job.terminar("cancelado")
+
+    mensajes = asyncio.run(leer(eventos_sse(job, desde=1)))
+
+    assert mensajes == []
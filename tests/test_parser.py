@@ -0,0 +1,61 @@
+import pytest
+from bs4 import BeautifulSoup
+from app.parser import PANEL_SELECTOR, extract_raw_fields, parse_resultado
+from conftest import leer_fixture
+
+RUC = "20100070970"
+
+PAGINAS = ["ruc.html", "ruc_persona.html", "vista_lista.html", "sin_resultados.html", "listado.html"]
+
+
+def pagina(nombre: str) -> str:
+    return leer_fixture(nombre).replace("{{ruc}}", RUC).replace("{{razon_social}}", "EMPRESA DE PRUEBA S.A.C.")
+
+
+def panel(html: str) -> str:
+    """
+    Solo el panel de resultado, como lo entrega el navegador (outerHTML)
+    """
+    encontrado = BeautifulSoup(html, "lxml").select_one(PANEL_SELECTOR)
+    return str(encontrado) if encontrado else ""
+
+
+@pytest.mark.parametrize("recorte", [lambda html: html, panel], ids=["pagina", "panel"])
+@pytest.mark.parametrize("nombre", PAGINAS)
+def test_lxml_y_bs4_extraen_lo_mismo(nombre, recorte):
+    html = recorte(pagina(nombre))
+
+    assert extract_raw_fields(html, "lxml") == extract_raw_fields(html, "bs4")
+    assert parse_resultado(html, "lxml") == parse_resultado(html, "bs4")
+
+
+def test_vista_directa():
+    campos = extract_raw_fields(pagina("ruc.html"), "lxml")
+
+    assert campos["Número de RUC"] == f"{RUC} - EMPRESA DE PRUEBA S.A.C."
+    assert campos["Actividad(es) Económica(s)"].count(" | ") == 2
+    assert campos["Afiliado al PLE desde"] == "01/01/2013"
+
+
+def test_vista_directa_persona_sin_datos():
+    resultado = parse_resultado(pagina("ruc_persona.html"), "lxml")
+
+    assert resultado["documento_identidad"] == "DNI 45678901 - PEREZ GOMEZ, JUAN CARLOS"
+    assert resultado["nombre_comercial"] is None
+    assert resultado["padrones"] is None
+    assert resultado["actividades_económicas"] == "0 - NINGUNO"
+
+
+def test_vista_de_lista():
+    campos = extract_raw_fields(pagina("vista_lista.html"), "lxml")
+
+    # El comentario no se cuenta como texto y el <br> separa con un espacio
+    assert campos["Condición"] == "HABIDO"
+    assert campos["Domicilio Fiscal"] == "CAL.CENTENARIO NRO. 156 LIMA - LIMA - LA MOLINA"
+    assert campos["Estado"] == "ACTIVO"
+    assert "Sin valor" not in campos
+
+
+def test_sin_panel():
+    assert extract_raw_fields(pagina("listado.html"), "lxml") is None
+    assert parse_resultado(pagina("listado.html"), "bs4") == {"error": "No se encontró información"}
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.profiling import ruta_archivo
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    perfiles = tmp_path / "data" / "perfiles"
+    (perfiles / "20250131_101500_ruc_20100070970_abc123").mkdir(parents=True)
+    (perfiles / "20250131_101500_ruc_20100070970_abc123" / "cpu.txt").write_text("perfil")
+    (tmp_path / "data" / "empresas.xlsx").write_text("fuera de los perfiles")
+    monkeypatch.setenv("SUNAT_PROFILE_DIR", str(perfiles))
+    return TestClient(app)
+
+
+def test_perfil_y_archivo(cliente):
+    respuesta = cliente.get("/perfiles/20250131_101500_ruc_20100070970_abc123")
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()["archivos"] == ["/perfiles/20250131_101500_ruc_20100070970_abc123/cpu.txt"]
+    assert cliente.get(respuesta.json()["archivos"][0]).text == "perfil"
+
+
+@pytest.mark.parametrize("ruta", ["/perfiles/%2E%2E", "/perfiles/%2E%2E/empresas.xlsx", "/perfiles/.",
+                                  "/perfiles/20250131_101500_ruc_20100070970_abc123/%2E%2E"])
+def test_no_sale_del_directorio_de_perfiles(cliente, ruta):
+    assert cliente.get(ruta).status_code == 404
+
+
+def test_enlace_fuera_del_directorio(cliente, tmp_path):
+    (tmp_path / "data" / "perfiles" / "enlace").symlink_to(tmp_path / "data")
+
+    assert ruta_archivo("enlace", "empresas.xlsx") is None
+    assert cliente.get("/perfiles/enlace/empresas.xlsx").status_code == 404
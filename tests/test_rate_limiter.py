@@ -0,0 +1,126 @@
+import json
+import os
+import pytest
+from app import rate_limiter
+from app.rate_limiter import RateLimiter
+
+
+class Reloj:
+    """
+    time.time() controlado por el test
+    """
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(rate_limiter.time, "time", reloj)
+    return reloj
+
+
+def limitador(tmp_path, **kwargs) -> RateLimiter:
+    opciones = dict(initial_rate=1.0, min_rate=0.2, max_rate=5.0, burst=2, increase=0.05,
+                    decrease_factor=0.5, latency_target=8, cooldown=5, sync_interval=60)
+    opciones.update(kwargs)
+    return RateLimiter(state_file=str(tmp_path / "rate_limiter.json"), **opciones)
+
+
+def test_reserva_del_token_bucket(tmp_path, reloj):
+    limiter = limitador(tmp_path, initial_rate=2.0)
+
+    # El bucket empieza lleno (burst) y después cada token llega cada 1/tasa segundos
+    assert [limiter._reservar() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    # En un segundo se repusieron 2 tokens de los 2 que se debían
+    reloj.ahora += 1
+    assert limiter._reservar() == 0.5
+    # Sin peticiones el bucket no pasa de burst
+    reloj.ahora += 60
+    assert limiter.stats()["tokens"] == 2
+
+
+def test_aumento_aditivo_acumulado_en_memoria(tmp_path, reloj):
+    limiter = limitador(tmp_path)
+    limiter._reservar()
+
+    for _ in range(3):
+        limiter.record_success(0.5)
+    # Los éxitos todavía no llegaron al archivo
+    assert limiter.stats()["peticiones_por_segundo"] == 1.0
+
+    # La próxima reserva los aplica
+    limiter._reservar()
+    assert limiter.stats()["peticiones_por_segundo"] == 1.15
+
+    # O pasado sync_interval, el próximo éxito
+    reloj.ahora += 60
+    limiter.record_success(0.5)
+    assert limiter.stats()["peticiones_por_segundo"] == 1.2
+
+
+def test_aumento_hasta_la_tasa_maxima(tmp_path, reloj):
+    limiter = limitador(tmp_path, initial_rate=4.9, sync_interval=0)
+
+    for _ in range(10):
+        limiter.record_success(0.5)
+
+    assert limiter.stats()["peticiones_por_segundo"] == 5.0
+
+
+def test_disminucion_multiplicativa_una_por_cooldown(tmp_path, reloj, capsys):
+    limiter = limitador(tmp_path, initial_rate=4.0, sync_interval=0)
+
+    # Una ráfaga de fallos simultáneos reduce una sola vez
+    limiter.record_failure("ERR_CONNECTION_RESET")
+    limiter.record_failure("TimeoutError")
+    reloj.ahora += 1
+    limiter.record_failure("TimeoutError")
+    assert limiter.stats()["peticiones_por_segundo"] == 2.0
+    assert capsys.readouterr().out.count("Tasa hacia SUNAT reducida por ERR_CONNECTION_RESET: 4.00 → 2.00") == 1
+
+    # Pasado el cooldown, una respuesta lenta cuenta como fallo
+    reloj.ahora += 5
+    limiter.record_success(9.0)
+    assert limiter.stats()["peticiones_por_segundo"] == 1.0
+
+    # Nunca por debajo de la tasa mínima
+    for _ in range(5):
+        reloj.ahora += 5
+        limiter.record_failure()
+    assert limiter.stats()["peticiones_por_segundo"] == 0.2
+
+
+def test_fallo_pendiente_se_aplica_antes_de_la_proxima_reserva(tmp_path, reloj):
+    limiter = limitador(tmp_path, initial_rate=2.0)
+    limiter._reservar()
+    limiter._reservar()
+
+    limiter.record_failure()
+
+    # El bucket quedó vacío: el próximo token llega a la tasa ya reducida (1/s)
+    assert limiter._reservar() == 1.0
+
+
+@pytest.mark.skipif(rate_limiter.fcntl is None, reason="sin fcntl el estado no se guarda en archivo")
+def test_stats_no_escribe_el_estado(tmp_path, reloj):
+    limiter = limitador(tmp_path)
+
+    assert limiter.stats()["peticiones_por_segundo"] == 1.0
+    assert not os.path.exists(limiter.state_file)
+
+    limiter._reservar()
+    with open(limiter.state_file) as f:
+        guardado = f.read()
+    modificado = os.stat(limiter.state_file).st_mtime_ns
+    reloj.ahora += 0.5
+
+    assert limiter.stats()["tokens"] == 1.5
+    with open(limiter.state_file) as f:
+        assert f.read() == guardado
+    assert os.stat(limiter.state_file).st_mtime_ns == modificado
+    assert json.loads(guardado)["tokens"] == 1.0
@@ -0,0 +1,141 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import pytest
+from app import parquet_utils, save_utils
+from app.save_utils import StreamingResultWriter
+
+
+@pytest.fixture
+def salida(tmp_path, monkeypatch):
+    monkeypatch.setattr(save_utils, "OUTPUT_DIR", str(tmp_path / "resultados"))
+    monkeypatch.setenv("SUNAT_PARQUET", "false")
+    return tmp_path
+
+
+@pytest.mark.skipif(save_utils.fcntl is None, reason="sin fcntl el journal no se bloquea")
+def test_journal_en_uso_falla_de_inmediato(salida):
+    journal = str(salida / "journal" / "empresas.jsonl")
+    writer = StreamingResultWriter("primera", journal_file=journal)
+    writer.write("alfa", [{"estado": "ACTIVO"}])
+
+    with pytest.raises(RuntimeError, match="en uso"):
+        StreamingResultWriter("segunda", journal_file=journal, reanudar=True)
+
+    # La segunda consulta no tocó el journal de la primera
+    writer.close()
+    with open(journal, encoding="utf-8") as f:
+        assert [json.loads(linea)["valor"] for linea in f] == ["alfa"]
+
+    # Cerrado el writer, el journal se puede reanudar
+    reanudado = StreamingResultWriter("segunda", journal_file=journal, reanudar=True)
+    assert reanudado.completados() == {"alfa"}
+    reanudado.close()
+
+
+def test_errores_del_reporte_en_el_orden_de_entrada(salida):
+    orden = ["alfa", "beta", "gamma", "delta"]
+    writer = StreamingResultWriter("errores", orden=orden)
+    # Terminan en otro orden que el de entrada
+    for valor in ["delta", "beta", "alfa", "gamma"]:
+        error = None if valor == "alfa" else f"{valor}: Error de conexión"
+        writer.write(valor, [{"error": "Error de conexión"}] if error else [{"estado": "ACTIVO"}], error)
+
+    saved_files = writer.close()
+
+    assert writer.errores_muestra == ["beta: Error de conexión", "gamma: Error de conexión", "delta: Error de conexión"]
+    with open(saved_files["json"], encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["errores"] == writer.errores_muestra
+
+
+@pytest.mark.skipif(parquet_utils.pa is None, reason="sin pyarrow no hay salida Parquet")
+def test_parquet_incremental_y_uno_por_corrida(salida, monkeypatch):
+    import pyarrow.parquet as pq
+    monkeypatch.setenv("SUNAT_PARQUET", "true")
+    monkeypatch.setenv("SUNAT_PARQUET_DIR", str(salida / "parquet"))
+    journal = str(salida / "journal" / "empresas.jsonl")
+
+    writer = StreamingResultWriter("consulta_sunat_ruc", tipo_busqueda="ruc", journal_file=journal)
+    writer.write("alfa", [{"estado": "ACTIVO"}, {"estado": "BAJA"}])
+    writer.write("beta", [{"error": "Error de conexión"}], "beta: Error de conexión")
+    # Las filas van al Parquet (temporal) a medida que terminan
+    assert writer._parquet.filas + writer._parquet._pendientes == 3
+    primero = writer.close()["parquet"]
+
+    # La segunda corrida reanuda el journal: reconsulta beta y conserva alfa
+    writer = StreamingResultWriter("consulta_sunat_ruc", tipo_busqueda="ruc", journal_file=journal, reanudar=True)
+    writer.write("beta", [{"estado": "ACTIVO"}])
+    segundo = writer.close()["parquet"]
+
+    assert primero != segundo
+    assert os.path.basename(primero).startswith("consulta_sunat_ruc_")
+    assert pq.read_table(primero).column("empresa_buscada").to_pylist() == ["alfa", "alfa", "beta"]
+    tabla = pq.read_table(segundo)
+    assert tabla.column("empresa_buscada").to_pylist() == ["beta", "alfa", "alfa"]
+    assert tabla.column("error").to_pylist() == [None, None, None]
+    assert not any(nombre.endswith(".tmp") for nombre in os.listdir(os.path.dirname(segundo)))
+
+
+@pytest.mark.skipif(parquet_utils.pa is None, reason="sin pyarrow no hay salida Parquet")
+def test_parquet_no_se_publica_si_la_consulta_falla(salida, monkeypatch):
+    monkeypatch.setenv("SUNAT_PARQUET", "true")
+    monkeypatch.setenv("SUNAT_PARQUET_DIR", str(salida / "parquet"))
+
+    with pytest.raises(KeyboardInterrupt):
+        with StreamingResultWriter("interrumpida", tipo_busqueda="ruc") as writer:
+            writer.write("alfa", [{"estado": "ACTIVO"}])
+            raise KeyboardInterrupt
+
+    assert [archivos for _, _, archivos in os.walk(salida / "parquet") if archivos] == []
+
+
+def test_csv_parcial_sin_reescrituras_por_campos_conocidos(salida, monkeypatch):
+    reescrituras = []
+    original = StreamingResultWriter._reescribir_encabezado_csv
+
+    def contar(self):
+        reescrituras.append(list(self._columnas))
+        original(self)
+
+    monkeypatch.setattr(StreamingResultWriter, "_reescribir_encabezado_csv", contar)
+    writer = StreamingResultWriter("parcial", flush_every=1)
+    writer.write("alfa", [{"ruc": "20100070970", "estado": "ACTIVO"}])
+    writer.write("beta", [{"error": "Error de conexión"}], "beta: Error de conexión")
+    # Solo un campo fuera de los estandarizados amplía el encabezado
+    writer.write("gamma", [{"ruc": "20100070971", "campo_nuevo": "x"}])
+
+    with open(writer.csv_file, newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+    writer.close()
+
+    assert len(reescrituras) == 2
+    assert reescrituras[1][-1] == "campo_nuevo"
+    assert [(f["empresa_buscada"], f["estado"], f["error"], f["campo_nuevo"]) for f in filas] == [
+        ("alfa", "ACTIVO", "", ""), ("beta", "", "Error de conexión", ""), ("gamma", "", "", "x")
+    ]
+
+
+def test_importar_el_writer_no_carga_el_navegador():
+    codigo = "import sys, app.save_utils; print(any(m.startswith(('playwright', 'app.scraper')) for m in sys.modules))"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    assert salida.stdout.strip() == "False"
+
+
+def test_aviso_si_falta_pyarrow(monkeypatch, capsys):
+    monkeypatch.setattr(parquet_utils, "pa", None)
+    monkeypatch.setattr(parquet_utils, "_aviso_sin_pyarrow", False)
+    monkeypatch.setenv("SUNAT_PARQUET", "true")
+
+    assert not parquet_utils.parquet_habilitado()
+    assert not parquet_utils.parquet_habilitado()
+    assert capsys.readouterr().out.count("pyarrow no está instalado") == 1
+
+    monkeypatch.setenv("SUNAT_PARQUET", "false")
+    monkeypatch.setattr(parquet_utils, "_aviso_sin_pyarrow", False)
+    assert not parquet_utils.parquet_habilitado()
+    assert capsys.readouterr().out == ""
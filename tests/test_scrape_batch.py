@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+from app import async_scraper
+from app.async_scraper import run_batch
+from app.metrics import SCRAPE_PHASE_SECONDS
+
+
+class FakeAsyncBrowser:
+    def __init__(self, numero):
+        self.numero = numero
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def navegadores(monkeypatch):
+    """
+    Reemplaza Playwright async por navegadores falsos; cada consulta anota
+    en qué navegador corrió y con qué debug_mode
+    """
+    lanzados = []
+    consultas = []
+
+    class FakeChromium:
+        async def launch(self, **kwargs):
+            browser = FakeAsyncBrowser(len(lanzados) + 1)
+            lanzados.append(browser)
+            return browser
+
+    class FakePlaywright:
+        chromium = FakeChromium()
+
+    @asynccontextmanager
+    async def fake_async_playwright():
+        yield FakePlaywright()
+
+    async def fake_scrape(valor, search_type, document_type, browser=None, debug_mode=False):
+        await asyncio.sleep(0)
+        if not browser.is_connected():
+            return [{"error": "Error inesperado: Target page, context or browser has been closed"}]
+        consultas.append((valor, browser.numero, debug_mode))
+        if valor == "caida":
+            browser.connected = False
+        return [{"estado": "ACTIVO"}]
+
+    monkeypatch.setattr(async_scraper, "async_playwright", fake_async_playwright)
+    monkeypatch.setattr(async_scraper, "async_scrape_sunat", fake_scrape)
+    return lanzados, consultas
+
+
+def test_relanza_el_navegador_desconectado(navegadores):
+    lanzados, consultas = navegadores
+
+    resultados = run_batch(["caida", "alfa", "beta"], concurrency=1, browsers=1)
+
+    assert all(r == [{"estado": "ACTIVO"}] for r in resultados.values())
+    assert [numero for _, numero, _ in consultas] == [1, 2, 2]
+    assert [b.connected for b in lanzados] == [False, False]
+
+
+def test_debug_llega_a_cada_consulta(navegadores):
+    _, consultas = navegadores
+
+    run_batch(["alfa", "beta"], concurrency=2, browsers=1, debug_mode=True)
+
+    assert {debug for _, _, debug in consultas} == {True}
+
+
+def test_error_de_on_result_detiene_sin_cerrar_navegadores_en_uso(navegadores):
+    lanzados, consultas = navegadores
+    recibidos = []
+
+    def on_result(valor, resultados):
+        # El navegador de la consulta que termina sigue abierto
+        assert all(b.connected for b in lanzados)
+        recibidos.append(valor)
+        if valor == "alfa":
+            raise OSError("No queda espacio en el disco")
+
+    with pytest.raises(OSError, match="espacio"):
+        run_batch(["alfa", "beta", "gamma", "delta"], concurrency=2, browsers=2, on_result=on_result)
+
+    # La consulta en curso terminó y no se iniciaron más
+    assert recibidos == ["alfa", "beta"]
+    assert [b.connected for b in lanzados] == [False, False]
+
+
+def test_lanzamientos_en_el_histograma_de_pasos(navegadores):
+    lanzados, _ = navegadores
+    serie = SCRAPE_PHASE_SECONDS._series.get(("lanzamiento_navegador",))
+    antes = sum(serie[0]) if serie else 0
+
+    run_batch(["caida", "alfa"], concurrency=1, browsers=1)
+
+    assert sum(SCRAPE_PHASE_SECONDS._series[("lanzamiento_navegador",)][0]) - antes == len(lanzados) == 2
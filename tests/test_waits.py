@@ -0,0 +1,121 @@
+import asyncio
+import time
+import pytest
+from playwright._impl._errors import TimeoutError as PlaywrightTimeoutError
+from app.search_flow import RESULTADO_RUC
+from app.waits import StepTimer, click_and_wait_response, click_and_wait_response_async
+
+
+class FakeRequest:
+    method = "POST"
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.url = url
+        self.request = FakeRequest()
+
+
+class FakePage:
+    """
+    Página falsa: el click programa eventos (respuesta de red, navegación con
+    los selectores del documento nuevo) que se disparan a los `ms` indicados
+    mientras el llamador espera en wait_for_timeout.
+    """
+
+    def __init__(self, eventos, selectores=()):
+        self.main_frame = object()
+        self.eventos = eventos
+        self.selectores = set(selectores)
+        self.listeners = {"response": [], "framenavigated": []}
+        self._click = None
+
+    def on(self, evento, handler):
+        self.listeners[evento].append(handler)
+
+    def remove_listener(self, evento, handler):
+        self.listeners[evento].remove(handler)
+
+    def click(self, target):
+        self._click = time.monotonic()
+
+    def _disparar(self):
+        transcurrido = (time.monotonic() - self._click) * 1000
+        while self.eventos and self.eventos[0][0] <= transcurrido:
+            _, tipo, dato = self.eventos.pop(0)
+            if tipo == "response":
+                for handler in list(self.listeners["response"]):
+                    handler(FakeResponse(dato))
+            else:
+                self.selectores = set(dato)
+                for handler in list(self.listeners["framenavigated"]):
+                    handler(self.main_frame)
+
+    def query_selector(self, selector):
+        self._disparar()
+        return object() if selector in self.selectores else None
+
+    def wait_for_timeout(self, ms):
+        time.sleep(ms / 1000)
+        self._disparar()
+
+
+class FakeAsyncPage(FakePage):
+    """
+    Como FakePage, pero los eventos los dispara el event loop (el llamador
+    espera con asyncio.sleep)
+    """
+
+    async def click(self, target):
+        FakePage.click(self, target)
+        loop = asyncio.get_running_loop()
+        for ms, _, _ in self.eventos:
+            loop.call_later(ms / 1000, self._disparar)
+
+    async def query_selector(self, selector):
+        return FakePage.query_selector(self, selector)
+
+
+def test_respuesta_del_post_y_resultado():
+    page = FakePage([(20, "response", "https://sunat/jcrS00Alias"), (30, "nav", [RESULTADO_RUC])])
+    timer = StepTimer()
+
+    click_and_wait_response(page, "#btnAceptar", RESULTADO_RUC, timeout=5000, timer=timer)
+
+    assert timer.avisos == {}
+    assert page.listeners == {"response": [], "framenavigated": []}
+
+
+def test_respuesta_no_reconocida_no_espera_el_plazo_completo():
+    # El POST va a otra URL: el predicado no coincide, pero la página nueva
+    # con el resultado basta y la falta queda anotada en el timer
+    page = FakePage([(20, "response", "https://sunat/otraRuta"), (30, "nav", [RESULTADO_RUC])])
+    timer = StepTimer()
+
+    inicio = time.monotonic()
+    click_and_wait_response(page, "#btnAceptar", RESULTADO_RUC, timeout=5000, timer=timer)
+
+    assert time.monotonic() - inicio < 1
+    assert timer.avisos == {"respuesta_no_detectada": 1}
+
+
+def test_selector_del_documento_anterior_no_cuenta():
+    # El formulario ya tiene el selector: sin respuesta ni navegación no hay resultado
+    page = FakePage([], selectores=[RESULTADO_RUC])
+    timer = StepTimer()
+
+    inicio = time.monotonic()
+    with pytest.raises(PlaywrightTimeoutError):
+        click_and_wait_response(page, "#btnAceptar", RESULTADO_RUC, timeout=200, timer=timer)
+
+    assert time.monotonic() - inicio < 1
+    assert timer.avisos == {"sin_resultado": 1}
+
+
+def test_version_async_comparte_la_carrera():
+    page = FakeAsyncPage([(30, "nav", [RESULTADO_RUC])])
+    timer = StepTimer()
+
+    asyncio.run(click_and_wait_response_async(page, "#btnAceptar", RESULTADO_RUC, timeout=5000, timer=timer))
+
+    assert timer.avisos == {"respuesta_no_detectada": 1}